@@ -5,19 +5,25 @@ import random
 from dotenv import load_dotenv
 
 
-def loadapi():
-    # Load biến môi trường từ file .env
+def load_api_keys():
+    """Tất cả key `GOOGLE_API_KEY`, `GOOGLE_API_KEY1`, `GOOGLE_API_KEY2`, ... (bỏ trống, bỏ trùng)."""
     load_dotenv()
 
-    # 1. Tạo danh sách các key cần lấy
-    potential_keys = [
-        os.getenv("GOOGLE_API_KEY"),
-        os.getenv("GOOGLE_API_KEY1"),
-        os.getenv("GOOGLE_API_KEY2")
-    ]
+    names = sorted(
+        (name for name in os.environ if name.startswith("GOOGLE_API_KEY")),
+        key=lambda name: (len(name), name)
+    )
+    keys = []
+    for name in names:
+        key = os.environ[name].strip()
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
 
-    # 2. Lọc danh sách để loại bỏ các giá trị None hoặc rỗng (phòng trường hợp bạn chưa điền đủ 3 key)
-    valid_keys = [key for key in potential_keys if key and key.strip()]
+def loadapi():
+    # 1 + 2. Lấy danh sách các key hợp lệ trong file .env
+    valid_keys = load_api_keys()
 
     # 3. Kiểm tra xem có key nào hợp lệ không
     if not valid_keys:
@@ -9,16 +9,28 @@
 # - Toàn bộ việc quản lý trạng thái (load/save từ DB), quản lý model AI,
 #   và xử lý request/response được chuyển cho `app.py`.
 
+import asyncio
+import contextvars
+import copy
 import datetime
 import hashlib
 import re
 import json
-from dataclasses import dataclass, asdict, field
+import math
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from enum import Enum
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, List, Dict, Optional, Tuple
 
 from langchain_google_genai import GoogleGenerativeAI
 
+from gemini_pool import RateLimitedError
+from llm_usage import MeteredLLM, current_batch_id, estimate_tokens
+from model_router import current_component_models
+from record_codec import codec_for
+
 
 # =======================
 # 1. Enums & Data Classes
@@ -46,7 +58,8 @@ class InterviewPhase(Enum):
     CLOSING = "closing"
 
 
-@dataclass
+# slots: không có __dict__ → record nhẹ hơn khi giữ hàng nghìn lượt phỏng vấn trong record_cache
+@dataclass(slots=True)
 class QuestionAttempt:
     question: str
     answer: str
@@ -57,6 +70,7 @@ class QuestionAttempt:
     question_hash: Optional[str] = None
     time_limit: Optional[int] = None  # ✅ THÊM FIELD MỚI
     time_spent: Optional[int] = None   # ✅ THÊM: thời gian thí sinh dùng (giây)
+    audio_id: Optional[str] = None  # Audio TTS của câu hỏi (resume dùng lại, không TTS lại)
 
 
 @dataclass
@@ -69,8 +83,40 @@ class InterviewConfig:
     max_upper_level: int = 2
     llm_temperature: float = 0.5
     max_memory_turns: int = 6
+    # "turns": giữ max_memory_turns message gần nhất, bỏ hẳn lượt cũ
+    # "summary": giữ message gần nhất theo token budget, lượt cũ gấp thành tóm tắt (xem RollingSummaryMemory)
+    memory_mode: str = "turns"
+    memory_token_budget: int = 1500  # Giới hạn token (ước lượng) của phần lịch sử hội thoại khi memory_mode="summary"
     max_warmup_questions: int = 0
     demo_mode: bool = True  # ✅ THÊM: Flag để demo
+    speculative_generation: bool = False  # Sinh sẵn câu hỏi tiếp theo song song với chấm điểm
+    combined_evaluate_and_ask: bool = False  # Chấm điểm + sinh câu hỏi trong 1 lần gọi LLM
+    use_question_bank: bool = False  # Lấy câu hỏi từ ngân hàng sinh trước khi tạo batch
+    question_bank_size: int = 8  # Số câu hỏi sinh trước cho mỗi độ khó
+    question_bank_personalize: bool = True  # Cá nhân hóa nhẹ câu hỏi lấy từ ngân hàng
+    evaluator_top_k: int = 6  # Số chunk tài liệu liên quan đưa vào prompt chấm điểm (0 = toàn bộ knowledge_text)
+    evaluator_token_budget: int = 3000  # Giới hạn token (ước lượng) cho phần tài liệu khi chấm điểm
+    prompt_prefix_cache: bool = False  # Cache phía provider cho prefix tĩnh (tài liệu + outline + topic)
+    # "threshold": chạy tới max_attempts/max_questions/max_upper_level như cũ
+    # "adaptive": thêm điều kiện dừng sớm khi ước lượng năng lực đã ổn định (xem AbilityEstimator)
+    difficulty_policy: str = "threshold"
+    ability_min_questions: int = 3  # Số câu kỹ thuật tối thiểu trước khi được dừng sớm
+    ability_stop_confidence: float = 0.8  # Xác suất năng lực không vượt qua ranh giới level gần nhất để coi là ổn định
+    ability_stop_sd: float = 0.6  # Hoặc độ lệch chuẩn hậu nghiệm đủ nhỏ (ước lượng đã chính xác dù sát ranh giới)
+    ability_prior_sd: float = 2.0  # Độ lệch chuẩn của prior (quanh level phân loại từ điểm 40%)
+    ability_noise_sd: float = 1.5  # Độ nhiễu điểm của một câu trả lời
+    # Model riêng theo component (component không có trong map dùng model mặc định), xem model_router.py
+    component_models: Dict[str, str] = field(default_factory=lambda: {
+        "warmup": "gemini-2.5-flash-lite",
+        "closing": "gemini-2.5-flash-lite",
+    })
+    # Giới hạn token (ước lượng) của cả prompt theo component; vượt → cắt memory trước, rồi tới tài liệu
+    # (tài liệu nằm trong prefix batch của question/evaluate_and_ask thì không cắt, xem fit_prompt_to_budget)
+    token_budgets: Dict[str, int] = field(default_factory=lambda: {
+        "question": 32000,
+        "evaluate": 8000,
+        "evaluate_and_ask": 36000,
+    })
     difficulty_map: Dict[Level, List[QuestionDifficulty]] = field(default_factory=lambda: {
         Level.YEU: [QuestionDifficulty.VERY_EASY, QuestionDifficulty.EASY],
         Level.TRUNG_BINH: [QuestionDifficulty.EASY, QuestionDifficulty.EASY],
@@ -91,9 +137,12 @@ class InterviewContext:
     knowledge_text: str
     outline_summary: str
     config: InterviewConfig
+    question_bank: Dict[str, List[Dict]] = field(default_factory=dict)  # difficulty.value -> câu hỏi sinh trước
+    knowledge_db: Optional[Any] = None  # FAISS store tài liệu của batch (dùng để chấm điểm theo ngữ cảnh)
+    prefix_cache_handle: Optional[str] = None  # Handle cached content của `build_batch_prefix(...)`
 
 
-@dataclass
+@dataclass(slots=True)
 class InterviewRecord:
     """
     Bản ghi trạng thái của một luợt phỏng vấn cho một thí sinh.
@@ -116,6 +165,52 @@ class InterviewRecord:
     finish_reason: Optional[str] = None
     final_score: Optional[float] = None
     created_at: str = field(default_factory=lambda: datetime.datetime.now().isoformat())
+    summary: Optional[Dict] = None  # Tóm tắt tính một lần khi kết thúc, các lần sau đọc lại
+    closing_message: Optional[str] = None  # Lời kết do LLM sinh nền (None = đang dùng lời kết mặc định)
+    ability_estimate: Optional[Dict] = None  # Ước lượng năng lực sau câu gần nhất (difficulty_policy="adaptive")
+    memory_summary: Optional[Dict] = None  # Tóm tắt các lượt cũ của RollingSummaryMemory (None = memory_mode "turns")
+    last_answer: Optional[Dict] = None  # {"key", "response"} của lượt trả lời gần nhất có idempotency key (xem idempotency.py)
+    version: int = 0  # Tăng sau mỗi lần ghi; ghi delta chỉ thành công nếu version chưa đổi (optimistic locking)
+
+
+@dataclass
+class RecordChangeSet:
+    """
+    Thay đổi của một record sau một lượt xử lý, để ghi delta thay vì ghi đè cả document.
+    `history_tail` = các attempt từ vị trí `history_start` trở đi (attempt vừa được trả lời + attempt mới).
+    """
+    fields: Dict[str, Any]
+    history_start: int
+    history_tail: List[QuestionAttempt]
+
+
+class RecordSnapshot:
+    """
+    Chụp trạng thái record TRƯỚC khi processor xử lý (không copy history: một lượt chỉ sửa
+    attempt cuối và thêm attempt mới), rồi tính `RecordChangeSet` sau khi xử lý.
+    """
+
+    def __init__(self, record: InterviewRecord):
+        self.fields = {
+            f.name: copy.copy(getattr(record, f.name))  # copy nông: memory bị sửa tại chỗ
+            for f in fields(record) if f.name != "history"
+        }
+        self.history_len = len(record.history)
+        self.last_attempt = copy.copy(record.history[-1]) if record.history else None
+
+    def changes(self, record: InterviewRecord) -> RecordChangeSet:
+        changed = {}
+        for name, before in self.fields.items():
+            value = getattr(record, name)
+            if value != before:
+                changed[name] = value
+
+        start = self.history_len
+        if len(record.history) < self.history_len:
+            start = 0  # history bị thu ngắn (không xảy ra trong process_answer) → ghi lại toàn bộ
+        elif self.last_attempt is not None and record.history[start - 1] != self.last_attempt:
+            start -= 1
+        return RecordChangeSet(changed, start, record.history[start:])
 
 
 # =======================
@@ -149,6 +244,122 @@ def calculate_question_hash(question: str) -> str:
     return hashlib.md5(question.encode()).hexdigest()
 
 
+class QuestionStreamParser:
+    """
+    Trích dần giá trị field "question" từ JSON mà LLM đang sinh (chưa hoàn chỉnh),
+    để stream câu hỏi ra trình duyệt trước khi có đủ JSON.
+    """
+
+    _KEY = re.compile(r'"question"\s*:\s*"')
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = None  # Vị trí ký tự tiếp theo của chuỗi question trong buffer
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """Nhận thêm một đoạn output, trả về phần text mới của question (có thể rỗng)."""
+        self.buffer += chunk
+        if self.done:
+            return ""
+        if self.pos is None:
+            match = self._KEY.search(self.buffer)
+            if not match:
+                return ""
+            self.pos = match.end()
+
+        out = []
+        buf, i = self.buffer, self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch == "\\":
+                # Escape chưa nhận đủ → đợi chunk sau
+                if i + 1 >= len(buf):
+                    break
+                esc = buf[i + 1]
+                if esc == "u":
+                    if i + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[i + 2:i + 6], 16)))
+                    except ValueError:
+                        pass
+                    i += 6
+                    continue
+                out.append(self._ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            out.append(ch)
+            i += 1
+        self.pos = i
+        return "".join(out)
+
+
+def build_batch_prefix(topic: str, knowledge_text: str, outline_summary: str) -> str:
+    """
+    Phần tĩnh của batch (topic, tài liệu, tóm tắt) đặt ở ĐẦU các prompt sinh câu hỏi.
+    Giống hệt nhau ở mọi lượt → có thể cache phía provider (xem prompt_cache.py).
+    """
+    return f"""
+        =====================
+        CHỦ ĐỀ PHỎNG VẤN
+        =====================
+        {topic}
+
+        =====================
+        TÀI LIỆU THAM KHẢO
+        =====================
+        {knowledge_text if knowledge_text else "Không có tài liệu"}
+
+        =====================
+        TÓM TẮT HOẶC OUTLINE
+        =====================
+        {outline_summary or "Không có"}
+"""
+
+
+def retrieve_relevant_knowledge(
+        knowledge_db,
+        query: str,
+        top_k: int,
+        token_budget: int,
+        fallback_text: str = ""
+) -> str:
+    """
+    Lấy top-k chunk tài liệu liên quan tới `query` từ FAISS store, dừng khi vượt `token_budget`.
+    Không có store (hoặc lỗi) → cắt `fallback_text` theo budget.
+    """
+    chunks = []
+    if knowledge_db is not None:
+        try:
+            docs = knowledge_db.similarity_search(query, k=top_k)
+        except Exception as e:
+            print(f"⚠️ Lỗi truy vấn tài liệu chấm điểm: {e}")
+            docs = []
+
+        used = 0
+        for doc in docs:
+            content = doc.page_content.strip()
+            cost = estimate_tokens(content)
+            if chunks and used + cost > token_budget:
+                break
+            chunks.append(content)
+            used += cost
+
+    if chunks:
+        return "\n\n---\n\n".join(chunks)
+
+    max_chars = token_budget * 4
+    if len(fallback_text or "") > max_chars:
+        return fallback_text[:max_chars] + "\n\n...(tài liệu bị rút gọn, chỉ hiển thị phần đầu)..."
+    return fallback_text
+
+
 def _sanitize_question(q: str) -> str:
     """Làm sạch chuỗi câu hỏi khỏi ký tự thừa, dấu số thứ tự, backtick..."""
     s = str(q or "").strip()
@@ -240,6 +451,15 @@ def _parse_evaluation_response(raw_text: str) -> dict:
     return {}
 
 
+def _format_code_blocks(question: str) -> str:
+    """Đổi <br> trong các khối <pre><code> thành xuống dòng thật."""
+    return re.sub(
+        r"<pre><code([^>]*)>([\s\S]*?)</code></pre>",
+        lambda m: "<pre><code" + m.group(1) + ">" + m.group(2).replace('<br>', '\n') + "</code></pre>",
+        question
+    )
+
+
 # =======================
 # 3. Memory Manager (Helper Class)
 # =======================
@@ -267,6 +487,145 @@ class ConversationMemory:
         """Lấy list history để lưu lại vào InterviewRecord."""
         return self.memory
 
+    def get_summary(self) -> Optional[Dict]:
+        """Tóm tắt các lượt đã bị bỏ (memory này không giữ tóm tắt)."""
+        return None
+
+    def copy(self) -> "ConversationMemory":
+        """Bản sao độc lập (speculative / cắt prompt không được sửa memory gốc)."""
+        return ConversationMemory(list(self.memory), self.max_turns)
+
+
+class RollingSummaryMemory(ConversationMemory):
+    """
+    Memory theo token budget (`memory_mode="summary"`).
+
+    Message gần nhất được giữ nguyên văn trong ~2/3 budget; message cũ hơn không bị bỏ mà được
+    gấp dần (không gọi LLM) thành các dòng tóm tắt ngắn: câu đã hỏi, ý chính câu trả lời, điểm.
+    Phần tóm tắt dùng 1/3 budget còn lại (quá thì bỏ dòng cũ nhất, chỉ giữ số đếm) → prompt của
+    `build_prompt` không vượt `token_budget` dù phỏng vấn dài bao nhiêu, và model vẫn thấy
+    các chủ đề đã hỏi để không sinh câu hỏi trùng.
+    """
+
+    GIST_CHARS = {"interviewer": 120, "student": 60}
+    SCORE_PATTERN = re.compile(r"📊 Điểm: ([\d.]+)/10")
+
+    def __init__(self, history: List[Dict], summary: Optional[Dict], token_budget: int):
+        super().__init__(history, max_turns=0)
+        summary = summary or {}
+        self.lines: List[str] = list(summary.get("lines", []))
+        self.omitted: int = summary.get("omitted", 0)
+        self.token_budget = token_budget
+
+    def add(self, role: str, content: str):
+        self.memory.append({"role": role, "content": content})
+        self._fit()
+
+    def _fit(self):
+        window_budget = self.token_budget * 2 // 3
+        while len(self.memory) > 1 and estimate_tokens(ConversationMemory.build_prompt(self)) > window_budget:
+            self._fold(self.memory.pop(0))
+
+        # Một message đơn lẻ quá dài → cắt bớt
+        if self.memory and estimate_tokens(self.memory[0]["content"]) > window_budget:
+            message = self.memory[0]
+            self.memory[0] = {**message, "content": message["content"][:window_budget * 4] + "…"}
+
+        while self.lines and estimate_tokens(self._render_summary()) > self.token_budget - window_budget:
+            self.lines.pop(0)
+            self.omitted += 1
+
+    @staticmethod
+    def _gist(content: str, max_chars: int) -> str:
+        text = re.sub(r"<pre>.*?</pre>", " [code] ", content, flags=re.S)
+        text = re.sub(r"<[^>]+>", " ", text)
+        text = " ".join(text.split())
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+    def _fold(self, message: Dict):
+        """Gấp một message vào dòng tóm tắt: `interviewer: <câu hỏi> | student: <trả lời> → điểm`."""
+        score = self.SCORE_PATTERN.search(message["content"])
+        if score:
+            if self.lines:
+                self.lines[-1] += f" → {score.group(1)}/10"
+            return
+
+        entry = f"{message['role']}: {self._gist(message['content'], self.GIST_CHARS.get(message['role'], 80))}"
+        if message["role"] == "student" and self.lines and " | student: " not in self.lines[-1]:
+            self.lines[-1] += f" | {entry}"
+        else:
+            self.lines.append(entry)
+
+    def _render_summary(self) -> str:
+        header = "[Tóm tắt các lượt trước — các chủ đề ĐÃ HỎI]"
+        if self.omitted:
+            header += f" (+{self.omitted} lượt cũ hơn)"
+        return f"{header}\n" + "\n".join(f"- {line}" for line in self.lines)
+
+    def build_prompt(self) -> str:
+        recent = super().build_prompt()
+        if not self.lines:
+            return recent
+        return f"{self._render_summary()}\n\n[Gần đây]\n{recent}"
+
+    def get_summary(self) -> Dict:
+        return {"lines": self.lines, "omitted": self.omitted}
+
+    def copy(self) -> "RollingSummaryMemory":
+        return RollingSummaryMemory(list(self.memory), self.get_summary(), self.token_budget)
+
+
+_over_budget_prefixes = set()  # (hash tài liệu, budget) đã cảnh báo prefix batch vượt budget
+
+
+def fit_prompt_to_budget(
+        build_prompt,
+        knowledge_text: str,
+        memory: Optional[ConversationMemory],
+        token_budget: Optional[int],
+        knowledge_in_prefix: bool = False
+) -> str:
+    """
+    Dựng prompt bằng `build_prompt(knowledge_text, memory)`; nếu vượt `token_budget` thì cắt theo thứ tự:
+    1. Bỏ dần các lượt cũ nhất của conversation memory (giữ lại 2 message gần nhất).
+    2. `knowledge_in_prefix=False`: cắt phần cuối của knowledge_text.
+       `knowledge_in_prefix=True` (batch bật `prompt_prefix_cache` và đã có handle cho prefix chứa
+       knowledge_text): giữ nguyên tài liệu (cắt thì prompt không còn bắt đầu bằng prefix đã đăng ký,
+       prompt cache luôn trượt), chỉ bỏ nốt memory. Riêng prefix + khung prompt đã vượt budget → gửi nguyên và cảnh báo một lần.
+    Không sửa `memory` của caller.
+    """
+    prompt = build_prompt(knowledge_text, memory)
+    if not token_budget or estimate_tokens(prompt) <= token_budget:
+        return prompt
+
+    original_tokens = estimate_tokens(prompt)
+    if memory is not None:
+        memory = memory.copy()
+        while len(memory.memory) > 2 and estimate_tokens(prompt) > token_budget:
+            memory.memory = memory.memory[1:]
+            prompt = build_prompt(knowledge_text, memory)
+
+    overflow = estimate_tokens(prompt) - token_budget
+    if overflow > 0 and knowledge_in_prefix:
+        if memory is not None and memory.memory:
+            memory.memory = []
+            prompt = build_prompt(knowledge_text, memory)
+        if estimate_tokens(prompt) > token_budget:
+            warn_key = (hash(knowledge_text), token_budget)
+            if warn_key not in _over_budget_prefixes:
+                _over_budget_prefixes.add(warn_key)
+                print(f"⚠️ Prefix batch (tài liệu ~{estimate_tokens(knowledge_text or '')} token) vượt budget "
+                      f"{token_budget} token, giữ nguyên để dùng prompt cache")
+    elif overflow > 0 and knowledge_text:
+        keep_chars = max(0, len(knowledge_text) - overflow * 4 - 200)
+        knowledge_text = knowledge_text[:keep_chars] + "\n\n...(tài liệu bị rút gọn do giới hạn độ dài prompt)..."
+        prompt = build_prompt(knowledge_text, memory)
+
+    print(f"✂️ Prompt vượt budget {token_budget} token: ~{original_tokens} → ~{estimate_tokens(prompt)}")
+    return prompt
+
 
 # =======================
 # 4. Component Workers
@@ -286,7 +645,30 @@ class WarmupManager:
             warmup_count: int
     ) -> Dict:  # ✅ ĐỔI: Trả về Dict
         """Tạo câu hỏi warm-up dựa trên context của thí sinh"""
+        prompt = self._build_prompt(candidate_name, candidate_context, topic, warmup_count)
+        result = self.llm.invoke(prompt)
+        return self._parse_result(result, candidate_name)
+
+    async def agenerate_warmup_question(
+            self,
+            candidate_name: str,
+            candidate_context: str,
+            topic: str,
+            warmup_count: int
+    ) -> Dict:
+        """Bản async của `generate_warmup_question` (dùng `ainvoke`)."""
+        prompt = self._build_prompt(candidate_name, candidate_context, topic, warmup_count)
+        result = await self.llm.ainvoke(prompt)
+        return self._parse_result(result, candidate_name)
 
+    def _build_prompt(
+            self,
+            candidate_name: str,
+            candidate_context: str,
+            topic: str,
+            warmup_count: int
+    ) -> str:
+        """Chọn template warm-up theo số câu đã hỏi."""
         warmup_templates = {
             0: f"""
 Bạn là interviewer AI thân thiện và chuyên nghiệp.
@@ -331,8 +713,10 @@ OUTPUT: JSON
 """
         }
 
-        prompt = warmup_templates.get(warmup_count, warmup_templates[1])
-        result = self.llm.invoke(prompt)
+        return warmup_templates.get(warmup_count, warmup_templates[1])
+
+    def _parse_result(self, result: str, candidate_name: str) -> Dict:
+        """Parse câu hỏi warm-up từ output của LLM."""
         parsed = _clean_and_parse_json_response(result)
 
         question = parsed.get("question", f"Xin chào {candidate_name}! Bạn đã sẵn sàng cho buổi phỏng vấn chưa?")
@@ -360,6 +744,36 @@ OUTPUT: JSON
         context = '\n'.join(summary_lines[:10])
         return context if context else profile[:500]
 
+
+# Mô tả độ khó dùng chung cho các prompt sinh câu hỏi
+DIFFICULTY_DESCRIPTIONS = {
+    QuestionDifficulty.VERY_EASY: (
+        "rất cơ bản – kiểm tra sự hiểu biết nền tảng: khái niệm, định nghĩa, hoặc ví dụ minh họa đơn giản. "
+        "Câu trả lời ngắn (1–2 câu), không yêu cầu phân tích sâu. "
+        "Nếu chủ đề liên quan đến lập trình hoặc kỹ thuật, có thể hỏi về cú pháp, chức năng, hoặc mục đích sử dụng cơ bản."
+    ),
+    QuestionDifficulty.EASY: (
+        "cơ bản – yêu cầu người học giải thích ý nghĩa, so sánh, hoặc nêu ví dụ thực tế nhỏ. "
+        "Nếu chủ đề thuộc lĩnh vực kỹ thuật, có thể bao gồm một đoạn mã ngắn (dưới 10 dòng) hoặc tình huống kỹ thuật đơn giản để phân tích."
+    ),
+    QuestionDifficulty.MEDIUM: (
+        "trung cấp – kiểm tra khả năng vận dụng kiến thức vào tình huống cụ thể, hoặc phân tích mối liên hệ giữa các khái niệm. "
+        "Nếu là lĩnh vực phi kỹ thuật, câu hỏi có thể yêu cầu trình bày quan điểm, phân tích nguyên nhân – kết quả, hoặc đánh giá tình huống. "
+        "Nếu là lĩnh vực lập trình, có thể yêu cầu phân tích một đoạn code (15–25 dòng) hoặc mô tả cách giải quyết một vấn đề thực tế nhỏ."
+    ),
+    QuestionDifficulty.HARD: (
+        "nâng cao – yêu cầu tư duy phản biện, đánh giá hoặc tổng hợp thông tin từ nhiều nguồn. "
+        "Thường liên quan đến việc giải thích quyết định, đề xuất giải pháp, hoặc so sánh các phương pháp. "
+        "Nếu chủ đề kỹ thuật, có thể yêu cầu thiết kế mô-đun hoặc phân tích hiệu năng của giải pháp."
+    ),
+    QuestionDifficulty.VERY_HARD: (
+        "rất khó – đòi hỏi năng lực tổng hợp, sáng tạo hoặc ứng dụng vào tình huống phức tạp, có nhiều biến số. "
+        "Câu hỏi thường mở, không có câu trả lời duy nhất, và khuyến khích người học lập luận logic hoặc đưa ra quan điểm có dẫn chứng. "
+        "Nếu chủ đề là lập trình hoặc kỹ thuật, có thể mô phỏng một hệ thống hoàn chỉnh hoặc bài toán thiết kế lớn."
+    )
+}
+
+
 class QuestionGenerator:
     """Component chuyên generate câu hỏi"""
 
@@ -391,70 +805,94 @@ class QuestionGenerator:
             knowledge_text: str,
             memory: ConversationMemory,
             candidate_context: str,
-            outline_summary: str = ""
+            outline_summary: str = "",
+            token_budget: Optional[int] = None,
+            on_delta: Optional[Callable[[str], None]] = None,
+            knowledge_in_prefix: bool = False
     ) -> Dict:  # ✅ ĐỔI: Trả về Dict thay vì str
-        """Generate câu hỏi có nhận thức về thí sinh."""
-
-        difficulty_descriptions = {
-            QuestionDifficulty.VERY_EASY: (
-                "rất cơ bản – kiểm tra sự hiểu biết nền tảng: khái niệm, định nghĩa, hoặc ví dụ minh họa đơn giản. "
-                "Câu trả lời ngắn (1–2 câu), không yêu cầu phân tích sâu. "
-                "Nếu chủ đề liên quan đến lập trình hoặc kỹ thuật, có thể hỏi về cú pháp, chức năng, hoặc mục đích sử dụng cơ bản."
-            ),
-            QuestionDifficulty.EASY: (
-                "cơ bản – yêu cầu người học giải thích ý nghĩa, so sánh, hoặc nêu ví dụ thực tế nhỏ. "
-                "Nếu chủ đề thuộc lĩnh vực kỹ thuật, có thể bao gồm một đoạn mã ngắn (dưới 10 dòng) hoặc tình huống kỹ thuật đơn giản để phân tích."
-            ),
-            QuestionDifficulty.MEDIUM: (
-                "trung cấp – kiểm tra khả năng vận dụng kiến thức vào tình huống cụ thể, hoặc phân tích mối liên hệ giữa các khái niệm. "
-                "Nếu là lĩnh vực phi kỹ thuật, câu hỏi có thể yêu cầu trình bày quan điểm, phân tích nguyên nhân – kết quả, hoặc đánh giá tình huống. "
-                "Nếu là lĩnh vực lập trình, có thể yêu cầu phân tích một đoạn code (15–25 dòng) hoặc mô tả cách giải quyết một vấn đề thực tế nhỏ."
+        """
+        Generate câu hỏi có nhận thức về thí sinh.
+        `on_delta`: nếu có, stream output và gọi on_delta(text mới của question) khi LLM sinh ra.
+        `knowledge_in_prefix`: prefix batch đã được đăng ký prompt cache → không cắt tài liệu khi vượt budget.
+        """
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, mem: self._build_prompt(
+                topic, difficulty, knowledge, mem, candidate_context, outline_summary
             ),
-            QuestionDifficulty.HARD: (
-                "nâng cao – yêu cầu tư duy phản biện, đánh giá hoặc tổng hợp thông tin từ nhiều nguồn. "
-                "Thường liên quan đến việc giải thích quyết định, đề xuất giải pháp, hoặc so sánh các phương pháp. "
-                "Nếu chủ đề kỹ thuật, có thể yêu cầu thiết kế mô-đun hoặc phân tích hiệu năng của giải pháp."
+            knowledge_text, memory, token_budget, knowledge_in_prefix
+        )
+        print(f"Đang tạo câu hỏi độ khó {difficulty.value}...")
+        if on_delta is None:
+            result = self.llm.invoke(prompt)
+        else:
+            result = self._stream(prompt, on_delta)
+        return self._parse_result(result, difficulty)
+
+    def _stream(self, prompt: str, on_delta: Callable[[str], None]) -> str:
+        """Stream output của LLM, đẩy dần phần question qua `on_delta`, trả về toàn bộ output."""
+        parser = QuestionStreamParser()
+        chunks = []
+        for chunk in self.llm.stream(prompt):
+            chunks.append(chunk)
+            delta = parser.feed(chunk)
+            if delta:
+                on_delta(delta)
+        return "".join(chunks)
+
+    async def agenerate_with_context(
+            self,
+            topic: str,
+            difficulty: QuestionDifficulty,
+            knowledge_text: str,
+            memory: ConversationMemory,
+            candidate_context: str,
+            outline_summary: str = "",
+            token_budget: Optional[int] = None,
+            knowledge_in_prefix: bool = False
+    ) -> Dict:
+        """Bản async của `generate_with_context` (dùng `ainvoke`)."""
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, mem: self._build_prompt(
+                topic, difficulty, knowledge, mem, candidate_context, outline_summary
             ),
-            QuestionDifficulty.VERY_HARD: (
-                "rất khó – đòi hỏi năng lực tổng hợp, sáng tạo hoặc ứng dụng vào tình huống phức tạp, có nhiều biến số. "
-                "Câu hỏi thường mở, không có câu trả lời duy nhất, và khuyến khích người học lập luận logic hoặc đưa ra quan điểm có dẫn chứng. "
-                "Nếu chủ đề là lập trình hoặc kỹ thuật, có thể mô phỏng một hệ thống hoàn chỉnh hoặc bài toán thiết kế lớn."
-            )
-        }
+            knowledge_text, memory, token_budget, knowledge_in_prefix
+        )
+        print(f"Đang tạo câu hỏi độ khó {difficulty.value} (async)...")
+        result = await self.llm.ainvoke(prompt)
+        return self._parse_result(result, difficulty)
 
+    def _build_prompt(
+            self,
+            topic: str,
+            difficulty: QuestionDifficulty,
+            knowledge_text: str,
+            memory: ConversationMemory,
+            candidate_context: str,
+            outline_summary: str = ""
+    ) -> str:
+        """Dựng prompt sinh câu hỏi."""
         history_text = memory.build_prompt()
 
-        prompt = f"""
+        # Prefix tĩnh của batch đặt đầu tiên (cache được), phần theo thí sinh/lượt đặt sau
+        prompt = build_batch_prefix(topic, knowledge_text, outline_summary) + f"""
         Bạn là một **Interviewer AI chuyên nghiệp và giàu kinh nghiệm**, được huấn luyện để đánh giá năng lực ứng viên qua phỏng vấn kỹ thuật.
+        Tài liệu tham khảo ở trên có thể rất dài. Hãy đọc chọn lọc và tập trung vào phần LIÊN QUAN đến câu hỏi mới.
 
         =====================
         THÔNG TIN THÍ SINH
         =====================
         {candidate_context}
 
-        =====================
-        CHỦ ĐỀ PHỎNG VẤN
-        =====================
-        {topic}
-
         =====================
         LỊCH SỬ HỘI THOẠI (gần đây)
         =====================
         {history_text or "Chưa có lịch sử hội thoại"}
 
-        =====================
-        TÀI LIỆU THAM KHẢO
-        =====================
-        Tài liệu có thể rất dài. Hãy đọc chọn lọc và tập trung vào phần LIÊN QUAN đến câu hỏi mới.
-        {knowledge_text if knowledge_text else "Không có tài liệu"}
-
-        
-        
         =====================
         NHIỆM VỤ
         =====================
         Tạo ra **một câu hỏi phỏng vấn cá nhân hóa** cho thí sinh ở độ khó:
-        ➡️{difficulty.value} {difficulty_descriptions[difficulty]}
+        ➡️{difficulty.value} {DIFFICULTY_DESCRIPTIONS[difficulty]}
 
         Câu hỏi cần:
         1. Phù hợp với năng lực và phong cách trả lời trước đây của thí sinh.  
@@ -472,11 +910,7 @@ class QuestionGenerator:
         - Với những câu hỏi dạng lý thuyết/ khái niệm , chỉ đưa ra câu hỏi khi chắc chắn tìm được câu trả lời trong tài liệu.
         - hãy chú ý tránh hỏi những gì mà tài liệu bị đánh giá là thiếu sót dựa vào bản tóm tắt của llm.
         8. Không yêu cầu viêt code, vì là buổi phong vấn hỏi đáp.
-        =====================
-        TÓM TẮT HOẶC OUTLINE
-        =====================
-        {outline_summary or "Không có"}
-        
+
         =====================
         ĐỊNH DẠNG ĐẦU RA
         =====================
@@ -490,18 +924,16 @@ class QuestionGenerator:
 
         ⚠️ Không thêm mô tả, không trả về văn bản ngoài JSON.
         """
-        print(f"Đang tạo câu hỏi độ khó {difficulty.value}...")
-        result = self.llm.invoke(prompt)
+        return prompt
+
+    def _parse_result(self, result: str, difficulty: QuestionDifficulty) -> Dict:
+        """Parse câu hỏi + time_limit từ output của LLM."""
         parsed = _clean_and_parse_json_response(result)
 
         question = parsed.get("question", "Bạn có thể giải thích thêm được không?")
 
         # Format code blocks
-        question = re.sub(
-            r"<pre><code([^>]*)>([\s\S]*?)</code></pre>",
-            lambda m: f"<pre><code{m.group(1)}>{m.group(2).replace('<br>', '\n')}</code></pre>",
-            question
-        )
+        question = _format_code_blocks(question)
 
         # ✅ Nếu LLM không trả time_limit → tự tính
         if "time_limit" not in parsed or not parsed["time_limit"]:
@@ -516,6 +948,140 @@ class QuestionGenerator:
             "time_limit": time_limit
         }
 
+    # -----------------------------------------------------------------
+    # Ngân hàng câu hỏi sinh trước (question bank)
+    # -----------------------------------------------------------------
+    def generate_question_pool(
+            self,
+            topic: str,
+            difficulty: QuestionDifficulty,
+            knowledge_text: str,
+            outline_summary: str,
+            count: int
+    ) -> List[Dict]:
+        """
+        Sinh một lượt `count` câu hỏi độc lập với thí sinh cho một độ khó.
+        Chỉ gọi một lần mỗi batch (background job), không dùng trong lúc phỏng vấn.
+        """
+        prompt = build_batch_prefix(topic, knowledge_text, outline_summary) + f"""
+        Bạn là một **Interviewer AI chuyên nghiệp**, đang soạn ngân hàng câu hỏi cho một đợt phỏng vấn.
+
+        =====================
+        NHIỆM VỤ
+        =====================
+        Soạn {count} câu hỏi phỏng vấn KHÁC NHAU ở độ khó:
+        ➡️{difficulty.value} {DIFFICULTY_DESCRIPTIONS[difficulty]}
+
+        Yêu cầu:
+        1. Mỗi câu hỏi bao phủ một phần kiến thức khác nhau của tài liệu.
+        2. Chỉ hỏi lý thuyết khi chắc chắn tài liệu có câu trả lời.
+        3. Không chào hỏi, không lời chuyển tiếp (sẽ được cá nhân hóa sau).
+        4. Không yêu cầu viết code. Có thể kèm ví dụ code dùng thẻ <pre><code class='language-java'>...</code></pre>
+
+        =====================
+        ĐỊNH DẠNG ĐẦU RA
+        =====================
+        Trả về JSON hợp lệ duy nhất dạng:
+
+        {{
+          "questions": [
+            {{"question": "<nội dung câu hỏi>", "time_limit": <số giây>}}
+          ]
+        }}
+
+        ⚠️ Không thêm mô tả, không trả về văn bản ngoài JSON.
+        """
+        print(f"🏦 Đang sinh ngân hàng {count} câu hỏi độ khó {difficulty.value}...")
+        result = self.llm.invoke(prompt)
+
+        parsed = _parse_evaluation_response(result)
+        pool = []
+        for item in parsed.get("questions", []) if isinstance(parsed, dict) else []:
+            if not isinstance(item, dict):
+                continue
+            question = _format_code_blocks(_sanitize_question(item.get("question", "")))
+            if not question:
+                continue
+            try:
+                time_limit = int(item["time_limit"])
+            except (KeyError, TypeError, ValueError):
+                time_limit = self._estimate_time_limit(difficulty, question)
+            pool.append({
+                "question": question,
+                "difficulty": difficulty.value,
+                "time_limit": time_limit,
+                "question_hash": calculate_question_hash(question)
+            })
+        return pool
+
+    def personalize_question(
+            self,
+            bank_question: Dict,
+            memory: ConversationMemory,
+            candidate_context: str
+    ) -> Dict:
+        """
+        Cá nhân hóa nhẹ một câu hỏi lấy từ ngân hàng (thêm lời chuyển tiếp theo hội thoại).
+        Prompt ngắn, KHÔNG kèm tài liệu tham khảo. Lỗi → dùng nguyên câu hỏi gốc.
+        """
+        prompt = self._build_personalize_prompt(bank_question, memory, candidate_context)
+        try:
+            result = self.llm.invoke(prompt)
+        except RateLimitedError:
+            raise  # Hết quota → route trả 503 + Retry-After, không dùng kết quả mặc định
+        except Exception as e:
+            print(f"⚠️ Lỗi cá nhân hóa câu hỏi: {e}")
+            return bank_question
+        return self._parse_personalized(result, bank_question)
+
+    async def apersonalize_question(
+            self,
+            bank_question: Dict,
+            memory: ConversationMemory,
+            candidate_context: str
+    ) -> Dict:
+        """Bản async của `personalize_question` (dùng `ainvoke`)."""
+        prompt = self._build_personalize_prompt(bank_question, memory, candidate_context)
+        try:
+            result = await self.llm.ainvoke(prompt)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lỗi cá nhân hóa câu hỏi: {e}")
+            return bank_question
+        return self._parse_personalized(result, bank_question)
+
+    def _build_personalize_prompt(
+            self,
+            bank_question: Dict,
+            memory: ConversationMemory,
+            candidate_context: str
+    ) -> str:
+        return f"""
+        Bạn là interviewer AI thân thiện. Hãy viết lại câu hỏi phỏng vấn dưới đây cho phù hợp với thí sinh.
+
+        THÔNG TIN THÍ SINH:
+        {candidate_context}
+
+        LỊCH SỬ HỘI THOẠI (gần đây):
+        {memory.build_prompt() or "Chưa có lịch sử hội thoại"}
+
+        CÂU HỎI GỐC:
+        {bank_question["question"]}
+
+        YÊU CẦU:
+        - Thêm một lời nhận xét/chuyển tiếp ngắn từ câu trả lời trước (nếu có).
+        - GIỮ NGUYÊN nội dung chuyên môn, độ khó và mọi đoạn code của câu hỏi gốc.
+
+        OUTPUT: JSON {{"question": "<câu hỏi đã cá nhân hóa>"}}
+        """
+
+    def _parse_personalized(self, result: str, bank_question: Dict) -> Dict:
+        question = _clean_and_parse_json_response(result).get("question")
+        if not question:
+            return bank_question
+        return {**bank_question, "question": _format_code_blocks(question)}
+
 class AnswerEvaluator:
     """Component chuyên chấm điểm câu trả lời"""
 
@@ -526,33 +1092,52 @@ class AnswerEvaluator:
             self,
             question: str,
             answer: str,
-            knowledge_text: str
+            knowledge_text: str,
+            token_budget: Optional[int] = None
     ) -> Tuple[float, str]:
         """Đánh giá câu trả lời chi tiết, có thang điểm rõ ràng và phân tích ngắn."""
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, _: self._build_prompt(question, answer, knowledge),
+            knowledge_text, None, token_budget
+        )
+        try:
+            result = self.llm.invoke(prompt)
+            return self._parse_result(result)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lỗi khi chấm điểm: {e}")
+            return 5.0, "Lỗi khi chấm điểm, mặc định 5/10"
 
-        # Nếu knowledge quá dài, rút gọn nhưng thông báo cho LLM biết
-        # truncated_knowledge = knowledge_text
-        # if len(knowledge_text) > 10000:
-        #     truncated_knowledge = knowledge_text[:8000] + "\n\n...(tài liệu bị rút gọn, chỉ hiển thị phần đầu)..."
+    async def aevaluate(
+            self,
+            question: str,
+            answer: str,
+            knowledge_text: str,
+            token_budget: Optional[int] = None
+    ) -> Tuple[float, str]:
+        """Bản async của `evaluate` (dùng `ainvoke`)."""
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, _: self._build_prompt(question, answer, knowledge),
+            knowledge_text, None, token_budget
+        )
+        try:
+            result = await self.llm.ainvoke(prompt)
+            return self._parse_result(result)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lỗi khi chấm điểm: {e}")
+            return 5.0, "Lỗi khi chấm điểm, mặc định 5/10"
 
+    def _build_prompt(self, question: str, answer: str, knowledge_text: str) -> str:
+        """Dựng prompt chấm điểm."""
+        # knowledge_text ở đây đã được thu hẹp theo câu hỏi/câu trả lời
+        # (xem `InterviewProcessor._evaluator_knowledge`).
+        # Phần hướng dẫn chấm điểm giống nhau mọi lượt → đặt đầu prompt; dữ liệu của lượt đặt cuối.
         prompt = f"""
     Bạn là **giám khảo phỏng vấn kỹ thuật chuyên nghiệp**, nhiệm vụ của bạn là **chấm điểm câu trả lời của ứng viên** dựa trên **tài liệu tham khảo**.
 
-    ========================
-    CÂU HỎI:
-    ========================
-    {question}
-
-    ========================
-    CÂU TRẢ LỜI CỦA ỨNG VIÊN:
-    ========================
-    {answer}
-
-    ========================
-    TÀI LIỆU THAM KHẢO:
-    ========================
-    {knowledge_text or "Không có tài liệu"}
-
     ========================
     HƯỚNG DẪN CHẤM ĐIỂM:
     ========================
@@ -579,35 +1164,247 @@ class AnswerEvaluator:
     }}
 
     ⚠️ Không trả về text khác ngoài JSON.
-    """
 
-        try:
-            result = self.llm.invoke(prompt)
-            parsed = _parse_evaluation_response(result)
+    ========================
+    TÀI LIỆU THAM KHẢO:
+    ========================
+    {knowledge_text or "Không có tài liệu"}
 
-            score = float(parsed.get("score", 5.0))
-            analysis = parsed.get("analysis", "Không có nhận xét")
+    ========================
+    CÂU HỎI:
+    ========================
+    {question}
 
-            # Chuẩn hóa điểm
-            score = max(0.0, min(10.0, score))
+    ========================
+    CÂU TRẢ LỜI CỦA ỨNG VIÊN:
+    ========================
+    {answer}
+    """
+        return prompt
 
-            return score, analysis
+    def _parse_result(self, result: str) -> Tuple[float, str]:
+        """Parse điểm + nhận xét từ output của LLM."""
+        parsed = _parse_evaluation_response(result)
 
-        except Exception as e:
-            print(f"⚠️ Lỗi khi chấm điểm: {e}")
-            return 5.0, "Lỗi khi chấm điểm, mặc định 5/10"
+        score = float(parsed.get("score", 5.0))
+        analysis = parsed.get("analysis", "Không có nhận xét")
 
+        # Chuẩn hóa điểm
+        score = max(0.0, min(10.0, score))
 
-class DifficultyAdapter:
-    """Component điều chỉnh độ khó"""
+        return score, analysis
 
-    def decide_next_action(self, score: float, config: InterviewConfig) -> str:
-        """Quyết định action tiếp theo"""
-        if score >= config.threshold_high:
-            return "harder"
-        if score >= config.threshold_low:
-            return "same"
-        return "easier"
+
+class EvaluateAndAskGenerator:
+    """
+    Component gộp chấm điểm + sinh câu hỏi tiếp theo trong MỘT lần gọi LLM.
+    Tài liệu tham khảo chỉ được gửi một lần thay vì hai.
+    """
+
+    def __init__(self, llm: GoogleGenerativeAI, question_generator: QuestionGenerator):
+        self.llm = llm
+        self.question_generator = question_generator
+
+    def evaluate_and_ask(
+            self,
+            topic: str,
+            question: str,
+            answer: str,
+            knowledge_text: str,
+            memory: ConversationMemory,
+            candidate_context: str,
+            branches: Dict[str, Optional[QuestionDifficulty]],
+            config: InterviewConfig,
+            outline_summary: str = "",
+            knowledge_in_prefix: bool = False
+    ) -> Optional[Dict]:
+        """
+        Chấm điểm câu trả lời và sinh câu hỏi tiếp theo theo độ khó mà model tự chọn.
+
+        Args:
+            branches: Độ khó tương ứng với từng action ("harder" | "same" | "easier"),
+                      None nếu nhánh đó kết thúc phỏng vấn.
+
+        Returns:
+            Dict gồm score / analysis / next_question (None nếu model không sinh câu hỏi hợp lệ),
+            hoặc None nếu không parse được (caller tự fallback về 2 lần gọi).
+        """
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, mem: self._build_prompt(
+                topic, question, answer, knowledge, mem,
+                candidate_context, branches, config, outline_summary
+            ),
+            knowledge_text, memory, config.token_budgets.get("evaluate_and_ask"), knowledge_in_prefix
+        )
+        try:
+            result = self.llm.invoke(prompt)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lỗi khi gọi evaluate-and-ask: {e}")
+            return None
+        return self._parse_result(result)
+
+    async def aevaluate_and_ask(
+            self,
+            topic: str,
+            question: str,
+            answer: str,
+            knowledge_text: str,
+            memory: ConversationMemory,
+            candidate_context: str,
+            branches: Dict[str, Optional[QuestionDifficulty]],
+            config: InterviewConfig,
+            outline_summary: str = "",
+            knowledge_in_prefix: bool = False
+    ) -> Optional[Dict]:
+        """Bản async của `evaluate_and_ask` (dùng `ainvoke`)."""
+        prompt = fit_prompt_to_budget(
+            lambda knowledge, mem: self._build_prompt(
+                topic, question, answer, knowledge, mem,
+                candidate_context, branches, config, outline_summary
+            ),
+            knowledge_text, memory, config.token_budgets.get("evaluate_and_ask"), knowledge_in_prefix
+        )
+        try:
+            result = await self.llm.ainvoke(prompt)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Lỗi khi gọi evaluate-and-ask: {e}")
+            return None
+        return self._parse_result(result)
+
+    def _build_prompt(
+            self,
+            topic: str,
+            question: str,
+            answer: str,
+            knowledge_text: str,
+            memory: ConversationMemory,
+            candidate_context: str,
+            branches: Dict[str, Optional[QuestionDifficulty]],
+            config: InterviewConfig,
+            outline_summary: str = ""
+    ) -> str:
+        """Dựng prompt gộp chấm điểm + sinh câu hỏi."""
+        def describe(difficulty: Optional[QuestionDifficulty]) -> str:
+            if difficulty is None:
+                return '"none" (phỏng vấn sẽ kết thúc, đặt "question" là chuỗi rỗng)'
+            return f'"{difficulty.value}" – {DIFFICULTY_DESCRIPTIONS[difficulty]}'
+
+        history_text = memory.build_prompt()
+
+        prompt = build_batch_prefix(topic, knowledge_text, outline_summary) + f"""
+        Bạn là một **Interviewer AI chuyên nghiệp**, vừa là giám khảo chấm điểm, vừa là người đặt câu hỏi tiếp theo.
+
+        =====================
+        THÔNG TIN THÍ SINH
+        =====================
+        {candidate_context}
+
+        =====================
+        LỊCH SỬ HỘI THOẠI (gần đây)
+        =====================
+        {history_text or "Chưa có lịch sử hội thoại"}
+
+        =====================
+        CÂU HỎI VỪA HỎI
+        =====================
+        {question}
+
+        =====================
+        CÂU TRẢ LỜI CỦA ỨNG VIÊN
+        =====================
+        {answer}
+
+        =====================
+        BƯỚC 1 – CHẤM ĐIỂM
+        =====================
+        1️⃣ Xác định 2–5 ý chính trong câu trả lời.
+        2️⃣ Đối chiếu từng ý với tài liệu: khớp chính xác → 2 điểm, đúng một phần → 1 điểm, sai → 0 điểm.
+        3️⃣ Điểm = (điểm trung bình các ý) × 10 / 2, giới hạn 0–10. Không đủ dữ kiện → 5.0.
+        4️⃣ Nhận xét ngắn gọn (1–3 câu), khách quan, mang tính khích lệ.
+
+        =====================
+        BƯỚC 2 – CHỌN ĐỘ KHÓ TIẾP THEO
+        =====================
+        - Nếu score >= {config.threshold_high}: độ khó {describe(branches.get("harder"))}
+        - Nếu {config.threshold_low} <= score < {config.threshold_high}: độ khó {describe(branches.get("same"))}
+        - Nếu score < {config.threshold_low}: độ khó {describe(branches.get("easier"))}
+
+        =====================
+        BƯỚC 3 – ĐẶT CÂU HỎI TIẾP THEO
+        =====================
+        - Một câu hỏi phỏng vấn cá nhân hóa ở độ khó đã chọn, có lời chuyển tiếp ngắn từ câu trước.
+        - Không trùng lặp với các câu hỏi trong lịch sử hội thoại.
+        - Chỉ hỏi lý thuyết khi chắc chắn tài liệu có câu trả lời. Không yêu cầu viết code.
+        - Có thể kèm ví dụ code dùng thẻ <pre><code class='language-java'>...</code></pre>
+
+        =====================
+        ĐỊNH DẠNG ĐẦU RA
+        =====================
+        Trả về JSON hợp lệ duy nhất dạng:
+
+        {{
+          "score": <float 0-10>,
+          "analysis": "<phân tích ngắn gọn, 1–3 câu>",
+          "next_difficulty": "<độ khó đã chọn ở bước 2>",
+          "question": "<nội dung câu hỏi tiếp theo>",
+          "time_limit": <số giây thí sinh nên dành để trả lời>
+        }}
+
+        ⚠️ Không thêm mô tả, không trả về văn bản ngoài JSON.
+        """
+        return prompt
+
+    def _parse_result(self, result: str) -> Optional[Dict]:
+        """Parse output JSON của prompt gộp, None nếu thiếu score/analysis."""
+        parsed = _parse_evaluation_response(result)
+        if not parsed or "score" not in parsed or "analysis" not in parsed:
+            return None
+
+        try:
+            score = max(0.0, min(10.0, float(parsed["score"])))
+        except (TypeError, ValueError):
+            return None
+
+        try:
+            difficulty = QuestionDifficulty(parsed.get("next_difficulty"))
+        except ValueError:
+            difficulty = None
+
+        question_text = _sanitize_question(parsed.get("question", ""))
+        next_question = None
+        if difficulty is not None and question_text:
+            question_text = _format_code_blocks(question_text)
+            try:
+                time_limit = int(parsed["time_limit"])
+            except (KeyError, TypeError, ValueError):
+                time_limit = self.question_generator._estimate_time_limit(difficulty, question_text)
+            next_question = {
+                "question": question_text,
+                "difficulty": difficulty.value,
+                "time_limit": time_limit
+            }
+
+        return {
+            "score": score,
+            "analysis": parsed.get("analysis") or "Không có nhận xét",
+            "next_question": next_question
+        }
+
+
+class DifficultyAdapter:
+    """Component điều chỉnh độ khó"""
+
+    def decide_next_action(self, score: float, config: InterviewConfig) -> str:
+        """Quyết định action tiếp theo"""
+        if score >= config.threshold_high:
+            return "harder"
+        if score >= config.threshold_low:
+            return "same"
+        return "easier"
 
     def get_next_difficulty(
             self,
@@ -625,6 +1422,160 @@ class DifficultyAdapter:
         return current
 
 
+class AbilityEstimator:
+    """
+    Ước lượng năng lực thí sinh (thang 10) cho `difficulty_policy="adaptive"`.
+
+    Prior chuẩn quanh level phân loại từ điểm 40%; mỗi câu kỹ thuật đã chấm là một quan sát
+    nhiễu chuẩn = điểm + độ lệch độ khó so với MEDIUM (trả lời được câu khó → năng lực cao hơn điểm).
+    Độ tin cậy = xác suất hậu nghiệm năng lực nằm cùng phía với ranh giới level gần nhất
+    (cùng ngưỡng với `classify_level_from_score`). Không dùng khối xác suất trong khoảng của level:
+    YEU/XUAT_SAC hở một đầu nên đạt ngưỡng rất nhanh, còn KHA/GIOI hẹp hầu như không bao giờ đạt.
+    """
+
+    LEVEL_BOUNDS = [
+        (Level.YEU, -math.inf, 5.0),
+        (Level.TRUNG_BINH, 5.0, 6.5),
+        (Level.KHA, 6.5, 8.0),
+        (Level.GIOI, 8.0, 9.0),
+        (Level.XUAT_SAC, 9.0, math.inf),
+    ]
+    BOUNDARIES = [high for _, _, high in LEVEL_BOUNDS[:-1]]
+    PRIOR_MEANS = {
+        Level.YEU: 4.0,
+        Level.TRUNG_BINH: 5.75,
+        Level.KHA: 7.25,
+        Level.GIOI: 8.5,
+        Level.XUAT_SAC: 9.5,
+    }
+    DIFFICULTY_OFFSETS = {
+        QuestionDifficulty.VERY_EASY: -2.0,
+        QuestionDifficulty.EASY: -1.0,
+        QuestionDifficulty.MEDIUM: 0.0,
+        QuestionDifficulty.HARD: 1.0,
+        QuestionDifficulty.VERY_HARD: 2.0,
+    }
+
+    @staticmethod
+    def _normal_cdf(x: float) -> float:
+        return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+    def estimate(
+            self,
+            attempts: List[QuestionAttempt],
+            classified_level: Level,
+            config: InterviewConfig
+    ) -> Dict:
+        """Hậu nghiệm chuẩn-chuẩn từ các câu kỹ thuật đã chấm."""
+        prior_precision = 1.0 / config.ability_prior_sd ** 2
+        noise_precision = 1.0 / config.ability_noise_sd ** 2
+
+        precision = prior_precision
+        weighted = self.PRIOR_MEANS[classified_level] * prior_precision
+        for attempt in attempts:
+            observation = attempt.score + self.DIFFICULTY_OFFSETS[attempt.difficulty]
+            precision += noise_precision
+            weighted += observation * noise_precision
+
+        mean = weighted / precision
+        sd = math.sqrt(1.0 / precision)
+        level = next(bound[0] for bound in self.LEVEL_BOUNDS if bound[1] <= mean < bound[2])
+        boundary_distance = min(abs(mean - boundary) for boundary in self.BOUNDARIES)
+        confidence = self._normal_cdf(boundary_distance / sd)
+        return {
+            "mean": round(mean, 2),
+            "sd": round(sd, 3),
+            "level": level.value,
+            "confidence": round(confidence, 4),
+            "answers": len(attempts),
+        }
+
+    def is_stable(self, estimate: Dict, config: InterviewConfig) -> bool:
+        """Đủ số câu tối thiểu và level ước lượng đã đủ chắc chắn (hoặc ước lượng đã đủ chính xác)."""
+        return (estimate["answers"] >= config.ability_min_questions
+                and (estimate["confidence"] >= config.ability_stop_confidence
+                     or estimate["sd"] <= config.ability_stop_sd))
+
+
+class SpeculationStats:
+    """
+    Thống kê cho chế độ sinh câu hỏi suy đoán (speculative generation).
+    Dùng chung giữa các request nên mọi thao tác đều có lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0          # Số lượt có bật speculation
+        self.hits = 0           # Câu hỏi suy đoán khớp độ khó thực tế
+        self.misses = 0         # Không có nhánh khớp / nhánh lỗi → phải sinh lại
+        self.generated = 0      # Tổng số câu hỏi suy đoán đã gửi LLM
+        self.discarded = 0      # Số câu hỏi suy đoán bị bỏ đi
+        self.finished_turns = 0  # Lượt kết thúc phỏng vấn → bỏ toàn bộ nhánh
+        self.skipped_busy = 0   # Lượt bỏ qua speculation vì executor không đủ worker rảnh
+
+    def record(self, generated: int, hit: bool, discarded: int, finished: bool = False):
+        with self._lock:
+            self.turns += 1
+            self.generated += generated
+            self.discarded += discarded
+            if finished:
+                self.finished_turns += 1
+            elif hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def record_skipped(self):
+        with self._lock:
+            self.skipped_busy += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "turns": self.turns,
+                "skipped_busy": self.skipped_busy,
+                "hits": self.hits,
+                "misses": self.misses,
+                "finished_turns": self.finished_turns,
+                "generated": self.generated,
+                "discarded": self.discarded,
+                "hit_rate": round(self.hits / resolved, 4) if resolved else 0.0,
+                "waste_ratio": round(self.discarded / self.generated, 4) if self.generated else 0.0,
+            }
+
+
+class CombinedCallStats:
+    """Thống kê cho chế độ evaluate-and-ask (1 lần gọi LLM mỗi lượt)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0                  # Số lần gọi prompt gộp
+        self.parse_failures = 0         # Không parse được → fallback 2 lần gọi
+        self.difficulty_mismatches = 0  # Model chọn sai độ khó → sinh lại câu hỏi
+        self.questions_used = 0         # Câu hỏi của prompt gộp được dùng trực tiếp
+
+    def record(self, parsed: bool, question_used: bool = False, mismatch: bool = False):
+        with self._lock:
+            self.calls += 1
+            if not parsed:
+                self.parse_failures += 1
+            if mismatch:
+                self.difficulty_mismatches += 1
+            if question_used:
+                self.questions_used += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "parse_failures": self.parse_failures,
+                "difficulty_mismatches": self.difficulty_mismatches,
+                "questions_used": self.questions_used,
+                "single_call_rate": round(self.questions_used / self.calls, 4) if self.calls else 0.0,
+            }
+
+
 # =======================
 # 5. BỘ XỬ LÝ LOGIC PHỎNG VẤN (STATELESS PROCESSOR)
 # =======================
@@ -636,16 +1587,65 @@ class InterviewProcessor:
     Không tự mình load model hay kết nối DB.
     """
 
-    def __init__(self, llm: GoogleGenerativeAI):
-        """Khởi tạo processor với các dependency cần thiết (LLM)."""
+    def __init__(self, llm: GoogleGenerativeAI, response_cache=None, hedge_policy=None, model_router=None,
+                 speculative_workers: int = 8):
+        """
+        Khởi tạo processor với các dependency cần thiết (LLM; cache kết quả, hedge, router model nếu có).
+        `speculative_workers`: số worker của executor chạy nhánh speculative (dùng chung mọi request).
+        """
         self.llm = llm
+        self.model_router = model_router
+        self.response_cache = response_cache
+        self.hedge_policy = hedge_policy
 
         # Khởi tạo các component worker
-        self.warmup_manager = WarmupManager(self.llm)
-        self.question_generator = QuestionGenerator(self.llm)
-        self.answer_evaluator = AnswerEvaluator(self.llm)
+        # Mỗi component một MeteredLLM → log token/thời gian được gắn nhãn component (xem llm_usage.py)
+        self.warmup_manager = WarmupManager(self._component_llm("warmup"))
+        self.question_generator = QuestionGenerator(self._component_llm("question"))
+        self.answer_evaluator = AnswerEvaluator(self._component_llm("evaluate"))
         self.difficulty_adapter = DifficultyAdapter()
-        self.closing_generator = ClosingGenerator(self.llm)  # ✅ THÊM
+        self.ability_estimator = AbilityEstimator()
+        self.closing_generator = ClosingGenerator(self._component_llm("closing"))  # ✅ THÊM
+        self.evaluate_and_ask = EvaluateAndAskGenerator(
+            self._component_llm("evaluate_and_ask"), self.question_generator
+        )
+        self.combined_stats = CombinedCallStats()
+
+        # Executor dùng chung cho chế độ speculative generation; semaphore đếm worker còn rảnh
+        # để lượt nào không đủ worker thì bỏ speculation thay vì xếp hàng sau request khác
+        self.speculation_stats = SpeculationStats()
+        self._executor = ThreadPoolExecutor(max_workers=speculative_workers, thread_name_prefix="interview-speculative")
+        self._free_speculative_workers = threading.BoundedSemaphore(speculative_workers)
+
+    @staticmethod
+    def _bind_batch(batch_id: str, context: InterviewContext):
+        """Gắn batch cho log token (llm_usage) và model theo component của batch (model_router)."""
+        current_batch_id.set(batch_id)
+        current_component_models.set(context.config.component_models or {})
+
+    @staticmethod
+    def _knowledge_in_prefix(context: InterviewContext) -> bool:
+        """Prefix batch (chứa tài liệu) đang được prompt cache → budget không được cắt tài liệu."""
+        return context.config.prompt_prefix_cache and context.prefix_cache_handle is not None
+
+    @staticmethod
+    def _memory(record: InterviewRecord, config: InterviewConfig) -> ConversationMemory:
+        """Memory hội thoại của record theo `config.memory_mode`."""
+        if config.memory_mode == "summary":
+            return RollingSummaryMemory(record.conversation_memory, record.memory_summary, config.memory_token_budget)
+        return ConversationMemory(record.conversation_memory, config.max_memory_turns)
+
+    def _component_llm(self, component: str):
+        """
+        LLM của một component: đo token/thời gian, hedge request chậm nếu component bật hedge,
+        tra cache trước nếu component bật cache (cache hit không tính là lượt gọi LLM).
+        """
+        llm = MeteredLLM(self.model_router.route(component) if self.model_router else self.llm, component)
+        if self.hedge_policy:
+            llm = self.hedge_policy.wrap(llm, component)
+        if self.response_cache:
+            llm = self.response_cache.wrap(llm, component)
+        return llm
 
     def start_new_record(
             self,
@@ -653,108 +1653,74 @@ class InterviewProcessor:
             candidate_name: str,
             candidate_profile: str,
             classified_level: Level,
-            context: InterviewContext
+            context: InterviewContext,
+            on_delta: Optional[Callable[[str], None]] = None
     ) -> Tuple[InterviewRecord, Dict]:
         """
         Khởi tạo một bản ghi phỏng vấn mới cho thí sinh.
+        `on_delta`: callback nhận dần text câu hỏi kỹ thuật khi stream (xem `/interview/start_candidate_stream`).
         """
+        self._bind_batch(batch_id, context)
         config = context.config
-        initial_difficulty = get_initial_difficulty(classified_level, config)
-        candidate_context = self.warmup_manager.extract_candidate_context(candidate_profile)
-
-        # ✅ LOGIC MỚI: Kiểm tra xem có cần Warmup không
-        # Nếu max_warmup_questions > 0 thì vào WARMUP, ngược lại vào TECHNICAL luôn
-        start_phase = InterviewPhase.WARMUP if config.max_warmup_questions > 0 else InterviewPhase.TECHNICAL
-
-        # Tạo bản ghi trạng thái ban đầu
-        record = InterviewRecord(
-            batch_id=batch_id,
-            candidate_name=candidate_name,
-            candidate_profile=candidate_profile,
-            candidate_context=candidate_context,
-            classified_level=classified_level,
-            current_difficulty=initial_difficulty,
-            current_phase=start_phase,  # ✅ Dùng biến đã check
-            attempts_at_current_level=0,
-            total_questions_asked=0,
-            upper_level_reached=0,
-            warmup_questions_asked=0,
-            history=[],
-            conversation_memory=[],
-            is_finished=False
-        )
-
-        first_q_data = {}
+        record = self._create_record(batch_id, candidate_name, candidate_profile, classified_level, config)
 
         # ---------------------------------------------------------
         # TRƯỜNG HỢP 1: CÓ WARMUP
         # ---------------------------------------------------------
-        if start_phase == InterviewPhase.WARMUP:
+        if record.current_phase == InterviewPhase.WARMUP:
             warmup_data = self.warmup_manager.generate_warmup_question(
                 candidate_name=candidate_name.split(',')[0],
-                candidate_context=candidate_context,
+                candidate_context=record.candidate_context,
                 topic=context.topic,
                 warmup_count=0
             )
-
-            first_q_data = warmup_data
-
-            # Thêm vào history
-            record.history.append(QuestionAttempt(
-                question=warmup_data["question"],
-                answer="",
-                score=0.0,
-                analysis="(warmup - không chấm điểm)",
-                difficulty=QuestionDifficulty.VERY_EASY,
-                timestamp=datetime.datetime.now().isoformat(),
-                question_hash=calculate_question_hash(warmup_data["question"]),
-                time_limit=warmup_data["time_limit"]
-            ))
+            return record, self._first_warmup_question(record, warmup_data)
 
         # ---------------------------------------------------------
         # TRƯỜNG HỢP 2: KHÔNG WARMUP -> VÀO TECHNICAL LUÔN
         # ---------------------------------------------------------
-        else:
-            # Tạo memory trống ban đầu
-            memory = ConversationMemory([], config.max_memory_turns)
-
-            # Generate câu hỏi kỹ thuật đầu tiên
-            tech_data = self.question_generator.generate_with_context(
-                context.topic,
-                record.current_difficulty,
-                context.knowledge_text,
-                memory,
-                record.candidate_context,
-                context.outline_summary
-            )
-
-            first_q_data = {
-                "question": tech_data["question"],
-                "difficulty": tech_data["difficulty"],
-                "time_limit": tech_data["time_limit"],
-                "phase": "technical"
-            }
-
-            # Thêm vào history
-            record.history.append(QuestionAttempt(
-                question=tech_data["question"],
-                answer="",
-                score=0.0,
-                analysis="(pending)",
-                difficulty=record.current_difficulty,
-                timestamp=datetime.datetime.now().isoformat(),
-                question_hash=calculate_question_hash(tech_data["question"]),
-                time_limit=tech_data["time_limit"]
-            ))
+        # Generate câu hỏi kỹ thuật đầu tiên (memory trống ban đầu)
+        tech_data = self._generate_question(
+            record, context, self._memory(record, config), record.current_difficulty,
+            on_delta=on_delta
+        )
+        return record, self._first_technical_question(record, tech_data)
 
-        return record, first_q_data
+    @staticmethod
+    def pending_question(record: InterviewRecord) -> Optional[Dict]:
+        """
+        Câu hỏi đang chờ trả lời (attempt cuối) của record chưa kết thúc, để resume khi thí sinh
+        tải lại trang / mất mạng mà không sinh câu hỏi mới. None nếu không có câu nào đang chờ.
+        `remaining_time` = time_limit trừ thời gian đã trôi qua kể từ lúc hỏi (không âm).
+        """
+        if record.is_finished or not record.history:
+            return None
+        attempt = record.history[-1]
+        if attempt.time_spent is not None:  # process_answer luôn ghi time_spent → đã trả lời
+            return None
+
+        remaining_time = None
+        if attempt.time_limit:
+            asked_at = datetime.datetime.fromisoformat(attempt.timestamp)
+            elapsed = (datetime.datetime.now() - asked_at).total_seconds()
+            remaining_time = max(0, int(attempt.time_limit - elapsed))
+        return {
+            "question": attempt.question,
+            "difficulty": attempt.difficulty.value,
+            "time_limit": attempt.time_limit,
+            "remaining_time": remaining_time,
+            "phase": record.current_phase.value,
+            "question_number": len(record.history),
+            "audio_id": attempt.audio_id
+        }
 
     def process_answer(
             self,
             record: InterviewRecord,
             context: InterviewContext,
             answer: str,
-            time_spent: int = 0  # ✅ THÊM: thời gian thí sinh đã dùng (giây)
+            time_spent: int = 0,  # ✅ THÊM: thời gian thí sinh đã dùng (giây)
+            on_delta: Optional[Callable[[str], None]] = None
     ) -> Tuple[InterviewRecord, Dict]:
         """
         Xử lý câu trả lời của thí sinh, cập nhật bản ghi và tạo câu hỏi tiếp theo.
@@ -764,47 +1730,294 @@ class InterviewProcessor:
             context: Context của batch
             answer: Câu trả lời của thí sinh
             time_spent: Thời gian thí sinh đã dùng (giây)
+            on_delta: Callback nhận dần text câu hỏi tiếp theo khi stream (None = không stream)
 
         Returns:
             - InterviewRecord: Bản ghi trạng thái đã được cập nhật.
             - Dict: Kết quả để trả về cho API (chứa câu hỏi tiếp theo, điểm, time_limit, etc.).
         """
+        self._bind_batch(record.batch_id, context)
+
         if record.is_finished:
-            summary = self._generate_summary(record, context)
-            return record, {"finished": True, "summary": summary}
+            return record, self._finished_result(record, context)
+
+        # ✅ Cập nhật time_spent vào attempt cuối cùng
+        if record.history:
+            record.history[-1].time_spent = time_spent
+
+        if record.current_phase == InterviewPhase.WARMUP:
+            return self._handle_warmup_answer(record, context, answer, on_delta)
+        elif record.current_phase == InterviewPhase.TECHNICAL:
+            return self._handle_technical_answer(record, context, answer, on_delta)
+        else:  # Closing
+            record.is_finished = True
+            return record, self._finished_result(record, context)
+
+    def _handle_warmup_answer(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            answer: str,
+            on_delta: Optional[Callable[[str], None]] = None
+    ) -> Tuple[InterviewRecord, Dict]:
+        """Xử lý câu trả lời trong giai đoạn warm-up."""
+        memory = self._record_warmup_answer(record, context.config, answer)
+
+        if record.current_phase == InterviewPhase.TECHNICAL:
+            # ✅ Đã chuyển sang giai đoạn technical → sinh câu hỏi chuyên môn đầu tiên
+            next_q_data = self._generate_question(
+                record, context, memory, record.current_difficulty, on_delta=on_delta
+            )
+        else:
+            # ✅ Hỏi câu warm-up tiếp theo (nhận Dict)
+            next_q_data = self.warmup_manager.generate_warmup_question(
+                record.candidate_name.split(',')[0],
+                record.candidate_context,
+                context.topic,
+                record.warmup_questions_asked
+            )
+
+        return record, self._next_warmup_result(record, next_q_data)
+
+    def _handle_technical_answer(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            answer: str,
+            on_delta: Optional[Callable[[str], None]] = None
+    ) -> Tuple[InterviewRecord, Dict]:
+        """Xử lý câu trả lời trong giai đoạn technical."""
+        config = context.config
+        last_attempt = record.history[-1]
+        memory = self._memory(record, config)
+
+        score = analysis = None
+        combined = None
+        speculative = None
+
+        # Evaluate-and-ask: chấm điểm + sinh câu hỏi trong 1 lần gọi LLM
+        if config.combined_evaluate_and_ask:
+            combined = self.evaluate_and_ask.evaluate_and_ask(
+                context.topic,
+                last_attempt.question,
+                answer,
+                context.knowledge_text,
+                memory,
+                record.candidate_context,
+                self._predict_branches(record, config),
+                config,
+                context.outline_summary,
+                knowledge_in_prefix=self._knowledge_in_prefix(context)
+            )
+            if combined is None:
+                self.combined_stats.record(parsed=False)
+                print("⚠️ Evaluate-and-ask không parse được → fallback 2 lần gọi")
+            else:
+                score, analysis = combined["score"], combined["analysis"]
+
+        if score is None:
+            # Speculative: sinh sẵn câu hỏi cho các nhánh độ khó trong lúc chấm điểm
+            if config.speculative_generation:
+                speculative = self._start_speculation(record, context, memory, answer)
+
+            # Chấm điểm
+            score, analysis = self.answer_evaluator.evaluate(
+                last_attempt.question,
+                answer,
+                self._evaluator_knowledge(context, last_attempt.question, answer),
+                token_budget=config.token_budgets.get("evaluate")
+            )
+        print("Thời gian đánh giá xong:", datetime.datetime.now().isoformat())
+
+        # Cập nhật attempt, memory và trạng thái tổng thể của record
+        self._record_technical_answer(record, memory, answer, score, analysis, config)
+
+        # Kiểm tra kết thúc
+        if record.is_finished:
+            if combined is not None:
+                self.combined_stats.record(parsed=True)
+            if speculative is not None:
+                self._discard_speculation(speculative)
+            return record, self._finished_result(record, context)
+
+        next_q_data = None
+        if combined is not None:
+            next_q_data = self._accept_combined_question(record, combined)
+
+        if speculative is not None:
+            next_q_data = self._resolve_speculation(speculative, record.current_difficulty)
+
+        # ✅ Tạo câu hỏi tiếp theo (nhận Dict)
+        if next_q_data is None:
+            next_q_data = self._generate_question(
+                record, context, memory, record.current_difficulty, on_delta=on_delta
+            )
+        print(f"Thời gian tạo câu hỏi kỹ thuật tiếp theo xong:", datetime.datetime.now().isoformat())
+
+        return record, self._next_technical_result(record, next_q_data, score, analysis)
+
+    # -----------------------------------------------------------------
+    # Helpers thuần logic (dùng chung cho bản sync và async)
+    # -----------------------------------------------------------------
+    def _create_record(
+            self,
+            batch_id: str,
+            candidate_name: str,
+            candidate_profile: str,
+            classified_level: Level,
+            config: InterviewConfig
+    ) -> InterviewRecord:
+        """Tạo bản ghi trạng thái ban đầu (chưa có câu hỏi)."""
+        # ✅ LOGIC MỚI: Kiểm tra xem có cần Warmup không
+        # Nếu max_warmup_questions > 0 thì vào WARMUP, ngược lại vào TECHNICAL luôn
+        start_phase = InterviewPhase.WARMUP if config.max_warmup_questions > 0 else InterviewPhase.TECHNICAL
+
+        return InterviewRecord(
+            batch_id=batch_id,
+            candidate_name=candidate_name,
+            candidate_profile=candidate_profile,
+            candidate_context=self.warmup_manager.extract_candidate_context(candidate_profile),
+            classified_level=classified_level,
+            current_difficulty=get_initial_difficulty(classified_level, config),
+            current_phase=start_phase,  # ✅ Dùng biến đã check
+            attempts_at_current_level=0,
+            total_questions_asked=0,
+            upper_level_reached=0,
+            warmup_questions_asked=0,
+            history=[],
+            conversation_memory=[],
+            is_finished=False,
+            memory_summary={"lines": [], "omitted": 0} if config.memory_mode == "summary" else None
+        )
+
+    def _append_question(
+            self,
+            record: InterviewRecord,
+            q_data: Dict,
+            difficulty: QuestionDifficulty,
+            analysis: str = "(pending)"
+    ):
+        """✅ Thêm câu hỏi mới (đang chờ trả lời) vào history với time_limit."""
+        record.history.append(QuestionAttempt(
+            question=q_data["question"],
+            answer="",
+            score=0.0,
+            analysis=analysis,
+            difficulty=difficulty,
+            timestamp=datetime.datetime.now().isoformat(),
+            question_hash=q_data.get("question_hash") or calculate_question_hash(q_data["question"]),
+            time_limit=q_data["time_limit"]
+        ))
+        if record.memory_summary is not None:
+            # memory_mode="summary": câu hỏi cũng vào memory để khi gấp lại còn giữ được chủ đề đã hỏi
+            record.conversation_memory.append({"role": "interviewer", "content": q_data["question"]})
+
+    def _evaluator_knowledge(self, context: InterviewContext, question: str, answer: str) -> str:
+        """
+        Phần tài liệu đưa vào prompt chấm điểm: chỉ các chunk liên quan tới câu hỏi + câu trả lời
+        (top-k từ FAISS của batch, giới hạn theo token budget) thay vì toàn bộ knowledge_text.
+        """
+        config = context.config
+        if config.evaluator_top_k <= 0:
+            return context.knowledge_text
+
+        knowledge = retrieve_relevant_knowledge(
+            context.knowledge_db,
+            f"{question}\n{answer}",
+            config.evaluator_top_k,
+            config.evaluator_token_budget,
+            fallback_text=context.knowledge_text
+        )
+        print(f"📚 Tài liệu chấm điểm: ~{estimate_tokens(knowledge)} / "
+              f"~{estimate_tokens(context.knowledge_text)} token")
+        return knowledge
+
+    def _pick_bank_question(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            difficulty: QuestionDifficulty
+    ) -> Optional[Dict]:
+        """Chọn ngẫu nhiên một câu hỏi chưa dùng (theo question_hash) từ ngân hàng của batch."""
+        if not context.config.use_question_bank:
+            return None
+        used_hashes = {attempt.question_hash for attempt in record.history}
+        candidates = [
+            q for q in context.question_bank.get(difficulty.value, [])
+            if q["question_hash"] not in used_hashes
+        ]
+        if not candidates:
+            return None
+        return dict(random.choice(candidates))
+
+    def _generate_question(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            memory: ConversationMemory,
+            difficulty: QuestionDifficulty,
+            on_delta: Optional[Callable[[str], None]] = None
+    ) -> Dict:
+        """
+        Lấy câu hỏi kỹ thuật tiếp theo: ưu tiên ngân hàng câu hỏi (nếu batch bật),
+        hết câu phù hợp thì sinh mới bằng `generate_with_context` (stream qua `on_delta` nếu có).
+        """
+        bank_question = self._pick_bank_question(record, context, difficulty)
+        if bank_question is not None:
+            print(f"🏦 Dùng câu hỏi từ ngân hàng ({difficulty.value})")
+            if context.config.question_bank_personalize:
+                return self.question_generator.personalize_question(
+                    bank_question, memory, record.candidate_context
+                )
+            return bank_question
+
+        return self.question_generator.generate_with_context(
+            context.topic,
+            difficulty,
+            context.knowledge_text,
+            memory,
+            record.candidate_context,
+            context.outline_summary,
+            token_budget=context.config.token_budgets.get("question"),
+            on_delta=on_delta,
+            knowledge_in_prefix=self._knowledge_in_prefix(context)
+        )
 
-        # ✅ Cập nhật time_spent vào attempt cuối cùng
-        if record.history:
-            record.history[-1].time_spent = time_spent
+    def _first_warmup_question(self, record: InterviewRecord, warmup_data: Dict) -> Dict:
+        """Ghi câu warm-up đầu tiên vào history, trả về dữ liệu cho API."""
+        self._append_question(
+            record, warmup_data, QuestionDifficulty.VERY_EASY, analysis="(warmup - không chấm điểm)"
+        )
+        return warmup_data
 
-        if record.current_phase == InterviewPhase.WARMUP:
-            return self._handle_warmup_answer(record, context, answer)
-        elif record.current_phase == InterviewPhase.TECHNICAL:
-            return self._handle_technical_answer(record, context, answer)
-        else:  # Closing
-            summary = self._generate_summary(record, context)
-            record.is_finished = True
-            return record, {"finished": True, "summary": summary}
+    def _first_technical_question(self, record: InterviewRecord, tech_data: Dict) -> Dict:
+        """Ghi câu kỹ thuật đầu tiên vào history, trả về dữ liệu cho API."""
+        self._append_question(record, tech_data, record.current_difficulty)
+        return {
+            "question": tech_data["question"],
+            "difficulty": tech_data["difficulty"],
+            "time_limit": tech_data["time_limit"],
+            "phase": "technical"
+        }
 
-    def _handle_warmup_answer(
+    def _record_warmup_answer(
             self,
             record: InterviewRecord,
-            context: InterviewContext,
+            config: InterviewConfig,
             answer: str
-    ) -> Tuple[InterviewRecord, Dict]:
-        """Xử lý câu trả lời trong giai đoạn warm-up."""
-        config = context.config
-
+    ) -> ConversationMemory:
+        """Ghi câu trả lời warm-up, cập nhật memory và chuyển phase nếu đủ số câu."""
         # Cập nhật câu trả lời vào attempt cuối cùng
         last_attempt = record.history[-1]
         last_attempt.answer = answer
         last_attempt.analysis = "✅ Cảm ơn bạn đã chia sẻ!"
 
         # Cập nhật memory
-        memory = ConversationMemory(record.conversation_memory, config.max_memory_turns)
+        memory = self._memory(record, config)
         memory.add("student", answer)
         memory.add("interviewer", "Cảm ơn bạn!")
         record.conversation_memory = memory.get_history()
+        record.memory_summary = memory.get_summary()
 
         record.warmup_questions_asked += 1
 
@@ -812,125 +2025,69 @@ class InterviewProcessor:
             # ✅ Chuyển sang giai đoạn technical
             record.current_phase = InterviewPhase.TECHNICAL
 
-            # ✅ Nhận Dict thay vì str
-            next_q_data = self.question_generator.generate_with_context(
-                context.topic, record.current_difficulty, context.knowledge_text,
-                memory, record.candidate_context, context.outline_summary
-            )
+        return memory
 
-            api_result = {
-                "finished": False,
-                "score": 0,
-                "analysis": "✅ Phần làm quen hoàn tất! Bây giờ chúng ta bắt đầu phần chuyên môn nhé.",
-                "next_question": next_q_data["question"],  # ✅
-                "difficulty": next_q_data["difficulty"],  # ✅
-                "time_limit": next_q_data["time_limit"],  # ✅ THÊM
-                "phase": "technical"
-            }
+    def _next_warmup_result(self, record: InterviewRecord, next_q_data: Dict) -> Dict:
+        """Ghi câu hỏi tiếp theo sau một câu warm-up, trả về kết quả cho API."""
+        self._append_question(record, next_q_data, record.current_difficulty)
 
-            # ✅ Thêm câu hỏi mới vào history với time_limit
-            record.history.append(QuestionAttempt(
-                question=next_q_data["question"],
-                answer="",
-                score=0.0,
-                analysis="(pending)",
-                difficulty=record.current_difficulty,
-                timestamp=datetime.datetime.now().isoformat(),
-                question_hash=calculate_question_hash(next_q_data["question"]),
-                time_limit=next_q_data["time_limit"]  # ✅
-            ))
+        if record.current_phase == InterviewPhase.TECHNICAL:
+            analysis = "✅ Phần làm quen hoàn tất! Bây giờ chúng ta bắt đầu phần chuyên môn nhé."
         else:
-            # ✅ Hỏi câu warm-up tiếp theo (nhận Dict)
-            warmup_data = self.warmup_manager.generate_warmup_question(
-                record.candidate_name.split(',')[0],
-                record.candidate_context,
-                context.topic,
-                record.warmup_questions_asked
-            )
-
-            api_result = {
-                "finished": False,
-                "score": 0,
-                "analysis": "✅ Tuyệt vời!",
-                "next_question": warmup_data["question"],  # ✅
-                "difficulty": warmup_data["difficulty"],  # ✅
-                "time_limit": warmup_data["time_limit"],  # ✅ THÊM
-                "phase": "warmup"
-            }
-
-            # ✅ Thêm câu hỏi mới vào history với time_limit
-            record.history.append(QuestionAttempt(
-                question=warmup_data["question"],
-                answer="",
-                score=0.0,
-                analysis="(pending)",
-                difficulty=record.current_difficulty,
-                timestamp=datetime.datetime.now().isoformat(),
-                question_hash=calculate_question_hash(warmup_data["question"]),
-                time_limit=warmup_data["time_limit"]  # ✅
-            ))
+            analysis = "✅ Tuyệt vời!"
 
-        return record, api_result
+        return {
+            "finished": False,
+            "score": 0,
+            "analysis": analysis,
+            "next_question": next_q_data["question"],  # ✅
+            "difficulty": next_q_data["difficulty"],  # ✅
+            "time_limit": next_q_data["time_limit"],  # ✅ THÊM
+            "phase": record.current_phase.value
+        }
 
-    def _handle_technical_answer(
+    def _record_technical_answer(
             self,
             record: InterviewRecord,
-            context: InterviewContext,
-            answer: str
-    ) -> Tuple[InterviewRecord, Dict]:
-        """Xử lý câu trả lời trong giai đoạn technical."""
-        config = context.config
+            memory: ConversationMemory,
+            answer: str,
+            score: float,
+            analysis: str,
+            config: InterviewConfig
+    ):
+        """Ghi điểm vào attempt cuối, cập nhật memory và trạng thái của record."""
         last_attempt = record.history[-1]
-        memory = ConversationMemory(record.conversation_memory, config.max_memory_turns)
-
-        # Chấm điểm
-        score, analysis = self.answer_evaluator.evaluate(
-            last_attempt.question,
-            answer,
-            context.knowledge_text
-        )
-        print("Thời gian đánh giá xong:", datetime.datetime.now().isoformat())
-
-        # Cập nhật attempt và memory
         last_attempt.answer = answer
         last_attempt.score = score
         last_attempt.analysis = analysis
         memory.add("student", answer)
         memory.add("interviewer", f"📊 Điểm: {score}/10 - {analysis}")
         record.conversation_memory = memory.get_history()
+        record.memory_summary = memory.get_summary()
 
-        # Cập nhật trạng thái tổng thể của record
         self._update_record_state(record, score, config)
 
-        # Kiểm tra kết thúc
-        if record.is_finished:
-            summary = self._generate_summary(record, context)
-            return record, {"finished": True, "summary": summary}
-
-        # ✅ Tạo câu hỏi tiếp theo (nhận Dict)
-        next_q_data = self.question_generator.generate_with_context(
-            context.topic,
-            record.current_difficulty,
-            context.knowledge_text,
-            memory,
-            record.candidate_context,
-            context.outline_summary
-        )
-        print(f"Thời gian tạo câu hỏi kỹ thuật tiếp theo xong:", datetime.datetime.now().isoformat())
+    def _accept_combined_question(self, record: InterviewRecord, combined: Dict) -> Optional[Dict]:
+        """Chỉ dùng câu hỏi của prompt gộp khi model chọn đúng độ khó theo luật."""
+        combined_question = combined["next_question"]
+        if combined_question and combined_question["difficulty"] == record.current_difficulty.value:
+            self.combined_stats.record(parsed=True, question_used=True)
+            return combined_question
 
-        # ✅ Thêm câu hỏi mới vào history với time_limit
-        record.history.append(QuestionAttempt(
-            question=next_q_data["question"],
-            answer="",
-            score=0.0,
-            analysis="(pending)",
-            difficulty=record.current_difficulty,
-            timestamp=datetime.datetime.now().isoformat(),
-            question_hash=calculate_question_hash(next_q_data["question"]),
-            time_limit=next_q_data["time_limit"]  # ✅
-        ))
+        self.combined_stats.record(parsed=True, mismatch=True)
+        print("⚠️ Evaluate-and-ask chọn sai độ khó → sinh lại câu hỏi")
+        return None
 
-        api_result = {
+    def _next_technical_result(
+            self,
+            record: InterviewRecord,
+            next_q_data: Dict,
+            score: float,
+            analysis: str
+    ) -> Dict:
+        """Ghi câu hỏi kỹ thuật tiếp theo vào history, trả về kết quả cho API."""
+        self._append_question(record, next_q_data, record.current_difficulty)
+        return {
             "finished": False,
             "score": score,
             "analysis": analysis,
@@ -940,8 +2097,6 @@ class InterviewProcessor:
             "phase": "technical"
         }
 
-        return record, api_result
-
     def _update_record_state(
             self,
             record: InterviewRecord,
@@ -949,8 +2104,33 @@ class InterviewProcessor:
             config: InterviewConfig
     ):
         """Update trạng thái của record dựa trên điểm số câu trả lời."""
-        record.total_questions_asked += 1
         action = self.difficulty_adapter.decide_next_action(score, config)
+        self._apply_action(record, action, config)
+
+        if config.difficulty_policy == "adaptive":
+            self._update_ability(record, config)
+
+    def _update_ability(self, record: InterviewRecord, config: InterviewConfig):
+        """Cập nhật ước lượng năng lực; dừng sớm nếu level đã ổn định (mỗi câu bớt = 2 lần gọi LLM + 1 TTS)."""
+        technical_attempts = record.history[record.warmup_questions_asked:]
+        estimate = self.ability_estimator.estimate(technical_attempts, record.classified_level, config)
+        record.ability_estimate = estimate
+
+        if not record.is_finished and self.ability_estimator.is_stable(estimate, config):
+            record.is_finished = True
+            record.finish_reason = "ability_stable"
+            record.final_score = self._final_score(record)
+            print(f"🎯 Dừng sớm: năng lực ~{estimate['mean']} ({estimate['level']}, "
+                  f"tin cậy {estimate['confidence']:.0%}) sau {estimate['answers']} câu")
+
+    def _apply_action(
+            self,
+            record: InterviewRecord,
+            action: str,
+            config: InterviewConfig
+    ):
+        """Áp dụng action ("harder" | "same" | "easier") lên trạng thái của record."""
+        record.total_questions_asked += 1
 
         if action == "harder":
             record.upper_level_reached += 1
@@ -985,44 +2165,176 @@ class InterviewProcessor:
 
         # Tính điểm cuối cùng nếu đã kết thúc
         if record.is_finished:
-            technical_scores = [
-                attempt.score
-                for attempt in record.history
-                if attempt.score > 0 and "warmup" not in attempt.analysis.lower()
-            ]
-            record.final_score = sum(technical_scores) / len(technical_scores) if technical_scores else 0.0
+            record.final_score = self._final_score(record)
+
+    @staticmethod
+    def _final_score(record: InterviewRecord) -> float:
+        """Điểm trung bình các câu kỹ thuật đã chấm."""
+        technical_scores = [
+            attempt.score
+            for attempt in record.history
+            if attempt.score > 0 and "warmup" not in attempt.analysis.lower()
+        ]
+        return sum(technical_scores) / len(technical_scores) if technical_scores else 0.0
+
+    # -----------------------------------------------------------------
+    # Speculative generation
+    # -----------------------------------------------------------------
+    def _predict_branches(
+            self,
+            record: InterviewRecord,
+            config: InterviewConfig
+    ) -> Dict[str, Optional[QuestionDifficulty]]:
+        """
+        Mô phỏng cả 3 action trên bản sao nông của record để biết độ khó
+        của từng nhánh sau khi chấm điểm (None nếu nhánh đó kết thúc phỏng vấn).
+        """
+        branches = {}
+        for action in ("harder", "same", "easier"):
+            probe = copy.copy(record)
+            self._apply_action(probe, action, config)
+            branches[action] = None if probe.is_finished else probe.current_difficulty
+        return branches
+
+    def _predict_next_difficulties(
+            self,
+            record: InterviewRecord,
+            config: InterviewConfig
+    ) -> List[QuestionDifficulty]:
+        """Các độ khó có thể xảy ra sau khi chấm điểm (bỏ qua nhánh kết thúc phỏng vấn)."""
+        difficulties = []
+        for difficulty in self._predict_branches(record, config).values():
+            if difficulty is not None and difficulty not in difficulties:
+                difficulties.append(difficulty)
+        return difficulties
+
+    def _start_speculation(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            memory: ConversationMemory,
+            answer: str
+    ) -> Optional[Dict]:
+        """
+        Gửi song song các request sinh câu hỏi cho từng độ khó có thể xảy ra.
+        Memory suy đoán chỉ chứa câu trả lời (chưa có điểm vì đang chấm song song).
+        Executor không còn đủ worker rảnh cho mọi nhánh → None (lượt này không speculation):
+        nhánh xếp hàng chỉ làm lượt chậm thêm, và nhánh đã chạy thì `cancel()` không dừng được.
+        """
+        difficulties = self._predict_next_difficulties(record, context.config)
+        acquired = 0
+        while acquired < len(difficulties) and self._free_speculative_workers.acquire(blocking=False):
+            acquired += 1
+        if acquired < len(difficulties):
+            for _ in range(acquired):
+                self._free_speculative_workers.release()
+            self.speculation_stats.record_skipped()
+            print("🔮 Speculative: executor đang bận → bỏ qua speculation lượt này")
+            return None
+
+        futures = {}
+        for difficulty in difficulties:
+            speculative_memory = memory.copy()
+            speculative_memory.add("student", answer)
+            # copy_context: thread của executor giữ được batch_id (contextvar) của request
+            futures[difficulty] = self._executor.submit(
+                contextvars.copy_context().run,
+                self._generate_question, record, context, speculative_memory, difficulty
+            )
+            # Trả worker khi nhánh xong hoặc bị hủy
+            futures[difficulty].add_done_callback(lambda _: self._free_speculative_workers.release())
+        print(f"🔮 Speculative: sinh trước {len(futures)} nhánh {[d.value for d in futures]}")
+        return futures
+
+    def _resolve_speculation(self, futures: Dict, difficulty: QuestionDifficulty) -> Optional[Dict]:
+        """Lấy câu hỏi của nhánh khớp độ khó thực tế, hủy/bỏ các nhánh còn lại."""
+        chosen = futures.get(difficulty)
+        discarded = 0
+        for other_difficulty, future in futures.items():
+            if other_difficulty != difficulty:
+                future.cancel()
+                discarded += 1
+
+        next_q_data = None
+        if chosen is not None:
+            try:
+                next_q_data = chosen.result()
+            except Exception as e:
+                print(f"⚠️ Nhánh speculative {difficulty.value} lỗi: {e}")
+
+        self.speculation_stats.record(
+            generated=len(futures),
+            hit=next_q_data is not None,
+            discarded=discarded + (1 if chosen is not None and next_q_data is None else 0)
+        )
+        return next_q_data
+
+    def _discard_speculation(self, futures: Dict):
+        """Phỏng vấn đã kết thúc → bỏ toàn bộ nhánh suy đoán."""
+        for future in futures.values():
+            future.cancel()
+        self.speculation_stats.record(
+            generated=len(futures), hit=False, discarded=len(futures), finished=True
+        )
 
     def _generate_summary(
             self,
             record: InterviewRecord,
             context: InterviewContext
     ) -> Dict:
-        """Tạo bản tóm tắt cuối cùng của buổi phỏng vấn."""
+        """
+        Bản tóm tắt cuối buổi: tính MỘT lần khi kết thúc và lưu vào `record.summary`,
+        các lần gọi sau chỉ đọc lại (không gọi LLM).
+        Lời kết LLM được sinh nền bằng `generate_closing_message_for`; trong lúc chờ dùng lời kết mặc định.
+        """
+        if record.summary is None:
+            kwargs = self._closing_kwargs(record, context)
+            fallback = self.closing_generator._get_fallback_closing(kwargs["candidate_name"], kwargs["final_score"])
+            record.summary = self._build_summary(record, context, fallback)
+
+        summary = dict(record.summary)
+        if record.closing_message:
+            summary["closing_message"] = record.closing_message
+        return summary
+
+    def _finished_result(self, record: InterviewRecord, context: InterviewContext) -> Dict:
+        """Kết quả API khi phỏng vấn kết thúc (`closing_pending`: lời kết LLM chưa có)."""
+        return {
+            "finished": True,
+            "summary": self._generate_summary(record, context),
+            "closing_pending": record.closing_message is None
+        }
 
-        # Convert QuestionAttempt objects to dicts
-        history_dicts = []
-        for i, attempt in enumerate(record.history, 1):
-            attempt_dict = asdict(attempt)
+    def generate_closing_message_for(self, record: InterviewRecord, context: InterviewContext) -> str:
+        """Sinh lời kết bằng LLM (gọi ở background sau khi đã trả response cho thí sinh)."""
+        self._bind_batch(record.batch_id, context)
+        return self.closing_generator.generate_closing_message(**self._closing_kwargs(record, context))
 
-            # Convert Enum to string
-            if isinstance(attempt_dict['difficulty'], QuestionDifficulty):
-                attempt_dict['difficulty'] = attempt_dict['difficulty'].value
-            elif hasattr(attempt_dict['difficulty'], 'value'):
-                attempt_dict['difficulty'] = attempt_dict['difficulty'].value
+    def _closing_kwargs(self, record: InterviewRecord, context: InterviewContext) -> Dict:
+        """Tham số cho ClosingGenerator từ trạng thái record."""
+        return {
+            "candidate_name": record.candidate_name.split(',')[0],  # Lấy tên ngắn
+            "finish_reason": record.finish_reason or "completed",
+            "final_score": record.final_score or 0.0,
+            "total_questions": len(record.history),
+            "topic": context.topic
+        }
 
-            # Add question number
+    def _build_summary(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            closing_message: str
+    ) -> Dict:
+        """Dựng dict tóm tắt từ record + lời kết."""
+        # Convert QuestionAttempt objects to dicts (Enum → value, xem record_codec.py)
+        encode_attempt = codec_for(QuestionAttempt).encode
+        history_dicts = []
+        for i, attempt in enumerate(record.history, 1):
+            attempt_dict = encode_attempt(attempt)
             attempt_dict['question_number'] = i
             history_dicts.append(attempt_dict)
 
-        # ✅ THÊM: Generate closing message
-        closing_message = self.closing_generator.generate_closing_message(
-            candidate_name=record.candidate_name.split(',')[0],  # Lấy tên ngắn
-            finish_reason=record.finish_reason or "completed",
-            final_score=record.final_score or 0.0,
-            total_questions=len(record.history),
-            topic=context.topic
-        )
-
         return {
             "candidate_info": {
                 "name": record.candidate_name,
@@ -1034,6 +2346,7 @@ class InterviewProcessor:
                 "total_questions": len(record.history),
                 "final_score": record.final_score,
                 "finish_reason": record.finish_reason,  # ✅ THÊM
+                "ability_estimate": record.ability_estimate,
                 "topic": context.topic,
                 "outline": context.outline
             },
@@ -1061,16 +2374,50 @@ class ClosingGenerator:
 
         Args:
             candidate_name: Tên thí sinh
-            finish_reason: Lý do kết thúc ("max_attempts" | "max_questions" | "max_upper_level")
+            finish_reason: Lý do kết thúc ("max_attempts" | "max_questions" | "max_upper_level" | "ability_stable")
             final_score: Điểm trung bình cuối cùng
             total_questions: Tổng số câu hỏi đã hỏi
             topic: Chủ đề phỏng vấn
         """
+        prompt = self._build_prompt(candidate_name, finish_reason, final_score, total_questions, topic)
+        try:
+            result = self.llm.invoke(prompt)
+            return self._parse_result(result, candidate_name, final_score)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi tạo lời kết: {e}")
+            return self._get_fallback_closing(candidate_name, final_score)
+
+    async def agenerate_closing_message(
+            self,
+            candidate_name: str,
+            finish_reason: str,
+            final_score: float,
+            total_questions: int,
+            topic: str
+    ) -> str:
+        """Bản async của `generate_closing_message` (dùng `ainvoke`)."""
+        prompt = self._build_prompt(candidate_name, finish_reason, final_score, total_questions, topic)
+        try:
+            result = await self.llm.ainvoke(prompt)
+            return self._parse_result(result, candidate_name, final_score)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi tạo lời kết: {e}")
+            return self._get_fallback_closing(candidate_name, final_score)
 
+    def _build_prompt(
+            self,
+            candidate_name: str,
+            finish_reason: str,
+            final_score: float,
+            total_questions: int,
+            topic: str
+    ) -> str:
+        """Dựng prompt lời kết theo lý do kết thúc."""
         reason_context = {
             "max_attempts": f"Bạn đã hoàn thành {total_questions} câu hỏi ở mức độ hiện tại.",
             "max_questions": f"Chúng ta đã trải qua {total_questions} câu hỏi về {topic}.",
-            "max_upper_level": f"Bạn đã vượt qua nhiều mức độ thử thách khác nhau trong {total_questions} câu hỏi."
+            "max_upper_level": f"Bạn đã vượt qua nhiều mức độ thử thách khác nhau trong {total_questions} câu hỏi.",
+            "ability_stable": f"Sau {total_questions} câu hỏi, chúng tôi đã có đủ thông tin để đánh giá năng lực của bạn."
         }
 
         context_text = reason_context.get(finish_reason, f"Chúng ta đã hoàn thành {total_questions} câu hỏi.")
@@ -1098,20 +2445,17 @@ YÊU CẦU:
 
 OUTPUT: Chỉ trả về văn bản lời kết, KHÔNG có JSON, KHÔNG có markdown.
 """
+        return prompt
 
-        try:
-            result = self.llm.invoke(prompt)
-            closing_text = result.strip()
-
-            # Loại bỏ các artifact không mong muốn
-            closing_text = re.sub(r'^```.*\n|```$', '', closing_text, flags=re.MULTILINE)
-            closing_text = re.sub(r'^\{.*\}$', '', closing_text, flags=re.DOTALL)
+    def _parse_result(self, result: str, candidate_name: str, final_score: float) -> str:
+        """Làm sạch lời kết, fallback nếu rỗng."""
+        closing_text = result.strip()
 
-            return closing_text if closing_text else self._get_fallback_closing(candidate_name, final_score)
+        # Loại bỏ các artifact không mong muốn
+        closing_text = re.sub(r'^```.*\n|```$', '', closing_text, flags=re.MULTILINE)
+        closing_text = re.sub(r'^\{.*\}$', '', closing_text, flags=re.DOTALL)
 
-        except Exception as e:
-            print(f"⚠️ Lỗi khi tạo lời kết: {e}")
-            return self._get_fallback_closing(candidate_name, final_score)
+        return closing_text if closing_text else self._get_fallback_closing(candidate_name, final_score)
 
     def _get_fallback_closing(self, candidate_name: str, final_score: float) -> str:
         """Lời kết mặc định nếu LLM fail"""
@@ -1120,4 +2464,226 @@ OUTPUT: Chỉ trả về văn bản lời kết, KHÔNG có JSON, KHÔNG có mar
         elif final_score >= 5.0:
             return f"Cảm ơn {candidate_name}! Bạn đã nỗ lực rất tốt. Hãy tiếp tục học hỏi và phát triển thêm nhé. Chúc bạn may mắn!"
         else:
-            return f"Cảm ơn {candidate_name} đã tham gia! Đây là một trải nghiệm quý giá. Hãy tiếp tục cố gắng và rèn luyện thêm nhé!"
\ No newline at end of file
+            return f"Cảm ơn {candidate_name} đã tham gia! Đây là một trải nghiệm quý giá. Hãy tiếp tục cố gắng và rèn luyện thêm nhé!"
+
+
+# =======================
+# 6. BỘ XỬ LÝ ASYNC (ASGI)
+# =======================
+
+class AsyncInterviewProcessor(InterviewProcessor):
+    """
+    Biến thể async của `InterviewProcessor` dùng `ainvoke` của LangChain.
+    Một event loop có thể giữ hàng trăm lượt gọi Gemini đang chờ mà không
+    chiếm mỗi lượt một thread. Toàn bộ logic trạng thái dùng chung với bản sync.
+    """
+
+    async def start_new_record(
+            self,
+            batch_id: str,
+            candidate_name: str,
+            candidate_profile: str,
+            classified_level: Level,
+            context: InterviewContext
+    ) -> Tuple[InterviewRecord, Dict]:
+        """Bản async của `InterviewProcessor.start_new_record`."""
+        self._bind_batch(batch_id, context)
+        config = context.config
+        record = self._create_record(batch_id, candidate_name, candidate_profile, classified_level, config)
+
+        if record.current_phase == InterviewPhase.WARMUP:
+            warmup_data = await self.warmup_manager.agenerate_warmup_question(
+                candidate_name=candidate_name.split(',')[0],
+                candidate_context=record.candidate_context,
+                topic=context.topic,
+                warmup_count=0
+            )
+            return record, self._first_warmup_question(record, warmup_data)
+
+        tech_data = await self._agenerate_question(
+            record, context, self._memory(record, config), record.current_difficulty
+        )
+        return record, self._first_technical_question(record, tech_data)
+
+    async def process_answer(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            answer: str,
+            time_spent: int = 0
+    ) -> Tuple[InterviewRecord, Dict]:
+        """Bản async của `InterviewProcessor.process_answer`."""
+        self._bind_batch(record.batch_id, context)
+
+        if record.is_finished:
+            return record, self._finished_result(record, context)
+
+        if record.history:
+            record.history[-1].time_spent = time_spent
+
+        if record.current_phase == InterviewPhase.WARMUP:
+            return await self._handle_warmup_answer(record, context, answer)
+        elif record.current_phase == InterviewPhase.TECHNICAL:
+            return await self._handle_technical_answer(record, context, answer)
+        else:  # Closing
+            record.is_finished = True
+            return record, self._finished_result(record, context)
+
+    async def _handle_warmup_answer(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            answer: str
+    ) -> Tuple[InterviewRecord, Dict]:
+        memory = self._record_warmup_answer(record, context.config, answer)
+
+        if record.current_phase == InterviewPhase.TECHNICAL:
+            next_q_data = await self._agenerate_question(record, context, memory, record.current_difficulty)
+        else:
+            next_q_data = await self.warmup_manager.agenerate_warmup_question(
+                record.candidate_name.split(',')[0],
+                record.candidate_context,
+                context.topic,
+                record.warmup_questions_asked
+            )
+
+        return record, self._next_warmup_result(record, next_q_data)
+
+    async def _handle_technical_answer(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            answer: str
+    ) -> Tuple[InterviewRecord, Dict]:
+        config = context.config
+        last_attempt = record.history[-1]
+        memory = self._memory(record, config)
+
+        score = analysis = None
+        combined = None
+        speculative = None
+
+        if config.combined_evaluate_and_ask:
+            combined = await self.evaluate_and_ask.aevaluate_and_ask(
+                context.topic,
+                last_attempt.question,
+                answer,
+                context.knowledge_text,
+                memory,
+                record.candidate_context,
+                self._predict_branches(record, config),
+                config,
+                context.outline_summary,
+                knowledge_in_prefix=self._knowledge_in_prefix(context)
+            )
+            if combined is None:
+                self.combined_stats.record(parsed=False)
+                print("⚠️ Evaluate-and-ask không parse được → fallback 2 lần gọi")
+            else:
+                score, analysis = combined["score"], combined["analysis"]
+
+        if score is None:
+            if config.speculative_generation:
+                speculative = self._astart_speculation(record, context, memory, answer)
+
+            evaluator_knowledge = await asyncio.to_thread(
+                self._evaluator_knowledge, context, last_attempt.question, answer
+            )
+            score, analysis = await self.answer_evaluator.aevaluate(
+                last_attempt.question,
+                answer,
+                evaluator_knowledge,
+                token_budget=config.token_budgets.get("evaluate")
+            )
+
+        self._record_technical_answer(record, memory, answer, score, analysis, config)
+
+        if record.is_finished:
+            if combined is not None:
+                self.combined_stats.record(parsed=True)
+            if speculative is not None:
+                self._discard_speculation(speculative)
+            return record, self._finished_result(record, context)
+
+        next_q_data = None
+        if combined is not None:
+            next_q_data = self._accept_combined_question(record, combined)
+
+        if speculative is not None:
+            next_q_data = await self._aresolve_speculation(speculative, record.current_difficulty)
+
+        if next_q_data is None:
+            next_q_data = await self._agenerate_question(record, context, memory, record.current_difficulty)
+
+        return record, self._next_technical_result(record, next_q_data, score, analysis)
+
+    async def _agenerate_question(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            memory: ConversationMemory,
+            difficulty: QuestionDifficulty
+    ) -> Dict:
+        """Bản async của `_generate_question`."""
+        bank_question = self._pick_bank_question(record, context, difficulty)
+        if bank_question is not None:
+            if context.config.question_bank_personalize:
+                return await self.question_generator.apersonalize_question(
+                    bank_question, memory, record.candidate_context
+                )
+            return bank_question
+
+        return await self.question_generator.agenerate_with_context(
+            context.topic,
+            difficulty,
+            context.knowledge_text,
+            memory,
+            record.candidate_context,
+            context.outline_summary,
+            token_budget=context.config.token_budgets.get("question"),
+            knowledge_in_prefix=self._knowledge_in_prefix(context)
+        )
+
+    def _astart_speculation(
+            self,
+            record: InterviewRecord,
+            context: InterviewContext,
+            memory: ConversationMemory,
+            answer: str
+    ) -> Dict:
+        """Giống `_start_speculation` nhưng mỗi nhánh là một asyncio.Task (hủy được thật sự)."""
+        tasks = {}
+        for difficulty in self._predict_next_difficulties(record, context.config):
+            speculative_memory = memory.copy()
+            speculative_memory.add("student", answer)
+            tasks[difficulty] = asyncio.create_task(
+                self._agenerate_question(record, context, speculative_memory, difficulty)
+            )
+        return tasks
+
+    async def _aresolve_speculation(self, tasks: Dict, difficulty: QuestionDifficulty) -> Optional[Dict]:
+        chosen = tasks.get(difficulty)
+        discarded = 0
+        for other_difficulty, task in tasks.items():
+            if other_difficulty != difficulty:
+                task.cancel()
+                discarded += 1
+
+        next_q_data = None
+        if chosen is not None:
+            try:
+                next_q_data = await chosen
+            except Exception as e:
+                print(f"⚠️ Nhánh speculative {difficulty.value} lỗi: {e}")
+
+        self.speculation_stats.record(
+            generated=len(tasks),
+            hit=next_q_data is not None,
+            discarded=discarded + (1 if chosen is not None and next_q_data is None else 0)
+        )
+        return next_q_data
+
+    async def agenerate_closing_message_for(self, record: InterviewRecord, context: InterviewContext) -> str:
+        """Bản async của `generate_closing_message_for`."""
+        self._bind_batch(record.batch_id, context)
+        return await self.closing_generator.agenerate_closing_message(**self._closing_kwargs(record, context))
@@ -0,0 +1,27 @@
+# asgi.py
+"""
+Điểm khởi động ASGI:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+- /interview/start_candidate và /interview/answer chạy async (routes/interview_async.py),
+  mỗi thí sinh đang chờ Gemini không còn chiếm một thread của Werkzeug.
+- Các route còn lại vẫn là Flask, được bọc qua WsgiToAsgi.
+"""
+
+import threading
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, cleanup_scheduler
+from extensions import migrate_vectorstores_add_user_id, migrate_batches_add_user_id
+from routes.interview_async import AsyncInterviewApp
+
+migrate_vectorstores_add_user_id()
+migrate_batches_add_user_id()
+
+# Background cleanup giống khi chạy `python app.py`
+threading.Thread(target=cleanup_scheduler, daemon=True).start()
+
+application = AsyncInterviewApp(app, WsgiToAsgi(app))
+
+print("🚀 ASGI app đã sẵn sàng (interview routes chạy async)")
@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+"""
+Benchmark hiệu năng chạy offline (LLM/TTS/MongoDB giả lập), xem harness.py.
+"""
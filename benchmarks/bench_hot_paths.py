@@ -0,0 +1,334 @@
+# benchmarks/bench_hot_paths.py
+"""
+Micro-benchmark các hot path truy xuất tài liệu / nạp tài liệu, chạy trên dữ liệu tổng hợp
+(không cần model embedding, Gemini hay MongoDB):
+
+    - KnowledgeBuilder.build_context / _fetch_surrounding_chunks  (store 2.000 chunk, outline 40 mục)
+    - TextSplitterStrategy (nltk, recursive)                        (PDF lớn tổng hợp hoặc --pdf thật)
+    - clean_text, to_mongo_safe, _clean_and_parse_json_response
+    - record_codec encode/decode InterviewRecord                   (so với asdict + to_mongo_safe /
+                                                                    khôi phục Enum bằng tay như trước)
+    - build_cv_vectorstore_from_candidates                          (embedding giả lập, FAISS thật)
+
+Mỗi case chạy `--rounds` vòng, mỗi vòng `number` lần gọi; báo cáo min/median/mean/stddev mỗi lần
+gọi như pytest-benchmark. Lưu kết quả trước khi tối ưu rồi so sánh sau khi tối ưu:
+
+    python -m benchmarks.bench_hot_paths --out before.json
+    python -m benchmarks.bench_hot_paths --compare before.json
+    python -m benchmarks.bench_hot_paths --only build_context --rounds 10
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks.harness import install_stand_ins
+
+WORDS = (
+    "Java lớp đối tượng kế thừa đa hình đóng gói interface abstract JVM heap stack garbage collector "
+    "thread synchronized volatile HashMap ArrayList LinkedList iterator stream lambda exception "
+    "checked unchecked generic bytecode classloader bộ nhớ hiệu năng tham chiếu phương thức"
+).split()
+
+
+# ===================================================================
+# Dữ liệu tổng hợp
+# ===================================================================
+def make_sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+class SyntheticChunkStore:
+    """
+    Thay cho FAISS tài liệu: `docstore._dict` giữ toàn bộ chunk (như FAISS thật), retriever
+    trả về k chunk cố định theo hash của query → thời gian đo là của KnowledgeBuilder, không phải search.
+    """
+
+    def __init__(self, num_chunks: int = 2000, num_sources: int = 4, chunk_chars: int = 1600, seed: int = 0):
+        rng = random.Random(seed)
+        per_source = num_chunks // num_sources
+        docs = {}
+        for s in range(num_sources):
+            for i in range(per_source):
+                text = ""
+                while len(text) < chunk_chars:
+                    text += make_sentence(rng) + " "
+                docs[f"doc-{s}-{i}"] = SimpleNamespace(
+                    page_content=text[:chunk_chars],
+                    metadata={"source": f"tai_lieu_{s}.pdf", "chunk_index": i}
+                )
+        self.docstore = SimpleNamespace(_dict=docs)
+        self._docs = list(docs.values())
+
+    def as_retriever(self, search_kwargs=None):
+        k = (search_kwargs or {}).get("k", 4)
+        docs = self._docs
+
+        def invoke(query):
+            start = int(hashlib.md5(query.encode("utf-8")).hexdigest(), 16) % len(docs)
+            return [docs[(start + j * 37) % len(docs)] for j in range(k)]
+
+        return SimpleNamespace(invoke=invoke)
+
+
+def make_outline(size: int = 40) -> List[str]:
+    topics = ["OOP", "JVM", "Collections", "Concurrency", "Generics", "Exceptions", "Streams", "I/O"]
+    return [f"{topics[i % len(topics)]} - phần {i // len(topics) + 1}" for i in range(size)]
+
+
+def make_pdf_pages(num_pages: int = 400, seed: int = 1) -> List[str]:
+    """Trang văn bản giống PyPDFLoader trả về: xuống dòng giữa câu, khoảng trắng thừa, \\x00 lẫn vào."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(num_pages):
+        lines = []
+        for _ in range(rng.randint(35, 50)):
+            line = make_sentence(rng, 6, 14)
+            if rng.random() < 0.1:
+                line = "   " + line + "\x00  "
+            lines.append(line)
+        pages.append("\n".join(lines) + "\n\n")
+    return pages
+
+
+def load_pdf_pages(pdf_path: str) -> List[str]:
+    from langchain_community.document_loaders import PyPDFLoader
+    return [page.page_content for page in PyPDFLoader(pdf_path).load()]
+
+
+def make_record(num_attempts: int = 20, memory_turns: int = 12):
+    """InterviewRecord đầy đủ như lúc save sau mỗi câu trả lời."""
+    from LLMInterviewer4 import (InterviewRecord, QuestionAttempt, Level, QuestionDifficulty,
+                                 InterviewPhase, calculate_question_hash)
+
+    rng = random.Random(2)
+    history = []
+    for i in range(num_attempts):
+        question = f"Câu hỏi {i}: " + make_sentence(rng, 20, 40)
+        history.append(QuestionAttempt(
+            question=question,
+            answer=" ".join(make_sentence(rng) for _ in range(4)),
+            score=round(rng.uniform(0, 10), 1),
+            analysis=" ".join(make_sentence(rng) for _ in range(3)),
+            difficulty=rng.choice(list(QuestionDifficulty)),
+            timestamp=datetime.now().isoformat(),
+            question_hash=calculate_question_hash(question),
+            time_limit=180,
+            time_spent=rng.randint(20, 170)
+        ))
+    memory = [{"role": "user" if i % 2 else "assistant", "content": make_sentence(rng, 20, 60)}
+              for i in range(memory_turns * 2)]
+    record = InterviewRecord(
+        batch_id="bench", candidate_name="Thí sinh", candidate_profile="Họ tên: Thí sinh, Lớp: BENCH",
+        candidate_context="", classified_level=Level.KHA, current_difficulty=QuestionDifficulty.HARD,
+        current_phase=InterviewPhase.TECHNICAL, attempts_at_current_level=1,
+        total_questions_asked=num_attempts, upper_level_reached=1, warmup_questions_asked=0,
+        history=history, conversation_memory=memory, is_finished=False
+    )
+    return record
+
+
+def legacy_deserialize(record_data: Dict):
+    """Cách đọc record trước record_codec (deserialize_record cũ): khôi phục Enum bằng tay."""
+    from LLMInterviewer4 import InterviewRecord, QuestionAttempt, Level, QuestionDifficulty, InterviewPhase
+
+    record_data.pop('_id', None)
+    record_data['history'] = [
+        QuestionAttempt(**{**att, "difficulty": QuestionDifficulty(att["difficulty"])})
+        for att in record_data['history']
+    ]
+    record_data['classified_level'] = Level(record_data['classified_level'])
+    record_data['current_difficulty'] = QuestionDifficulty(record_data['current_difficulty'])
+    record_data['current_phase'] = InterviewPhase(record_data['current_phase'])
+    return InterviewRecord(**record_data)
+
+
+def make_llm_responses() -> Dict[str, str]:
+    """Các dạng output LLM mà parser phải xử lý."""
+    question = ("Hãy giải thích cơ chế garbage collection trong JVM. <pre><code class='language-java'>"
+                "List&lt;String&gt; list = new ArrayList&lt;&gt;();<br>list.add(\"a\");</code></pre> "
+                "Đối tượng list được thu hồi khi nào?")
+    payload = json.dumps({"question": question, "difficulty": "hard", "rationale": "x" * 400}, ensure_ascii=False)
+    return {
+        "plain": payload,
+        "fenced": f"```json\n{payload}\n```",
+        "chatty": "Dưới đây là câu hỏi phù hợp với thí sinh:\n\n" + payload + "\n\nChúc thí sinh may mắn!",
+        "broken": "```json\n{\"question\": \"" + question + "\", \"difficulty\": \"hard\",\n```",
+    }
+
+
+def make_candidates(count: int = 300) -> List[Dict]:
+    rng = random.Random(3)
+    return [{"Họ tên": f"Nguyễn Văn {i:04d}", "Lớp": f"CNTT{rng.randint(1, 9)}",
+             "Điểm 40%": round(rng.uniform(3, 10), 1), "Ghi chú": make_sentence(rng, 4, 10)}
+            for i in range(count)]
+
+
+class HashEmbeddings:
+    """Embedding giả lập (vector từ md5 của text) để FAISS thật chạy mà không cần model."""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.md5(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255.0 for i in range(self.dim)]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def __call__(self, text):
+        return self._embed(text)
+
+
+# ===================================================================
+# Đo
+# ===================================================================
+@dataclass
+class Case:
+    name: str
+    fn: Callable[[], object]
+    number: int = 1  # số lần gọi mỗi vòng (tăng cho hàm rất nhanh)
+
+
+def measure(case: Case, rounds: int, warmup: int = 1) -> Dict:
+    """Chạy `rounds` vòng, trả về thống kê thời gian cho MỘT lần gọi (ms)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            case.fn()
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(case.number):
+                case.fn()
+            samples.append((time.perf_counter() - started) * 1000 / case.number)
+    return {
+        "rounds": rounds,
+        "number": case.number,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "stddev_ms": round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+    }
+
+
+def build_cases(args) -> List[Case]:
+    from extension import KnowledgeBuilder, build_cv_vectorstore_from_candidates
+    from BuildVectorStores import TextSplitterStrategy, clean_text
+    from LLMInterviewer4 import _clean_and_parse_json_response
+    from utils import to_mongo_safe
+    from dataclasses import asdict
+    from record_codec import codec_for
+
+    store = SyntheticChunkStore(num_chunks=args.chunks)
+    outline = make_outline(args.outline)
+    builder = KnowledgeBuilder(store, fetch_surrounding=True, window=1)
+    sample_docs = builder.retriever.invoke("Java OOP")
+
+    pages = load_pdf_pages(args.pdf) if args.pdf else make_pdf_pages(args.pages)
+    full_text = "\n".join(clean_text(page) for page in pages)
+    nltk_splitter = TextSplitterStrategy.get_splitter("nltk", 1600, 400)
+    recursive_splitter = TextSplitterStrategy.get_splitter("recursive", 1600, 400)
+
+    record = make_record()
+    record_dict = asdict(record)
+    record_doc = to_mongo_safe(record_dict)
+    record_codec = codec_for(type(record))
+    responses = make_llm_responses()
+    candidates = make_candidates(args.cv_candidates)
+    embeddings = HashEmbeddings()
+    cv_dir = tempfile.mkdtemp(prefix="bench_cv_")
+
+    def fetch_surrounding():
+        for doc in sample_docs:
+            builder._fetch_surrounding_chunks(doc)
+
+    def parse_responses():
+        for raw in responses.values():
+            _clean_and_parse_json_response(raw)
+
+    return [
+        Case("build_context[outline]", lambda: builder.build_context("Java", outline)),
+        Case("build_context[topic]", lambda: builder.build_context("Java")),
+        Case("fetch_surrounding_chunks[k=5]", fetch_surrounding, number=5),
+        Case("splitter[nltk]", lambda: nltk_splitter.split_text(full_text)),
+        Case("splitter[recursive]", lambda: recursive_splitter.split_text(full_text)),
+        Case("clean_text[pdf_pages]", lambda: [clean_text(page) for page in pages], number=5),
+        Case("to_mongo_safe[record]", lambda: to_mongo_safe(record_dict), number=200),
+        Case("record_encode[asdict+to_mongo_safe]", lambda: to_mongo_safe(asdict(record)), number=200),
+        Case("record_encode[codec]", lambda: record_codec.encode(record), number=200),
+        Case("record_decode[legacy]", lambda: legacy_deserialize(dict(record_doc)), number=200),
+        Case("record_decode[codec]", lambda: record_codec.decode(dict(record_doc)), number=200),
+        Case("clean_and_parse_json_response", parse_responses, number=500),
+        Case("build_cv_vectorstore[candidates]",
+             lambda: build_cv_vectorstore_from_candidates(candidates, embeddings, base_dir=cv_dir)),
+    ]
+
+
+def print_table(results: Dict[str, Dict], baseline: Dict[str, Dict] = None):
+    header = f"{'case':<36}{'min':>12}{'median':>12}{'mean':>12}{'stddev':>12}"
+    if baseline:
+        header += f"{'before':>12}{'speedup':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        line = (f"{name:<36}{stats['min_ms']:>10.3f}ms{stats['median_ms']:>10.3f}ms"
+                f"{stats['mean_ms']:>10.3f}ms{stats['stddev_ms']:>10.3f}ms")
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"{before['median_ms']:>10.3f}ms{before['median_ms'] / max(stats['median_ms'], 1e-9):>9.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark hot path truy xuất/nạp tài liệu")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--only", help="Chỉ chạy case có tên chứa chuỗi này")
+    parser.add_argument("--chunks", type=int, default=2000, help="Số chunk của store tổng hợp")
+    parser.add_argument("--outline", type=int, default=40, help="Số mục outline")
+    parser.add_argument("--pages", type=int, default=400, help="Số trang của PDF tổng hợp")
+    parser.add_argument("--pdf", help="Dùng PDF thật thay cho PDF tổng hợp")
+    parser.add_argument("--cv-candidates", type=int, default=300)
+    parser.add_argument("--compare", help="File JSON kết quả trước đó để so sánh (cột before/speedup)")
+    parser.add_argument("--out", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    install_stand_ins(llm_latency_ms=0, tts_latency_ms=0)
+
+    results = {}
+    for case in build_cases(args):
+        if args.only and args.only not in case.name:
+            continue
+        print(f"⏱️ {case.name} ...")
+        results[case.name] = measure(case, args.rounds)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    print()
+    print_table(results, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi kết quả micro-benchmark vào {args.out}")
+
+
+if __name__ == "__main__":
+    main()
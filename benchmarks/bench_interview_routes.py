@@ -0,0 +1,131 @@
+# benchmarks/bench_interview_routes.py
+"""
+Benchmark end-to-end `/interview/start_candidate` + `/interview/answer` qua Flask test client.
+
+Chạy offline (xem harness.py): LLM giả lập độ trễ cố định, TTS giả lập, MongoDB trong bộ nhớ.
+Mỗi response mang header `Server-Timing` (timing.py); benchmark gom lại thời gian từng giai
+đoạn (mongo_load, deserialize, wakeup_context, llm.*, tts, persist, ...) và tách phần
+overhead của app = total - thời gian LLM - TTS.
+
+    python -m benchmarks.bench_interview_routes --candidates 20 --llm-latency-ms 800 --out bench.json
+"""
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+from benchmarks.harness import build_bench_app, percentile
+from timing import parse_server_timing
+
+# Giai đoạn chờ provider (không phải overhead của app)
+PROVIDER_PREFIXES = ("llm.", "tts")
+
+
+def run_interviews(env, max_turns: int = 20):
+    """Phỏng vấn lần lượt từng thí sinh tới khi kết thúc; trả về danh sách mẫu đo của từng request."""
+    client = env.client()
+    samples = []
+
+    def call(route, payload):
+        started = time.perf_counter()
+        response = client.post(f"/interview/{route}", json=payload)
+        wall_ms = (time.perf_counter() - started) * 1000
+        samples.append({
+            "route": route,
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 2),
+            "stages": parse_server_timing(response.headers.get("Server-Timing", ""))
+        })
+        return response.get_json() or {}
+
+    for name in env.candidates:
+        data = call("start_candidate", {"session_id": env.batch_id, "candidate_name": name})
+        record_id = data.get("record_id")
+        if not record_id:
+            continue
+        for _ in range(max_turns):
+            data = call("answer", {
+                "record_id": record_id,
+                "answer": "Em nghĩ JVM quản lý bộ nhớ bằng garbage collector và heap được chia theo thế hệ.",
+                "time_spent": 30
+            })
+            if data.get("finished") or "error" in data:
+                break
+    return samples
+
+
+def summarize(samples):
+    """p50/p95/mean theo route và theo giai đoạn; overhead = total - thời gian chờ provider."""
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample["route"]].append(sample)
+
+    report = {}
+    for route, route_samples in by_route.items():
+        stages = defaultdict(list)
+        overhead = []
+        for sample in route_samples:
+            for stage, ms in sample["stages"].items():
+                stages[stage].append(ms)
+            total = sample["stages"].get("total", sample["wall_ms"])
+            provider = sum(ms for stage, ms in sample["stages"].items() if stage.startswith(PROVIDER_PREFIXES))
+            overhead.append(max(total - provider, 0.0))
+
+        wall = [sample["wall_ms"] for sample in route_samples]
+        report[route] = {
+            "requests": len(route_samples),
+            "errors": sum(1 for sample in route_samples if sample["status"] >= 400),
+            "wall_ms": {"p50": percentile(wall, 0.5), "p95": percentile(wall, 0.95),
+                        "mean": round(sum(wall) / len(wall), 2)},
+            "overhead_ms": {"p50": percentile(overhead, 0.5), "p95": percentile(overhead, 0.95),
+                            "mean": round(sum(overhead) / len(overhead), 2)},
+            "stages": {
+                stage: {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                        "mean": round(sum(values) / len(values), 2), "count": len(values)}
+                for stage, values in sorted(stages.items())
+            }
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ các route phỏng vấn (offline)")
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=300.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.0)
+    parser.add_argument("--knowledge-chars", type=int, default=40000)
+    parser.add_argument("--config", default="{}", help='InterviewConfig của batch (JSON), vd. \'{"speculative_generation": true}\'')
+    parser.add_argument("--out", help="Ghi kết quả JSON ra file (mặc định in ra stdout)")
+    args = parser.parse_args()
+
+    env = build_bench_app(
+        candidates=args.candidates,
+        llm_latency_ms=args.llm_latency_ms,
+        tts_latency_ms=args.tts_latency_ms,
+        mongo_latency_ms=args.mongo_latency_ms,
+        knowledge_chars=args.knowledge_chars,
+        batch_config=json.loads(args.config)
+    )
+
+    started = time.perf_counter()
+    samples = run_interviews(env, args.max_turns)
+    result = {
+        "params": vars(args),
+        "duration_s": round(time.perf_counter() - started, 2),
+        "routes": summarize(samples)
+    }
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Đã ghi kết quả benchmark vào {args.out}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
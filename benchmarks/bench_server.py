@@ -0,0 +1,55 @@
+# benchmarks/bench_server.py
+"""
+Chạy app thật (mọi blueprint, `threaded=True` như app.py hoặc ASGI như asgi.py) với LLM/TTS/
+MongoDB giả lập, làm đích cho `benchmarks.load_generator`.
+
+    python -m benchmarks.bench_server --port 5050 --llm-latency-ms 1500 --tts-latency-ms 600
+    python -m benchmarks.bench_server --port 5050 --asgi
+
+Thêm route `POST /bench/login` (đăng nhập user benchmark, trả về id vectorstore giả lập)
+để load generator không cần tài khoản thật.
+"""
+
+import argparse
+
+from benchmarks.harness import BENCH_USER, install_stand_ins
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App phỏng vấn với LLM/TTS/MongoDB giả lập")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--llm-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=600.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=1.0)
+    parser.add_argument("--knowledge-chars", type=int, default=40000)
+    parser.add_argument("--asgi", action="store_true", help="Chạy bằng uvicorn (route phỏng vấn async)")
+    args = parser.parse_args()
+
+    vectorstore_id = install_stand_ins(
+        args.llm_latency_ms, args.tts_latency_ms, args.mongo_latency_ms, args.knowledge_chars
+    )
+
+    from flask import jsonify, session
+    from app import app
+
+    @app.route("/bench/login", methods=["POST"])
+    def bench_login():
+        session["user"] = dict(BENCH_USER)
+        return jsonify({"success": True, "vectorstore_id": vectorstore_id})
+
+    print(f"🏋️ Bench server: LLM {args.llm_latency_ms}ms, TTS {args.tts_latency_ms}ms, "
+          f"Mongo {args.mongo_latency_ms}ms ({'ASGI' if args.asgi else 'threaded=True'})")
+
+    if args.asgi:
+        import uvicorn
+        from asgiref.wsgi import WsgiToAsgi
+        from routes.interview_async import AsyncInterviewApp
+
+        uvicorn.run(AsyncInterviewApp(app, WsgiToAsgi(app)), host=args.host, port=args.port, log_level="warning")
+    else:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,550 @@
+# benchmarks/capacity_sim.py
+"""
+Mô phỏng offline hàng chục nghìn buổi phỏng vấn để ước lượng quota Gemini cho một batch.
+
+Luật chuyển độ khó / kết thúc là bản vector hóa (NumPy, mỗi dòng = một thí sinh) của
+`DifficultyAdapter.decide_next_action` + `InterviewProcessor._apply_action` (và điều kiện dừng sớm
+`AbilityEstimator` khi `difficulty_policy="adaptive"`); điểm mỗi câu
+lấy từ phân phối chuẩn theo `Level` (trừ dần theo độ khó). Từ đó đếm số lần gọi LLM theo
+component giống hệt luồng `process_answer` (warmup, question/ngân hàng câu hỏi, evaluate,
+evaluate_and_ask, speculative, closing) rồi quy ra token, thời gian chờ LLM, thời lượng buổi
+phỏng vấn, và số key cần cho RPM/TPM khi `--concurrent` thí sinh thi cùng lúc.
+
+    python -m benchmarks.capacity_sim --candidates 50000 --batch-size 300 --concurrent 120
+    python -m benchmarks.capacity_sim --config '{"threshold_high": 6.5, "max_total_questions": 10}'
+    python -m benchmarks.capacity_sim --usage usage.json   # hiệu chỉnh token/độ trễ từ admin metrics
+    python -m benchmarks.capacity_sim --verify 2000        # đối chiếu với InterviewProcessor thật
+    python -m benchmarks.capacity_sim --check-ability      # mọi level (cả KHA/GIOI hẹp) đều dừng sớm được
+
+`--usage`: JSON `llm_usage` của /admin metrics (usage_recorder.snapshot()) — token prompt/output
+mỗi lần gọi (số của provider nếu có, không thì est_* + cached_prefix_tokens), avg_ms theo component
+thay cho giá trị mặc định.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+from config import Config
+from LLMInterviewer4 import (InterviewConfig, InterviewProcessor, InterviewRecord, InterviewPhase, QuestionAttempt,
+                             AbilityEstimator, DifficultyAdapter, Level, QuestionDifficulty, get_initial_difficulty)
+
+LEVELS = list(Level)
+DIFFICULTIES = list(QuestionDifficulty)
+HARDER, SAME, EASIER = 0, 1, 2
+FINISH_REASONS = [None, "max_upper_level", "max_attempts", "max_questions", "ability_stable"]
+
+# Điểm (thang 10) ở độ khó MEDIUM theo level: (trung bình, độ lệch chuẩn)
+DEFAULT_SCORE_MODEL = {
+    "yeu": (3.5, 1.8),
+    "trung_binh": (5.0, 1.8),
+    "kha": (6.3, 1.7),
+    "gioi": (7.3, 1.6),
+    "xuat_sac": (8.2, 1.5),
+}
+DEFAULT_LEVEL_MIX = {"yeu": 0.10, "trung_binh": 0.30, "kha": 0.35, "gioi": 0.15, "xuat_sac": 0.10}
+
+COMPONENTS = ("warmup", "question", "personalize", "evaluate", "evaluate_and_ask", "closing")
+# Cá nhân hóa câu hỏi ngân hàng chạy trên LLM của component "question" (cùng model, cùng quota)
+LLM_COMPONENT = {"personalize": "question"}
+
+
+@dataclass
+class CallCost:
+    prompt_tokens: float
+    output_tokens: float
+    avg_ms: float
+
+
+def default_costs(config: InterviewConfig, knowledge_tokens: int) -> Dict[str, CallCost]:
+    """Chi phí trung bình mỗi lần gọi theo component (prompt bị cắt theo `token_budgets` như lúc chạy thật)."""
+    budgets = config.token_budgets
+    evaluate_knowledge = config.evaluator_token_budget if config.evaluator_top_k > 0 else knowledge_tokens
+    return {
+        "warmup": CallCost(600, 80, 1500),
+        "question": CallCost(min(knowledge_tokens + 1500, budgets.get("question", math.inf)), 250, 4000),
+        "personalize": CallCost(700, 250, 2000),
+        "evaluate": CallCost(min(evaluate_knowledge + 800, budgets.get("evaluate", math.inf)), 200, 3000),
+        "evaluate_and_ask": CallCost(min(knowledge_tokens + 2500, budgets.get("evaluate_and_ask", math.inf)),
+                                     450, 5500),
+        "closing": CallCost(900, 150, 2000),
+    }
+
+
+def calibrate_costs(costs: Dict[str, CallCost], usage: Dict) -> Dict[str, CallCost]:
+    """Thay giá trị mặc định bằng số đo thật từ `usage_recorder.snapshot()` (component có calls > 0)."""
+    costs = dict(costs)
+    for component, totals in usage.items():
+        calls = totals.get("calls", 0)
+        if component not in costs or not calls:
+            continue
+        reported = totals.get("reported_calls", 0)
+        if reported:
+            # Số token provider báo về (prompt đã gồm phần cached content, vẫn tính vào TPM)
+            prompt_tokens = totals["prompt_tokens"] / reported
+            output_tokens = totals["output_tokens"] / reported
+        elif "est_prompt_tokens" in totals:
+            prompt_tokens = (totals["est_prompt_tokens"] + totals.get("cached_prefix_tokens", 0)) / calls
+            output_tokens = totals["est_output_tokens"] / calls
+        else:
+            # Snapshot cũ (trước khi tách est_*/cached_prefix_tokens)
+            prompt_tokens = totals.get("avg_prompt_tokens", totals.get("prompt_tokens", 0) / calls)
+            output_tokens = totals.get("output_tokens", 0) / calls
+        costs[component] = CallCost(
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            avg_ms=totals.get("avg_ms", totals.get("total_ms", 0) / calls),
+        )
+    return costs
+
+
+# ===================================================================
+# Máy trạng thái vector hóa
+# ===================================================================
+@dataclass
+class SimState:
+    difficulty: np.ndarray  # chỉ số trong DIFFICULTIES
+    attempts: np.ndarray
+    total: np.ndarray
+    upper: np.ndarray
+    finished: np.ndarray
+    reason: np.ndarray  # chỉ số trong FINISH_REASONS
+
+
+def decide_actions(scores: np.ndarray, config: InterviewConfig) -> np.ndarray:
+    """Bản vector hóa của `DifficultyAdapter.decide_next_action`."""
+    return np.where(scores >= config.threshold_high, HARDER,
+                    np.where(scores >= config.threshold_low, SAME, EASIER))
+
+
+def apply_actions(state: SimState, actions: np.ndarray, active: np.ndarray, config: InterviewConfig) -> SimState:
+    """Bản vector hóa của `InterviewProcessor._apply_action`, chỉ áp cho các dòng `active`."""
+    harder = active & (actions == HARDER)
+    same = active & (actions == SAME)
+    easier = active & (actions == EASIER)
+
+    upper = np.where(harder, state.upper + 1, np.where(easier, np.maximum(state.upper - 1, 0), state.upper))
+    promote = harder & (upper <= config.max_upper_level)
+    overflow = harder & ~promote
+
+    difficulty = np.where(promote, np.minimum(state.difficulty + 1, len(DIFFICULTIES) - 1),
+                          np.where(easier, np.maximum(state.difficulty - 1, 0), state.difficulty))
+    attempts = np.where(promote, 0, np.where(same | easier, state.attempts + 1, state.attempts))
+    total = state.total + active
+
+    reason = np.where(overflow, 1, state.reason)
+    hit_attempts = active & (attempts >= config.max_attempts_per_level)
+    reason = np.where(hit_attempts, 2, reason)
+    hit_total = active & (total >= config.max_total_questions)
+    reason = np.where(hit_total & (reason == 0), 3, reason)
+
+    return SimState(difficulty, attempts, total, upper, state.finished | overflow | hit_attempts | hit_total, reason)
+
+
+def count_branches(state: SimState, active: np.ndarray, config: InterviewConfig) -> np.ndarray:
+    """Số nhánh speculative (độ khó khác nhau, không kết thúc) như `_predict_next_difficulties`."""
+    outcomes = []
+    for action in (HARDER, SAME, EASIER):
+        probe = apply_actions(state, np.full(len(active), action), active, config)
+        outcomes.append(np.where(probe.finished, -1, probe.difficulty))
+    h, s, e = outcomes
+    return (h >= 0).astype(int) + ((s >= 0) & (s != h)) + ((e >= 0) & (e != h) & (e != s))
+
+
+class AbilityState:
+    """Bản vector hóa của `AbilityEstimator`: giữ tổng precision / tổng có trọng số theo từng thí sinh."""
+
+    _erf = np.vectorize(math.erf, otypes=[float])
+
+    def __init__(self, levels: np.ndarray, config: InterviewConfig):
+        self.config = config
+        prior_precision = 1.0 / config.ability_prior_sd ** 2
+        prior_means = np.array([AbilityEstimator.PRIOR_MEANS[level] for level in LEVELS])
+        self.precision = np.full(len(levels), prior_precision)
+        self.weighted = prior_means[levels] * prior_precision
+        self.offsets = np.array([AbilityEstimator.DIFFICULTY_OFFSETS[d] for d in DIFFICULTIES])
+        self.boundaries = np.array(AbilityEstimator.BOUNDARIES)
+
+    def observe(self, scores: np.ndarray, difficulty: np.ndarray, active: np.ndarray):
+        noise_precision = 1.0 / self.config.ability_noise_sd ** 2
+        self.precision = self.precision + np.where(active, noise_precision, 0.0)
+        self.weighted = self.weighted + np.where(active, (scores + self.offsets[difficulty]) * noise_precision, 0.0)
+
+    def sd(self) -> np.ndarray:
+        return np.round(np.sqrt(1.0 / self.precision), 3)
+
+    def confidence(self) -> np.ndarray:
+        mean = self.weighted / self.precision
+        distance = np.abs(mean[:, None] - self.boundaries[None, :]).min(axis=1)
+        z = distance / np.sqrt(1.0 / self.precision)
+        return np.round(0.5 * (1.0 + self._erf(z / math.sqrt(2.0))), 4)
+
+
+def stop_when_stable(state: SimState, ability: AbilityState, active: np.ndarray, config: InterviewConfig) -> SimState:
+    """Điều kiện dừng sớm của `InterviewProcessor._update_ability`."""
+    stable = (ability.confidence() >= config.ability_stop_confidence) | (ability.sd() <= config.ability_stop_sd)
+    stop = active & ~state.finished & (state.total >= config.ability_min_questions) & stable
+    return SimState(state.difficulty, state.attempts, state.total, state.upper,
+                    state.finished | stop, np.where(stop, FINISH_REASONS.index("ability_stable"), state.reason))
+
+
+def check_ability_stop(config: InterviewConfig) -> Dict:
+    """
+    Số câu `AbilityEstimator` thật cần để dừng sớm với thí sinh trả lời ổn định ở GIỮA mỗi level
+    (câu MEDIUM, điểm = tâm khoảng level, prior đúng level). Level nào không dừng được trước
+    `max_total_questions` → điều kiện dừng đang thiên vị level biên.
+    """
+    estimator = AbilityEstimator()
+    stops = {}
+    for level, low, high in AbilityEstimator.LEVEL_BOUNDS:
+        center = AbilityEstimator.PRIOR_MEANS[level] if math.isinf(low) or math.isinf(high) else (low + high) / 2
+        attempts = []
+        stops[level.value] = None
+        for _ in range(config.max_total_questions):
+            attempts.append(QuestionAttempt(question="", answer="", score=center, analysis="",
+                                            difficulty=QuestionDifficulty.MEDIUM, timestamp=""))
+            if estimator.is_stable(estimator.estimate(attempts, level, config), config):
+                stops[level.value] = len(attempts)
+                break
+    return {"answers_to_stop": stops, "all_levels_stop_early": all(
+        n is not None and n < config.max_total_questions for n in stops.values())}
+
+
+# ===================================================================
+# Mô phỏng
+# ===================================================================
+class Simulator:
+    def __init__(self, config: InterviewConfig, costs: Dict[str, CallCost], score_model: Dict,
+                 level_mix: Dict, difficulty_penalty: float = 1.0, latency_sigma: float = 0.35,
+                 answer_time_s: float = 60.0, tts_ms: float = 600.0, combined_fallback_rate: float = 0.05,
+                 combined_mismatch_rate: float = 0.10, seed: int = 0):
+        self.config = config
+        self.costs = costs
+        self.score_model = score_model
+        self.level_mix = level_mix
+        self.difficulty_penalty = difficulty_penalty
+        self.latency_sigma = latency_sigma
+        self.answer_time_s = answer_time_s
+        self.tts_ms = tts_ms
+        self.combined_fallback_rate = combined_fallback_rate
+        self.combined_mismatch_rate = combined_mismatch_rate
+        self.rng = np.random.default_rng(seed)
+
+        # Ngân hàng câu hỏi thay lượt sinh câu hỏi bằng lượt cá nhân hóa (hoặc không gọi LLM)
+        if config.use_question_bank:
+            self.question_component = "personalize" if config.question_bank_personalize else None
+        else:
+            self.question_component = "question"
+
+    def _latency(self, component: str, n: int) -> np.ndarray:
+        """Độ trễ (ms) log-normal có trung bình = avg_ms của component."""
+        if component is None:
+            return np.zeros(n)
+        mean = self.costs[component].avg_ms
+        mu = math.log(max(mean, 1e-3)) - self.latency_sigma ** 2 / 2
+        return self.rng.lognormal(mu, self.latency_sigma, n)
+
+    def _scores(self, levels: np.ndarray, difficulty: np.ndarray) -> np.ndarray:
+        means = np.array([self.score_model[level.value][0] for level in LEVELS])[levels]
+        sds = np.array([self.score_model[level.value][1] for level in LEVELS])[levels]
+        medium = DIFFICULTIES.index(QuestionDifficulty.MEDIUM)
+        means = means - self.difficulty_penalty * (difficulty - medium)
+        return np.clip(np.round(self.rng.normal(means, sds), 1), 0.0, 10.0)
+
+    def _initial_difficulty(self, levels: np.ndarray) -> np.ndarray:
+        per_level = np.array([DIFFICULTIES.index(get_initial_difficulty(level, self.config)) for level in LEVELS])
+        return per_level[levels]
+
+    def run(self, n: int) -> Dict[str, np.ndarray]:
+        config = self.config
+        mix = np.array([self.level_mix.get(level.value, 0.0) for level in LEVELS], dtype=float)
+        levels = self.rng.choice(len(LEVELS), size=n, p=mix / mix.sum())
+
+        calls = {component: np.zeros(n, dtype=int) for component in COMPONENTS}
+        llm_wait_ms = np.zeros(n)
+        questions_shown = np.zeros(n, dtype=int)  # mỗi câu hỏi hiển thị = 1 lần TTS
+
+        # ---------- Mở đầu: warmup (nếu có) + câu hỏi kỹ thuật đầu tiên ----------
+        warmups = config.max_warmup_questions
+        if warmups > 0:
+            calls["warmup"] += warmups
+            for _ in range(warmups):
+                llm_wait_ms += self._latency("warmup", n)
+        if self.question_component:
+            calls[self.question_component] += 1
+            llm_wait_ms += self._latency(self.question_component, n)
+        questions_shown += warmups + 1
+
+        state = SimState(
+            difficulty=self._initial_difficulty(levels),
+            attempts=np.zeros(n, dtype=int), total=np.zeros(n, dtype=int), upper=np.zeros(n, dtype=int),
+            finished=np.zeros(n, dtype=bool), reason=np.zeros(n, dtype=int)
+        )
+        scores = np.full((n, config.max_total_questions), np.nan)
+        ability = AbilityState(levels, config) if config.difficulty_policy == "adaptive" else None
+
+        # ---------- Các lượt kỹ thuật ----------
+        for turn in range(config.max_total_questions):
+            active = ~state.finished
+            if not active.any():
+                break
+            turn_scores = self._scores(levels, state.difficulty)
+            scores[active, turn] = turn_scores[active]
+
+            branches = count_branches(state, active, config) if config.speculative_generation else None
+            new_state = apply_actions(state, decide_actions(turn_scores, config), active, config)
+            if ability is not None:
+                ability.observe(turn_scores, state.difficulty, active)
+                new_state = stop_when_stable(new_state, ability, active, config)
+            continuing = active & ~new_state.finished
+
+            if config.combined_evaluate_and_ask:
+                calls["evaluate_and_ask"] += active
+                llm_wait_ms += np.where(active, self._latency("evaluate_and_ask", n), 0)
+                fallback = active & (self.rng.random(n) < self.combined_fallback_rate)
+                mismatch = continuing & ~fallback & (self.rng.random(n) < self.combined_mismatch_rate)
+                two_call = fallback
+            else:
+                mismatch = np.zeros(n, dtype=bool)
+                two_call = active
+
+            # Luồng 2 lần gọi (mặc định hoặc fallback của evaluate-and-ask)
+            evaluate_ms = self._latency("evaluate", n)
+            question_ms = self._latency(self.question_component, n)
+            calls["evaluate"] += two_call
+            if config.speculative_generation:
+                # Sinh mọi nhánh song song với chấm điểm (kể cả lượt kết thúc → bỏ đi)
+                if self.question_component:
+                    calls[self.question_component] += np.where(two_call, branches, 0)
+                llm_wait_ms += np.where(two_call & continuing, np.maximum(evaluate_ms, question_ms),
+                                        np.where(two_call, evaluate_ms, 0))
+            else:
+                if self.question_component:
+                    calls[self.question_component] += two_call & continuing
+                llm_wait_ms += np.where(two_call, evaluate_ms, 0) + np.where(two_call & continuing, question_ms, 0)
+
+            # Evaluate-and-ask chọn sai độ khó → sinh lại câu hỏi
+            if self.question_component:
+                calls[self.question_component] += mismatch
+            llm_wait_ms += np.where(mismatch, question_ms, 0)
+
+            questions_shown += continuing
+            state = new_state
+
+        # Lời kết sinh nền sau khi trả kết quả → tính token/lượt gọi, không tính vào thời gian chờ
+        calls["closing"] += 1
+
+        prompt_tokens = sum(calls[c] * self.costs[c].prompt_tokens for c in COMPONENTS)
+        output_tokens = sum(calls[c] * self.costs[c].output_tokens for c in COMPONENTS)
+        answers = warmups + state.total
+        interview_s = (llm_wait_ms + questions_shown * self.tts_ms) / 1000 + answers * self.answer_time_s
+
+        return {
+            "levels": levels,
+            "scores": scores,
+            "technical_questions": state.total,
+            "finish_reason": state.reason,
+            "calls": calls,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "llm_wait_s": llm_wait_ms / 1000,
+            "interview_min": interview_s / 60,
+        }
+
+
+# ===================================================================
+# Đối chiếu với InterviewProcessor thật
+# ===================================================================
+def verify_against_processor(config: InterviewConfig, result: Dict, sample: int) -> Dict:
+    """
+    Phát lại chuỗi điểm của `sample` thí sinh qua `InterviewProcessor._update_record_state` thật,
+    so số câu kỹ thuật + finish_reason với bản vector hóa.
+    """
+    processor = InterviewProcessor.__new__(InterviewProcessor)  # chỉ cần difficulty_adapter, không cần LLM
+    processor.difficulty_adapter = DifficultyAdapter()
+    processor.ability_estimator = AbilityEstimator()
+
+    mismatches = 0
+    checked = min(sample, len(result["levels"]))
+    for i in range(checked):
+        level = LEVELS[result["levels"][i]]
+        record = InterviewRecord(
+            batch_id="sim", candidate_name="sim", candidate_profile="", candidate_context="",
+            classified_level=level, current_difficulty=get_initial_difficulty(level, config),
+            current_phase=InterviewPhase.TECHNICAL, attempts_at_current_level=0, total_questions_asked=0,
+            upper_level_reached=0, warmup_questions_asked=0, history=[], conversation_memory=[], is_finished=False
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            for score in result["scores"][i]:
+                if record.is_finished or np.isnan(score):
+                    break
+                record.history.append(QuestionAttempt(
+                    question="", answer="", score=float(score), analysis="", difficulty=record.current_difficulty,
+                    timestamp=""
+                ))
+                processor._update_record_state(record, float(score), config)
+        expected = (int(result["technical_questions"][i]), FINISH_REASONS[result["finish_reason"][i]])
+        if (record.total_questions_asked, record.finish_reason) != expected:
+            mismatches += 1
+    return {"checked": checked, "mismatches": mismatches}
+
+
+# ===================================================================
+# Báo cáo
+# ===================================================================
+def describe(values: np.ndarray) -> Dict:
+    return {
+        "mean": round(float(np.mean(values)), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "max": round(float(np.max(values)), 2),
+    }
+
+
+def build_report(result: Dict, config: InterviewConfig, costs: Dict[str, CallCost],
+                 batch_size: int, concurrent: int) -> Dict:
+    n = len(result["levels"])
+    calls = result["calls"]
+    total_calls = sum(calls.values())
+    total_tokens = result["prompt_tokens"] + result["output_tokens"]
+
+    reasons = {}
+    for index, name in enumerate(FINISH_REASONS[1:], 1):
+        share = float(np.mean(result["finish_reason"] == index))
+        if share:
+            reasons[name] = round(share, 4)
+
+    by_level = {}
+    for index, level in enumerate(LEVELS):
+        mask = result["levels"] == index
+        if mask.any():
+            by_level[level.value] = {
+                "share": round(float(mask.mean()), 4),
+                "technical_questions": round(float(result["technical_questions"][mask].mean()), 2),
+                "llm_calls": round(float(total_calls[mask].mean()), 2),
+                "tokens": round(float(total_tokens[mask].mean())),
+                "interview_min": round(float(result["interview_min"][mask].mean()), 2),
+            }
+
+    # Quota theo model (mỗi model có RPM/TPM riêng trên mỗi key), xem model_router.py
+    per_model = {}
+    minutes = float(np.mean(result["interview_min"]))
+    for component in COMPONENTS:
+        model = (config.component_models or {}).get(LLM_COMPONENT.get(component, component), Config.LLM_MODEL)
+        stats = per_model.setdefault(model, {"calls_per_candidate": 0.0, "tokens_per_candidate": 0.0})
+        stats["calls_per_candidate"] += float(np.mean(calls[component]))
+        stats["tokens_per_candidate"] += float(np.mean(calls[component])) * (
+            costs[component].prompt_tokens + costs[component].output_tokens)
+
+    keys_needed = 0
+    for model, stats in per_model.items():
+        # `concurrent` thí sinh thi cùng lúc, lượt gọi trải đều trên thời lượng buổi phỏng vấn
+        rpm = concurrent * stats["calls_per_candidate"] / minutes if minutes else 0.0
+        tpm = concurrent * stats["tokens_per_candidate"] / minutes if minutes else 0.0
+        limits = Config.GEMINI_MODEL_LIMITS.get(model, {})
+        rpm_limit = limits.get("rpm", Config.GEMINI_RPM_LIMIT)
+        tpm_limit = limits.get("tpm", Config.GEMINI_TPM_LIMIT)
+        stats.update({
+            "calls_per_candidate": round(stats["calls_per_candidate"], 2),
+            "tokens_per_candidate": round(stats["tokens_per_candidate"]),
+            "batch_calls": round(stats["calls_per_candidate"] * batch_size),
+            "batch_tokens": round(stats["tokens_per_candidate"] * batch_size),
+            "steady_rpm": round(rpm, 1),
+            "steady_tpm": round(tpm),
+            "rpm_limit_per_key": rpm_limit,
+            "tpm_limit_per_key": tpm_limit,
+            "keys_needed": max(1, math.ceil(max(rpm / rpm_limit, tpm / tpm_limit))),
+        })
+        keys_needed = max(keys_needed, stats["keys_needed"])
+
+    return {
+        "simulated_candidates": n,
+        "per_candidate": {
+            "technical_questions": describe(result["technical_questions"]),
+            "llm_calls": describe(total_calls),
+            "llm_calls_by_component": {c: round(float(np.mean(calls[c])), 3) for c in COMPONENTS
+                                       if calls[c].any()},
+            "prompt_tokens": describe(result["prompt_tokens"]),
+            "output_tokens": describe(result["output_tokens"]),
+            "llm_wait_s": describe(result["llm_wait_s"]),
+            "interview_min": describe(result["interview_min"]),
+        },
+        "finish_reasons": reasons,
+        "by_level": by_level,
+        "batch": {
+            "candidates": batch_size,
+            "concurrent": concurrent,
+            "llm_calls": round(float(np.mean(total_calls)) * batch_size),
+            "tokens": round(float(np.mean(total_tokens)) * batch_size),
+            "rpm_limit_per_key": Config.GEMINI_RPM_LIMIT,
+            "tpm_limit_per_key": Config.GEMINI_TPM_LIMIT,
+            "keys_needed": keys_needed,
+            "models": per_model,
+        },
+        "costs": {c: vars(cost) for c, cost in costs.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng offline để ước lượng quota LLM cho một batch")
+    parser.add_argument("--candidates", type=int, default=20000, help="Số buổi phỏng vấn mô phỏng")
+    parser.add_argument("--config", default="{}", help="InterviewConfig (JSON), vd. '{\"threshold_high\": 6.5}'")
+    parser.add_argument("--batch-size", type=int, default=200, help="Số thí sinh của batch cần ước lượng")
+    parser.add_argument("--concurrent", type=int, help="Số thí sinh thi cùng lúc (mặc định = --batch-size)")
+    parser.add_argument("--knowledge-tokens", type=int, default=8000, help="Kích thước knowledge_text (token)")
+    parser.add_argument("--usage", help="JSON llm_usage từ admin metrics để hiệu chỉnh token/độ trễ")
+    parser.add_argument("--score-model", help="JSON {level: [mean, sd]} điểm ở độ khó MEDIUM")
+    parser.add_argument("--level-mix", help="JSON {level: tỉ lệ} phân bố level thí sinh")
+    parser.add_argument("--difficulty-penalty", type=float, default=1.0, help="Điểm giảm mỗi bậc khó hơn MEDIUM")
+    parser.add_argument("--answer-time-s", type=float, default=60.0, help="Thời gian trả lời trung bình mỗi câu")
+    parser.add_argument("--tts-ms", type=float, default=600.0)
+    parser.add_argument("--verify", type=int, default=0, help="Đối chiếu N thí sinh với InterviewProcessor thật")
+    parser.add_argument("--check-ability", action="store_true",
+                        help="Kiểm tra thí sinh ở giữa mọi level (cả KHA/GIOI) đều dừng sớm được")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Ghi kết quả JSON ra file (mặc định in ra stdout)")
+    args = parser.parse_args()
+
+    config = InterviewConfig(**json.loads(args.config))
+    costs = default_costs(config, args.knowledge_tokens)
+    if args.usage:
+        with open(args.usage, encoding="utf-8") as f:
+            usage = json.load(f)
+        costs = calibrate_costs(costs, usage.get("llm_usage", usage))
+
+    score_model = dict(DEFAULT_SCORE_MODEL, **json.loads(args.score_model or "{}"))
+    level_mix = json.loads(args.level_mix) if args.level_mix else DEFAULT_LEVEL_MIX
+
+    simulator = Simulator(config, costs, score_model, level_mix, args.difficulty_penalty,
+                          answer_time_s=args.answer_time_s, tts_ms=args.tts_ms, seed=args.seed)
+    result = simulator.run(args.candidates)
+    report = build_report(result, config, costs, args.batch_size, args.concurrent or args.batch_size)
+    report["params"] = vars(args)
+
+    if args.verify:
+        report["verify"] = verify_against_processor(config, result, args.verify)
+        status = "✅" if report["verify"]["mismatches"] == 0 else "❌"
+        print(f"{status} Đối chiếu InterviewProcessor: {report['verify']}")
+
+    if args.check_ability:
+        report["ability_check"] = check_ability_stop(config)
+        status = "✅" if report["ability_check"]["all_levels_stop_early"] else "❌"
+        print(f"{status} Dừng sớm theo level: {report['ability_check']['answers_to_stop']}")
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Đã ghi kết quả mô phỏng vào {args.out}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
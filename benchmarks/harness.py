@@ -0,0 +1,171 @@
+# benchmarks/harness.py
+"""
+Dựng app để benchmark offline: MongoDB trong bộ nhớ, LLM giả lập (fake_llm.py) với độ trễ
+cố định, TTS giả lập, vectorstore giả lập. Không cần Gemini key, MongoDB hay model embedding.
+
+Phải gọi `install_stand_ins(...)` (hoặc `build_bench_app(...)`) TRƯỚC mọi import `extensions`
+/ `routes` / `app` (harness đặt biến môi trường và thay `pymongo.MongoClient` trước khi các
+module đó được load).
+"""
+
+import os
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BENCH_USER = {"id": 1, "username": "bench", "email": "bench@example.com", "role": "admin"}
+BENCH_OUTLINE = ["OOP", "JVM", "Collections", "Concurrency"]
+FAKE_AUDIO_BYTES = b"\xff\xf3\x44\xc4" + b"\x00" * 16 * 1024  # ~16KB, cỡ một câu hỏi ngắn
+
+
+class FakeVectorStore:
+    """Thay cho FAISS: CV trả về hồ sơ theo tên, knowledge trả về các đoạn tài liệu."""
+
+    def __init__(self, path: str, knowledge_chunks: List[str]):
+        self.path = path
+        self.knowledge_chunks = knowledge_chunks
+
+    @classmethod
+    def loader(cls, knowledge_chunks: List[str]):
+        return SimpleNamespace(
+            load_local=lambda path, *args, **kwargs: cls(path, knowledge_chunks)
+        )
+
+    def similarity_search(self, query: str, k: int = 4):
+        if "cv" in os.path.basename(self.path):
+            return [SimpleNamespace(page_content=f"Họ tên: {query}, Lớp: BENCH, Điểm 40%: 7.5", metadata={})]
+        return [SimpleNamespace(page_content=chunk, metadata={}) for chunk in self.knowledge_chunks[:k]]
+
+
+@dataclass
+class BenchEnv:
+    app: object
+    batch_id: str
+    candidates: List[str]
+    collections: Dict[str, object] = field(default_factory=dict)
+
+    def client(self):
+        """Test client đã đăng nhập."""
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = dict(BENCH_USER)
+        return client
+
+
+def make_knowledge_text(knowledge_chars: int) -> str:
+    paragraph = "Java là ngôn ngữ lập trình hướng đối tượng, chạy trên JVM, có garbage collector. "
+    return (paragraph * (knowledge_chars // len(paragraph) + 1))[:knowledge_chars]
+
+
+def install_stand_ins(llm_latency_ms: float = 800.0, tts_latency_ms: float = 300.0,
+                      mongo_latency_ms: float = 0.0, knowledge_chars: int = 40000) -> str:
+    """
+    Thay Gemini/TTS/MongoDB/FAISS bằng bản giả lập trong tiến trình hiện tại.
+    Returns: id của vectorstore tài liệu giả lập (dùng cho /interview_batch/create).
+    """
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ.setdefault("FAKE_LLM_LATENCY_SIGMA", "0")  # Độ trễ cố định → đo được overhead
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+    os.environ.setdefault("HEDGE_ENABLED", "0")
+
+    import pymongo
+    from benchmarks.memory_mongo import MemoryMongoClient
+    MemoryMongoClient.latency_ms = mongo_latency_ms
+    pymongo.MongoClient = MemoryMongoClient
+
+    import extensions
+    from config import Config
+    import routes.interview_process as interview_process
+    import routes.interview_batch as interview_batch
+    import routes.interview_async as interview_async
+
+    knowledge_text = make_knowledge_text(knowledge_chars)
+    chunks = [knowledge_text[i:i + 1000] for i in range(0, len(knowledge_text), 1000)]
+    vector_loader = FakeVectorStore.loader(chunks)
+
+    extensions.embedding_manager.get_model = lambda *args, **kwargs: None
+    interview_process.FAISS = vector_loader
+    interview_batch.FAISS = vector_loader
+    interview_batch.build_cv_vectorstore_from_candidates = \
+        lambda candidates, embedding_model=None, base_dir="vectorstores/cv": f"bench/cv_{uuid.uuid4().hex[:8]}"
+    interview_batch.KnowledgeBuilder = lambda knowledge_db: SimpleNamespace(
+        build_context=lambda topic, outline=None: knowledge_text
+    )
+
+    Config.init_folders()
+
+    def fake_tts(text, lang="vi"):
+        """Giống create_audio_from_text: ghi file + đăng ký vào audio_cache để /audio/<id> phục vụ được."""
+        time.sleep(tts_latency_ms / 1000)
+        audio_id = str(uuid.uuid4())
+        path = os.path.join(Config.AUDIO_FOLDER, f"question_{audio_id}.mp3")
+        with open(path, "wb") as f:
+            f.write(FAKE_AUDIO_BYTES)
+        extensions.audio_cache[audio_id] = {
+            "path": path, "created_at": datetime.now(), "source": "bench", "text": text
+        }
+        return audio_id
+
+    interview_process.create_audio_from_text = fake_tts
+    interview_async.create_audio_from_text = fake_tts
+
+    vectorstore = {
+        "model_name": "bench",
+        "vectorstore_path": "bench/knowledge",
+        "user_id": None,  # public → mọi user dùng được
+        "is_public": True,
+        "name": "benchmark-knowledge"
+    }
+    return str(extensions.db_vectorstores.insert_one(vectorstore).inserted_id)
+
+
+def build_bench_app(candidates: int = 10, llm_latency_ms: float = 800.0, tts_latency_ms: float = 300.0,
+                    mongo_latency_ms: float = 0.0, knowledge_chars: int = 40000,
+                    batch_config: Dict = None) -> BenchEnv:
+    """App Flask tối giản (chỉ blueprint phỏng vấn) + một batch đã tạo sẵn, cho benchmark trong tiến trình."""
+    install_stand_ins(llm_latency_ms, tts_latency_ms, mongo_latency_ms, knowledge_chars)
+
+    from flask import Flask
+    import extensions
+    import routes.interview_process as interview_process
+
+    batch = {
+        "user_id": BENCH_USER["id"],
+        "batch_name": "benchmark",
+        "topic": "Java",
+        "outline": BENCH_OUTLINE,
+        "knowledge_text": make_knowledge_text(knowledge_chars),
+        "knowledge_summary": "Tài liệu bao phủ OOP, JVM, Collections, Concurrency.",
+        "config": dict(batch_config or {}),
+        "embedding_model_name": "bench",
+        "cv_vectorstore_path": "bench/cv",
+        "knowledge_vectorstore_path": "bench/knowledge",
+    }
+    batch_id = str(extensions.db_batches.insert_one(batch).inserted_id)
+
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    app.register_blueprint(interview_process.interview_bp, url_prefix="/interview")
+
+    return BenchEnv(
+        app=app,
+        batch_id=batch_id,
+        candidates=[f"Thí sinh {i:03d}" for i in range(candidates)],
+        collections={"records": extensions.db_records, "batches": extensions.db_batches}
+    )
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
@@ -0,0 +1,214 @@
+# benchmarks/load_generator.py
+"""
+Mô phỏng N thí sinh phỏng vấn đồng thời trên một instance đang chạy (thường là
+`benchmarks.bench_server`, cũng dùng được với server thật + tài khoản thật).
+
+Mỗi thí sinh: start_candidate → tải audio → (nghĩ) → answer → tải audio → ... tới khi kết thúc.
+Báo cáo throughput, phân vị độ trễ theo endpoint và tỉ lệ lỗi (JSON).
+
+    python -m benchmarks.bench_server --port 5050 &
+    python -m benchmarks.load_generator --base-url http://127.0.0.1:5050 --candidates 50 --think-time-s 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.harness import BENCH_OUTLINE, percentile
+
+ANSWERS = [
+    "Em nghĩ JVM quản lý bộ nhớ bằng garbage collector, heap được chia theo thế hệ.",
+    "Tính đóng gói giúp che giấu dữ liệu, chỉ cho truy cập qua phương thức public.",
+    "HashMap lưu theo bucket dựa trên hashCode, khi va chạm thì dùng danh sách hoặc cây.",
+    "Em chưa chắc lắm, nhưng synchronized đảm bảo chỉ một thread vào vùng găng tại một thời điểm.",
+]
+
+
+class LoadStats:
+    """Độ trễ + mã lỗi theo endpoint, thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.interviews_started = 0
+        self.interviews_finished = 0
+
+    def record(self, endpoint: str, latency_ms: float, status: int, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(latency_ms)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def report(self, duration_s: float):
+        with self._lock:
+            total = sum(len(values) for values in self.latencies.values())
+            return {
+                "duration_s": round(duration_s, 2),
+                "requests": total,
+                "throughput_rps": round(total / duration_s, 2) if duration_s else 0.0,
+                "interviews_started": self.interviews_started,
+                "interviews_finished": self.interviews_finished,
+                "endpoints": {
+                    endpoint: {
+                        "requests": len(values),
+                        "error_rate": round(self.errors[endpoint] / len(values), 4),
+                        "statuses": dict(self.statuses[endpoint]),
+                        "latency_ms": {
+                            "p50": percentile(values, 0.5), "p90": percentile(values, 0.9),
+                            "p95": percentile(values, 0.95), "p99": percentile(values, 0.99),
+                            "max": round(max(values), 2)
+                        }
+                    }
+                    for endpoint, values in sorted(self.latencies.items())
+                }
+            }
+
+
+def timed_request(http: requests.Session, stats: LoadStats, endpoint: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = http.request(method, url, timeout=kwargs.pop("timeout", 180), **kwargs)
+    except requests.RequestException as e:
+        stats.record(endpoint, (time.perf_counter() - started) * 1000, 0, ok=False)
+        print(f"⚠️ {endpoint}: {e}")
+        return None
+    latency_ms = (time.perf_counter() - started) * 1000
+    ok = response.status_code < 400
+    if ok and response.headers.get("Content-Type", "").startswith("application/json"):
+        ok = "error" not in (response.json() or {})
+    stats.record(endpoint, latency_ms, response.status_code, ok)
+    return response
+
+
+def login(base_url: str, args) -> requests.Session:
+    http = requests.Session()
+    if args.email:
+        response = http.post(f"{base_url}/login", json={"email": args.email, "password": args.password})
+    else:
+        response = http.post(f"{base_url}/bench/login")
+    response.raise_for_status()
+    http.bench_vectorstore_id = (response.json() or {}).get("vectorstore_id")
+    return http
+
+
+def create_batch(http: requests.Session, base_url: str, names, args) -> str:
+    vectorstore_id = args.vectorstore_id or http.bench_vectorstore_id
+    response = http.post(f"{base_url}/interview_batch/create", json={
+        "session_name": f"load-test {time.strftime('%H:%M:%S')}",
+        "topic": "Java",
+        "outline": BENCH_OUTLINE,
+        "vectorstore_id": vectorstore_id,
+        "candidates": [{"Họ tên": name, "Lớp": "LOAD", "Điểm 40%": 7.5} for name in names],
+        "config": json.loads(args.config)
+    }, timeout=600)
+    data = response.json()
+    if not data.get("success"):
+        raise RuntimeError(f"Không tạo được batch: {data}")
+    return data["session_id"]
+
+
+def run_candidate(base_url: str, cookies, batch_id: str, name: str, args, stats: LoadStats, seed: int):
+    """Một thí sinh làm hết buổi phỏng vấn."""
+    rng = random.Random(seed)
+    http = requests.Session()
+    http.cookies.update(cookies)
+
+    def think():
+        if args.think_time_s > 0:
+            time.sleep(rng.lognormvariate(0, 0.5) * args.think_time_s)
+
+    def fetch_audio(data):
+        if args.fetch_audio and data.get("audio_url"):
+            timed_request(http, stats, "audio", "GET", f"{base_url}{data['audio_url']}")
+
+    response = timed_request(http, stats, "start_candidate", "POST", f"{base_url}/interview/start_candidate",
+                             json={"session_id": batch_id, "candidate_name": name})
+    if response is None or response.status_code >= 400:
+        return
+    data = response.json()
+    record_id = data.get("record_id")
+    if not record_id or data.get("already_completed"):
+        return
+    stats.count("interviews_started")
+    fetch_audio(data)
+
+    for _ in range(args.max_turns):
+        think()
+        response = timed_request(http, stats, "answer", "POST", f"{base_url}/interview/answer", json={
+            "record_id": record_id,
+            "answer": rng.choice(ANSWERS),
+            "time_spent": rng.randint(15, 120)
+        })
+        if response is None or response.status_code >= 400:
+            return
+        data = response.json()
+        if data.get("finished"):
+            stats.count("interviews_finished")
+            return
+        fetch_audio(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test: N thí sinh phỏng vấn đồng thời")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5050")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, help="Số thí sinh chạy cùng lúc (mặc định = --candidates)")
+    parser.add_argument("--ramp-up-s", type=float, default=10.0, help="Rải thời điểm bắt đầu của các thí sinh")
+    parser.add_argument("--think-time-s", type=float, default=20.0, help="Thời gian nghĩ trung vị trước mỗi câu trả lời")
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument("--no-audio", dest="fetch_audio", action="store_false", help="Không tải audio_url")
+    parser.add_argument("--batch-id", help="Dùng batch có sẵn thay vì tạo mới")
+    parser.add_argument("--vectorstore-id", help="Vectorstore tài liệu khi tạo batch (server thật)")
+    parser.add_argument("--email", help="Đăng nhập tài khoản thật thay vì /bench/login")
+    parser.add_argument("--password")
+    parser.add_argument("--config", default="{}", help="InterviewConfig của batch mới (JSON)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Ghi kết quả JSON ra file (mặc định in ra stdout)")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    names = [f"Thí sinh tải {i:04d}" for i in range(args.candidates)]
+
+    http = login(base_url, args)
+    batch_id = args.batch_id or create_batch(http, base_url, names, args)
+    print(f"🏁 Batch {batch_id}: {len(names)} thí sinh, concurrency {args.concurrency or len(names)}")
+
+    stats = LoadStats()
+
+    def start(index: int, name: str):
+        time.sleep(args.ramp_up_s * index / max(len(names) - 1, 1))
+        try:
+            run_candidate(base_url, http.cookies, batch_id, name, args, stats, args.seed + index)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency or len(names)) as executor:
+        for index, name in enumerate(names):
+            executor.submit(start, index, name)
+
+    result = {"params": vars(args), "batch_id": batch_id, **stats.report(time.perf_counter() - started)}
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Đã ghi kết quả load test vào {args.out}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
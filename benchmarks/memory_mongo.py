@@ -0,0 +1,324 @@
+# benchmarks/memory_mongo.py
+"""
+MongoDB giả lập trong bộ nhớ cho benchmark (chỉ phần API mà app đang dùng).
+
+Document được deepcopy khi ghi/đọc để mô phỏng chi phí serialize của driver thật;
+`latency_ms` cộng thêm độ trễ mạng cố định cho mỗi thao tác.
+"""
+
+import copy
+import threading
+import time
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+
+def _get_path(doc, path):
+    for part in path.split("."):
+        if isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            return None, False
+    return doc, True
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if isinstance(doc, list):
+            doc = doc[int(part)]
+        else:
+            doc = doc.setdefault(part, {})
+    if isinstance(doc, list):
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
+
+
+def _unset_path(doc, path):
+    parent, found = _get_path(doc, path.rsplit(".", 1)[0]) if "." in path else (doc, True)
+    if found and isinstance(parent, dict):
+        parent.pop(path.rsplit(".", 1)[-1], None)
+
+
+def _match_value(value, found, condition):
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$exists" and bool(found) != bool(arg):
+                return False
+            if op == "$in" and value not in arg:
+                return False
+            if op == "$nin" and value in arg:
+                return False
+            if op == "$ne" and value == arg:
+                return False
+            if op == "$lt" and not (found and value < arg):
+                return False
+            if op == "$lte" and not (found and value <= arg):
+                return False
+            if op == "$gt" and not (found and value > arg):
+                return False
+            if op == "$gte" and not (found and value >= arg):
+                return False
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value, found = _get_path(doc, key)
+        if not _match_value(value, found, condition):
+            return False
+    return True
+
+
+def _evaluate(doc, expr):
+    """Biểu thức aggregation tối thiểu cho update pipeline ($literal, $concatArrays, $slice, "$field")."""
+    if isinstance(expr, str) and expr.startswith("$"):
+        return copy.deepcopy(_get_path(doc, expr[1:])[0])
+    if isinstance(expr, list):
+        return [_evaluate(doc, item) for item in expr]
+    if isinstance(expr, dict):
+        if "$literal" in expr:
+            return copy.deepcopy(expr["$literal"])
+        if "$concatArrays" in expr:
+            return [item for part in expr["$concatArrays"] for item in (_evaluate(doc, part) or [])]
+        if "$slice" in expr:
+            array, n = expr["$slice"]
+            array = _evaluate(doc, array) or []
+            return array[:n] if n >= 0 else array[n:]
+        return {key: _evaluate(doc, value) for key, value in expr.items()}
+    return expr
+
+
+def apply_update(doc, update):
+    if isinstance(update, list):
+        # update pipeline (chỉ hỗ trợ stage $set)
+        for stage in update:
+            for op, fields in stage.items():
+                if op not in ("$set", "$addFields"):
+                    raise NotImplementedError(f"MemoryCollection không hỗ trợ stage {op}")
+                values = {path: _evaluate(doc, expr) for path, expr in fields.items()}
+                for path, value in values.items():
+                    _set_path(doc, path, value)
+        return
+    if not any(key.startswith("$") for key in update):
+        # replace-style update (giữ _id)
+        _id = doc["_id"]
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        doc["_id"] = _id
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if op == "$set":
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                current, found = _get_path(doc, path)
+                _set_path(doc, path, (current if found else 0) + value)
+            elif op == "$push":
+                current, found = _get_path(doc, path)
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                _set_path(doc, path, (current if found else []) + copy.deepcopy(items))
+            else:
+                raise NotImplementedError(f"MemoryCollection không hỗ trợ {op}")
+
+
+def _project(doc, projection):
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        result = {"_id": doc.get("_id")} if projection.get("_id", 1) else {}
+        for path in include:
+            value, found = _get_path(doc, path)
+            if found:
+                _set_path(result, path, value)
+        return result
+    for path, v in projection.items():
+        if not v:
+            _unset_path(doc, path)
+    return doc
+
+
+class MemoryCursor(list):
+    """Kết quả `find`: duyệt được như cursor, hỗ trợ sort/skip/limit."""
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field_name, field_direction in reversed(keys):
+            super().sort(key=lambda doc: (_get_path(doc, field_name)[0] is None, _get_path(doc, field_name)[0]),
+                         reverse=field_direction < 0)
+        return self
+
+    def skip(self, n):
+        return MemoryCursor(self[n:])
+
+    def limit(self, n):
+        return MemoryCursor(self[:n] if n else self)
+
+
+class MemoryCollection:
+    def __init__(self, name, latency_ms=0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self._docs = {}
+        self._lock = threading.RLock()
+        self.ops = 0
+
+    def _round_trip(self):
+        self.ops += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _iter(self, query):
+        _id = (query or {}).get("_id")
+        if _id is not None and not isinstance(_id, dict):
+            # Tra theo _id không cần quét cả collection
+            doc = self._docs.get(_id)
+            return [doc] if doc is not None and matches(doc, query) else []
+        return [doc for doc in self._docs.values() if matches(doc, query)]
+
+    # ---------- Đọc ----------
+    def find_one(self, query=None, projection=None, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            return _project(docs[0], projection) if docs else None
+
+    def find(self, query=None, projection=None, **kwargs):
+        self._round_trip()
+        with self._lock:
+            return MemoryCursor(_project(doc, projection) for doc in self._iter(query))
+
+    def count_documents(self, query, **kwargs):
+        self._round_trip()
+        with self._lock:
+            return len(self._iter(query))
+
+    # ---------- Ghi ----------
+    def insert_one(self, document, **kwargs):
+        self._round_trip()
+        with self._lock:
+            document.setdefault("_id", ObjectId())
+            self._docs[document["_id"]] = copy.deepcopy(document)
+            return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents, **kwargs):
+        self._round_trip()
+        with self._lock:
+            ids = []
+            for document in documents:
+                document.setdefault("_id", ObjectId())
+                self._docs[document["_id"]] = copy.deepcopy(document)
+                ids.append(document["_id"])
+            return SimpleNamespace(inserted_ids=ids, acknowledged=True)
+
+    def replace_one(self, query, replacement, upsert=False, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            if not docs:
+                if upsert:
+                    self.insert_one(dict(replacement))
+                return SimpleNamespace(matched_count=0, modified_count=0)
+            apply_update(docs[0], replacement)
+            return SimpleNamespace(matched_count=1, modified_count=1)
+
+    def update_one(self, query, update, upsert=False, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            if not docs:
+                if upsert:
+                    doc = {"_id": ObjectId(), **{k: v for k, v in query.items() if not k.startswith("$")}}
+                    apply_update(doc, update)
+                    self._docs[doc["_id"]] = doc
+                    return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+            apply_update(docs[0], update)
+            return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+
+    def update_many(self, query, update, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            for doc in docs:
+                apply_update(doc, update)
+            return SimpleNamespace(matched_count=len(docs), modified_count=len(docs))
+
+    def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=False, **kwargs):
+        """`return_document` truthy = trả document SAU khi cập nhật (như ReturnDocument.AFTER)."""
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            if not docs:
+                if not upsert:
+                    return None
+                doc = {"_id": ObjectId(), **{k: v for k, v in query.items() if not k.startswith("$")}}
+                apply_update(doc, update)
+                self._docs[doc["_id"]] = doc
+                return _project(doc, projection) if return_document else None
+            before = _project(docs[0], projection)
+            apply_update(docs[0], update)
+            return _project(docs[0], projection) if return_document else before
+
+    def delete_one(self, query, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            if docs:
+                del self._docs[docs[0]["_id"]]
+            return SimpleNamespace(deleted_count=len(docs[:1]))
+
+    def delete_many(self, query, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._iter(query)
+            for doc in docs:
+                del self._docs[doc["_id"]]
+            return SimpleNamespace(deleted_count=len(docs))
+
+    def create_index(self, *args, **kwargs):
+        return None
+
+
+class MemoryDatabase:
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name, self.latency_ms)
+        return self._collections[name]
+
+
+class MemoryMongoClient:
+    """Thay cho `pymongo.MongoClient`; `latency_ms` áp cho mọi collection tạo sau đó."""
+
+    latency_ms = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(MemoryMongoClient.latency_ms)
+        return self._databases[name]
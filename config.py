@@ -30,8 +30,58 @@ class Config:
     # AI Models
     LLM_MODEL = "gemini-2.5-flash"
     LLM_TEMPERATURE = 0.5
+
+    # Backend LLM: 'gemini' (thật), 'fake' (giả lập offline), 'record' (gemini + ghi prompt/response),
+    # 'replay' (phát lại file ghi, prompt chưa ghi → fake). Xem fake_llm.py
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+    LLM_RECORD_PATH = os.getenv('LLM_RECORD_PATH', os.path.join(BASE_DIR, 'llm_recordings.jsonl'))
+    FAKE_LLM_LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', 800))
+    FAKE_LLM_LATENCY_SIGMA = float(os.getenv('FAKE_LLM_LATENCY_SIGMA', 0.4))
+    FAKE_LLM_FAILURE_RATE = float(os.getenv('FAKE_LLM_FAILURE_RATE', 0))
+    FAKE_LLM_SEED = int(os.getenv('FAKE_LLM_SEED', 0))
     DEFAULT_EMBEDDING_MODEL = 'intfloat/multilingual-e5-large-instruct'
 
+    # Prompt prefix cache ('local' = stand-in offline, 'gemini' = cached content của Gemini)
+    PROMPT_CACHE_BACKEND = os.getenv('PROMPT_CACHE_BACKEND', 'local')
+    PROMPT_CACHE_TTL = 3600  # giây
+    PROMPT_CACHE_MIN_TOKENS = 1024  # Gemini không cache prefix ngắn hơn ngưỡng này
+
+    # Pool API key Gemini (quota mỗi key theo từng model, xem gemini_pool.py)
+    GEMINI_RPM_LIMIT = int(os.getenv('GEMINI_RPM_LIMIT', 10))  # Model không có trong GEMINI_MODEL_LIMITS
+    GEMINI_TPM_LIMIT = int(os.getenv('GEMINI_TPM_LIMIT', 250000))
+    GEMINI_MODEL_LIMITS = {
+        "gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250000},
+        "gemini-2.5-flash-preview-tts": {"rpm": 3, "tpm": 10000},
+    }
+    GEMINI_KEY_COOLDOWN = 30  # giây nghỉ sau khi key trả về 429
+    GEMINI_MAX_RETRIES = 3
+
+    # Hedged request: component -> tỉ lệ tối đa lượt gọi được gửi trùng khi chậm hơn p90 (mặc định tắt)
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', '0') == '1'
+    HEDGE_COMPONENTS = {"question": 0.1, "evaluate": 0.1}
+    HEDGE_MIN_SAMPLES = 20  # Chưa đủ mẫu để tính p90 thì không hedge
+
+    # Số worker chạy nhánh sinh câu hỏi suy đoán (InterviewConfig.speculative_generation), dùng chung mọi request
+    SPECULATIVE_WORKERS = int(os.getenv('SPECULATIVE_WORKERS', 8))
+
+    # Cache kết quả LLM trên đĩa (chỉ các component có prompt lặp lại, kết quả không cần ngẫu nhiên)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+    # Backend giả lập dùng file cache riêng để không lẫn với response thật
+    RESPONSE_CACHE_PATH = os.path.join(
+        BASE_DIR, 'llm_cache.db' if LLM_BACKEND in ('gemini', 'record') else f'llm_cache_{LLM_BACKEND}.db'
+    )
+    RESPONSE_CACHE_COMPONENTS = os.getenv('RESPONSE_CACHE_COMPONENTS', 'warmup,closing,knowledge_summary').split(',')
+    RESPONSE_CACHE_MAX_ENTRIES = 5000
+    RESPONSE_CACHE_TTL = 7 * 24 * 3600  # giây
+
+    # Giữ InterviewRecord đang phỏng vấn trong bộ nhớ giữa các lượt /answer (xem record_cache.py)
+    RECORD_CACHE_ENABLED = os.getenv('RECORD_CACHE_ENABLED', '1') == '1'
+    RECORD_CACHE_MAX_ENTRIES = 5000
+    RECORD_CACHE_IDLE_TTL = 30 * 60  # giây không có lượt trả lời mới → bỏ khỏi cache
+
+    # Request /answer trùng idempotency key đợi request đầu tối đa bao lâu (chấm điểm + TTS)
+    ANSWER_IDEMPOTENCY_WAIT = 180  # giây
+
     # Session  # ← THÊM
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
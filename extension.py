@@ -1,8 +1,11 @@
 from typing import Optional, List
+from datetime import datetime
 
+from bson import ObjectId
 from pymongo import MongoClient
 
-from extensions import embedding_manager
+from extensions import embedding_manager, db_batches, db_question_bank, context_cache, response_cache, gemini_pool
+from llm_usage import MeteredLLM, current_batch_id
 
 
 def summarize_knowledge_with_llm(knowledge_text: str, topic: str, outline: list[str], llm):
@@ -27,10 +30,50 @@ def summarize_knowledge_with_llm(knowledge_text: str, topic: str, outline: list[
     HÃY TRẢ VỀ Bản tóm tắt 
     """
 
-    result = llm.invoke(prompt)
+    # Tạo lại batch với cùng tài liệu → cùng prompt → lấy từ cache (xem response_cache.py)
+    result = response_cache.wrap(MeteredLLM(llm, "knowledge_summary"), "knowledge_summary").invoke(prompt)
     return result
 
 
+
+def pregenerate_question_bank(batch_id: str, topic: str, knowledge_text: str, outline_summary: str,
+                              config: dict, llm):
+    """
+    Sinh trước ngân hàng câu hỏi (độc lập với thí sinh) cho từng độ khó của batch.
+    Chạy nền sau khi tạo batch; lúc phỏng vấn chỉ cần bốc câu hỏi + cá nhân hóa nhẹ.
+    """
+    from LLMInterviewer4 import QuestionGenerator, QuestionDifficulty
+
+    current_batch_id.set(batch_id)
+    generator = QuestionGenerator(MeteredLLM(llm, "question_bank"))
+    count = int(config.get("question_bank_size", 8))
+    db_batches.update_one({"_id": ObjectId(batch_id)}, {"$set": {"question_bank_status": "building"}})
+
+    total = 0
+    for difficulty in QuestionDifficulty:
+        try:
+            pool = generator.generate_question_pool(topic, difficulty, knowledge_text, outline_summary, count)
+        except Exception as e:
+            print(f"⚠️ Lỗi sinh ngân hàng câu hỏi {difficulty.value}: {e}")
+            continue
+        if not pool:
+            continue
+        created_at = datetime.utcnow().isoformat()
+        db_question_bank.insert_many([
+            {**item, "batch_id": batch_id, "created_at": created_at} for item in pool
+        ])
+        total += len(pool)
+
+    db_batches.update_one(
+        {"_id": ObjectId(batch_id)},
+        {"$set": {"question_bank_status": "ready" if total else "failed", "question_bank_count": total}}
+    )
+    # Context đã cache (nếu có) chưa chứa ngân hàng → buộc load lại
+    context_cache.pop(batch_id, None)
+    print(f"🏦 Ngân hàng câu hỏi batch {batch_id}: {total} câu")
+    return total
+
+
 import os
 import pandas as pd
 from datetime import datetime
@@ -203,16 +246,15 @@ def generate_voice_Gemini_simple(text, output_path="gemini.mp3", voice="alnilam"
     Convert audio raw L16 → WAV → MP3.
     """
 
-    api_key = loadapi()
-    if not api_key:
+    if gemini_pool is None:
         print("❌ Không tìm thấy API Key Gemini.")
         return None
 
     try:
-        client = genai.Client(api_key=api_key)
         model = "gemini-2.5-flash-preview-tts"
 
-        res = client.models.generate_content(
+        # Gọi qua pool key, tính vào quota riêng của model TTS: key bị 429 được cho nghỉ và thử lại trên key khác
+        res = gemini_pool.run(lambda api_key: gemini_pool.genai_client(api_key).models.generate_content(
             model=model,
             contents=text,
             config=types.GenerateContentConfig(
@@ -225,7 +267,7 @@ def generate_voice_Gemini_simple(text, output_path="gemini.mp3", voice="alnilam"
                     )
                 ),
             ),
-        )
+        ), tokens=len(text) // 4, model=model)
 
         # Lấy bytes raw PCM
         audio_bytes = res.candidates[0].content.parts[0].inline_data.data
@@ -7,8 +7,10 @@ Load một lần duy nhất khi ứng dụng khởi động
 from pymongo import MongoClient
 from langchain_google_genai import GoogleGenerativeAI
 from langchain_huggingface import HuggingFaceEmbeddings
-from GetApikey import loadapi
+from GetApikey import load_api_keys
 from config import Config
+from gemini_pool import GeminiClientPool, PooledLLM
+from fake_llm import FakeLLM, RecordingLLM, ReplayLLM
 
 # ===================================================================
 # MongoDB Connection
@@ -21,15 +23,51 @@ db_batches = db["interview_batches"]
 db_records = db["interview_records"]
 # db_results = db["interview_results"]
 db_vectorstores = db["vectorstores"]
+db_question_bank = db["question_bank"]
+db_llm_usage = db["llm_usage"]  # Log token / thời gian của từng lần gọi LLM
 
 # ===================================================================
 # LLM Service (Google Gemini)
 # ===================================================================
-llm_service = GoogleGenerativeAI(
-    model=Config.LLM_MODEL,
-    temperature=Config.LLM_TEMPERATURE,
-    google_api_key=loadapi()
-)
+# Chia lượt gọi cho mọi key GOOGLE_API_KEY* theo quota RPM/TPM, key bị 429 tạm nghỉ
+# (None nếu chưa cấu hình key, vd. chạy offline với LLM_BACKEND=fake)
+_api_keys = load_api_keys()
+gemini_pool = GeminiClientPool(
+    _api_keys,
+    rpm_limit=Config.GEMINI_RPM_LIMIT,
+    tpm_limit=Config.GEMINI_TPM_LIMIT,
+    cooldown_seconds=Config.GEMINI_KEY_COOLDOWN,
+    max_retries=Config.GEMINI_MAX_RETRIES,
+    default_model=Config.LLM_MODEL,
+    model_limits=Config.GEMINI_MODEL_LIMITS
+) if _api_keys else None
+
+
+def create_llm(model: str):
+    """LLM cho một model theo Config.LLM_BACKEND (gemini | fake | record | replay)."""
+    if Config.LLM_BACKEND in ("fake", "replay"):
+        fake = FakeLLM(
+            latency_ms=Config.FAKE_LLM_LATENCY_MS,
+            latency_sigma=Config.FAKE_LLM_LATENCY_SIGMA,
+            failure_rate=Config.FAKE_LLM_FAILURE_RATE,
+            seed=Config.FAKE_LLM_SEED
+        )
+        return ReplayLLM(Config.LLM_RECORD_PATH, model, fallback=fake) if Config.LLM_BACKEND == "replay" else fake
+
+    llm = PooledLLM(
+        gemini_pool,
+        lambda api_key: GoogleGenerativeAI(
+            model=model,
+            temperature=Config.LLM_TEMPERATURE,
+            google_api_key=api_key
+        ),
+        model=model
+    )
+    return RecordingLLM(llm, Config.LLM_RECORD_PATH, model) if Config.LLM_BACKEND == "record" else llm
+
+
+llm_service = create_llm(Config.LLM_MODEL)
+print(f"🤖 LLM backend: {Config.LLM_BACKEND} ({Config.LLM_MODEL})")
 
 
 # ===================================================================
@@ -87,9 +125,73 @@ def migrate_batches_add_user_id():
 # ===================================================================
 # Interview Processor
 # ===================================================================
-from LLMInterviewer4 import InterviewProcessor
+from LLMInterviewer4 import InterviewProcessor, AsyncInterviewProcessor
+from prompt_cache import PrefixCachedLLM, LocalPrefixCacheBackend, GeminiPrefixCacheBackend
+from llm_usage import usage_recorder
+from response_cache import ResponseCache
+from hedging import HedgePolicy
+from model_router import ModelRouter
+from record_cache import RecordCache
+from idempotency import InflightRequests
+
+# Ghi log token / thời gian của mọi lần gọi LLM vào MongoDB (thread nền)
+usage_recorder.set_collection(db_llm_usage)
+
+# Prefix tĩnh của batch được cache phía provider (chỉ với batch bật `prompt_prefix_cache`)
+if Config.PROMPT_CACHE_BACKEND == "gemini" and Config.LLM_BACKEND in ("gemini", "record") and gemini_pool:
+    prefix_cache_backend = GeminiPrefixCacheBackend(gemini_pool, Config.LLM_MODEL, Config.LLM_TEMPERATURE)
+else:
+    prefix_cache_backend = LocalPrefixCacheBackend(llm_service)
+
+prefix_cached_llm = PrefixCachedLLM(
+    llm_service,
+    prefix_cache_backend,
+    ttl_seconds=Config.PROMPT_CACHE_TTL,
+    min_prefix_tokens=Config.PROMPT_CACHE_MIN_TOKENS
+)
+
+# Cache kết quả LLM (SQLite) cho các component bật trong Config.RESPONSE_CACHE_COMPONENTS
+response_cache = ResponseCache(
+    Config.RESPONSE_CACHE_PATH,
+    model=Config.LLM_MODEL,
+    temperature=Config.LLM_TEMPERATURE,
+    components=Config.RESPONSE_CACHE_COMPONENTS,
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.RESPONSE_CACHE_TTL,
+    enabled=Config.RESPONSE_CACHE_ENABLED
+)
+
+# Model riêng theo component của batch (vd. model nhẹ cho warmup/closing): cùng pool key, quota riêng theo model
+model_router = ModelRouter(prefix_cached_llm, Config.LLM_MODEL, create_llm)
+
+# Gửi trùng request question/evaluate bị chậm hơn p90 (xem hedging.py)
+hedge_policy = HedgePolicy(
+    Config.HEDGE_COMPONENTS if Config.HEDGE_ENABLED else {},
+    min_samples=Config.HEDGE_MIN_SAMPLES
+)
+
+interview_processor = InterviewProcessor(
+    llm=prefix_cached_llm, response_cache=response_cache, hedge_policy=hedge_policy, model_router=model_router,
+    speculative_workers=Config.SPECULATIVE_WORKERS
+)
+
+# Bản async (dùng `ainvoke`) cho các route chạy dưới ASGI server (xem asgi.py)
+async_interview_processor = AsyncInterviewProcessor(
+    llm=prefix_cached_llm, response_cache=response_cache, hedge_policy=hedge_policy, model_router=model_router,
+    speculative_workers=Config.SPECULATIVE_WORKERS
+)
+
+# ===================================================================
+# Record Cache (InterviewRecord đang phỏng vấn, xem record_cache.py)
+# ===================================================================
+record_cache = RecordCache(
+    max_entries=Config.RECORD_CACHE_MAX_ENTRIES,
+    idle_ttl_seconds=Config.RECORD_CACHE_IDLE_TTL,
+    enabled=Config.RECORD_CACHE_ENABLED
+)
 
-interview_processor = InterviewProcessor(llm=llm_service)
+# Request /answer trùng idempotency key đang chạy (xem idempotency.py)
+answer_inflight = InflightRequests(wait_timeout=Config.ANSWER_IDEMPOTENCY_WAIT)
 
 # ===================================================================
 # Audio Cache
@@ -0,0 +1,225 @@
+# fake_llm.py
+"""
+LLM giả lập (không tốn quota Gemini) + ghi/phát lại cặp prompt/response thật.
+
+- FakeLLM: nhận diện loại prompt (sinh câu hỏi, chấm điểm, gộp chấm điểm + hỏi, ngân hàng
+  câu hỏi, lời kết, ...) và trả về JSON/text đúng định dạng mà các component parse.
+  Kết quả chỉ phụ thuộc vào (seed, prompt) → chạy lại cho cùng kết quả. Độ trễ (phân phối
+  log-normal) và tỉ lệ lỗi cấu hình được.
+- RecordingLLM: bọc LLM thật, ghi từng cặp prompt/response vào file JSONL.
+- ReplayLLM: phát lại từ file JSONL; prompt chưa ghi → fallback (vd. FakeLLM) hoặc lỗi.
+
+Chọn backend bằng biến môi trường `LLM_BACKEND` (gemini | fake | record | replay), xem extensions.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+from response_cache import normalize_prompt
+
+
+class FakeLLMError(Exception):
+    """Lỗi giả lập (message chứa 429 khi mô phỏng hết quota)."""
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}|{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class FakeLLM:
+    """LLM giả lập có cùng interface `invoke`/`ainvoke`/`stream` với GoogleGenerativeAI."""
+
+    def __init__(self, latency_ms: float = 800.0, latency_sigma: float = 0.4,
+                 failure_rate: float = 0.0, rate_limit_share: float = 0.5,
+                 seed: int = 0, chunk_size: int = 24):
+        self.latency_ms = latency_ms  # trung vị độ trễ
+        self.latency_sigma = latency_sigma  # độ lệch của log-normal (0 = cố định)
+        self.failure_rate = failure_rate
+        self.rate_limit_share = rate_limit_share  # tỉ lệ lỗi là 429 (còn lại là lỗi 500)
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    # ---------- Độ trễ / lỗi ----------
+    def _draw(self):
+        """(độ trễ giây, lỗi hay không) cho một lượt gọi."""
+        with self._lock:
+            self.calls += 1
+            latency = self.latency_ms * self._rng.lognormvariate(0, self.latency_sigma) if self.latency_sigma \
+                else self.latency_ms
+            failure = self._rng.random() < self.failure_rate
+            rate_limited = self._rng.random() < self.rate_limit_share
+        return latency / 1000, (FakeLLMError("429 RESOURCE_EXHAUSTED (fake)" if rate_limited
+                                             else "500 INTERNAL (fake)") if failure else None)
+
+    def invoke(self, prompt: str) -> str:
+        delay, error = self._draw()
+        time.sleep(delay)
+        if error:
+            raise error
+        return self.respond(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        delay, error = self._draw()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self.respond(prompt)
+
+    def stream(self, prompt: str):
+        delay, error = self._draw()
+        # Chunk đầu tiên tới sau ~1/3 độ trễ, phần còn lại rải đều
+        time.sleep(delay / 3)
+        if error:
+            raise error
+        text = self.respond(prompt)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        for chunk in chunks:
+            yield chunk
+            time.sleep(delay * 2 / 3 / len(chunks))
+
+    # ---------- Sinh nội dung theo loại prompt ----------
+    def respond(self, prompt: str) -> str:
+        rng = random.Random(f"{self.seed}|{prompt_key('', prompt)}")
+
+        if '"next_difficulty"' in prompt:
+            return json.dumps(self._evaluate_and_ask(prompt, rng), ensure_ascii=False)
+        if '"questions"' in prompt:
+            match = re.search(r"Soạn (\d+) câu hỏi", prompt)
+            count = int(match.group(1)) if match else 5
+            return json.dumps({"questions": [
+                {"question": f"[fake] Câu hỏi ngân hàng số {i + 1} ({rng.randint(1000, 9999)})?",
+                 "time_limit": rng.choice([120, 180, 240])}
+                for i in range(count)
+            ]}, ensure_ascii=False)
+        if '"score"' in prompt:
+            return json.dumps(self._evaluation(rng), ensure_ascii=False)
+        if '"question"' in prompt:
+            match = re.search(r'"difficulty":\s*"(\w+)"', prompt)
+            result = {"question": f"[fake] Bạn hãy trình bày hiểu biết của mình về chủ đề này? ({rng.randint(1000, 9999)})"}
+            if match:
+                result["difficulty"] = match.group(1)
+                result["time_limit"] = rng.choice([90, 120, 180, 240])
+            return json.dumps(result, ensure_ascii=False)
+        if "lời kết" in prompt.lower():
+            return "[fake] Cảm ơn bạn đã tham gia buổi phỏng vấn hôm nay. Chúc bạn nhiều thành công!"
+        return "[fake] Tóm tắt: tài liệu bao phủ các mục chính của outline, một số mục còn sơ lược."
+
+    @staticmethod
+    def _evaluation(rng: random.Random) -> dict:
+        score = round(rng.uniform(2.0, 9.5), 1)
+        return {"score": score, "analysis": f"[fake] Câu trả lời đạt {score}/10, cần bổ sung ví dụ cụ thể."}
+
+    def _evaluate_and_ask(self, prompt: str, rng: random.Random) -> dict:
+        result = self._evaluation(rng)
+        high = re.search(r"score >= ([\d.]+)", prompt)
+        low = re.search(r"([\d.]+) <= score", prompt)
+        # Độ khó của 3 nhánh theo thứ tự harder / same / easier ("none" = kết thúc)
+        branches = re.findall(r'độ khó "(\w+)"', prompt)
+        if len(branches) == 3:
+            if high and result["score"] >= float(high.group(1)):
+                choice = branches[0]
+            elif low and result["score"] >= float(low.group(1)):
+                choice = branches[1]
+            else:
+                choice = branches[2]
+        else:
+            choice = "none"
+        result["next_difficulty"] = choice
+        result["question"] = "" if choice == "none" else \
+            f"[fake] Câu hỏi tiếp theo độ khó {choice} ({rng.randint(1000, 9999)})?"
+        result["time_limit"] = rng.choice([120, 180, 240])
+        return result
+
+
+class RecordingLLM:
+    """Bọc LLM thật, ghi cặp prompt/response (JSONL) để phát lại offline bằng `ReplayLLM`."""
+
+    def __init__(self, llm, path: str, model: str = ""):
+        self.llm = llm
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _write(self, prompt: str, response):
+        if not isinstance(response, str):
+            return
+        line = json.dumps({
+            "key": prompt_key(self.model, prompt),
+            "model": self.model,
+            "prompt": prompt,
+            "response": response
+        }, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def invoke(self, prompt: str):
+        result = self.llm.invoke(prompt)
+        self._write(prompt, result)
+        return result
+
+    async def ainvoke(self, prompt: str):
+        result = await self.llm.ainvoke(prompt)
+        await asyncio.to_thread(self._write, prompt, result)
+        return result
+
+    def stream(self, prompt: str):
+        chunks = []
+        for chunk in self.llm.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._write(prompt, "".join(chunks))
+
+
+class ReplayLLM:
+    """Phát lại response đã ghi theo (model, prompt); prompt chưa ghi → `fallback` hoặc KeyError."""
+
+    def __init__(self, path: str, model: str = "", fallback=None):
+        self.model = model
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._responses = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry["response"]
+        print(f"📼 ReplayLLM ({model or 'default'}): {len(self._responses)} response từ {path}")
+
+    def _lookup(self, prompt: str) -> Optional[str]:
+        response = self._responses.get(prompt_key(self.model, prompt))
+        if response is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if self.fallback is None:
+                raise KeyError(f"ReplayLLM: chưa ghi prompt {prompt_key(self.model, prompt)[:12]}")
+        return response
+
+    def invoke(self, prompt: str):
+        response = self._lookup(prompt)
+        return response if response is not None else self.fallback.invoke(prompt)
+
+    async def ainvoke(self, prompt: str):
+        response = self._lookup(prompt)
+        return response if response is not None else await self.fallback.ainvoke(prompt)
+
+    def stream(self, prompt: str):
+        response = self._lookup(prompt)
+        if response is None:
+            yield from self.fallback.stream(prompt)
+        else:
+            yield response
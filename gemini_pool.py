@@ -0,0 +1,325 @@
+# gemini_pool.py
+"""
+Pool API key Gemini: chia lượt gọi cho mọi key `GOOGLE_API_KEY*` thay vì một key cố định.
+
+Quota Gemini tính theo (key, model): mỗi cặp có cửa sổ trượt 60s đếm request (RPM) và token
+(TPM), giới hạn theo model (`model_limits`, mặc định `rpm_limit`/`tpm_limit`). Mỗi lượt gọi
+chọn key còn dư quota của model đó nhiều nhất; (key, model) trả về 429 bị cho nghỉ (cooldown)
+và lượt gọi được thử ngay trên key khác. Hết key dùng được → `RateLimitedError` kèm
+`retry_after`, không ngủ chờ trên thread của request.
+
+- `GeminiClientPool.run(fn, tokens, model)` / `arun(...)` / `run_stream(...)`: gọi `fn(key)` qua pool
+  (TTS, cached content google-genai).
+- `PooledLLM`: interface `invoke`/`ainvoke`/`stream` như LLM LangChain cho một model, mỗi key một instance.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from llm_usage import estimate_tokens
+
+WINDOW_SECONDS = 60.0
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429 / RESOURCE_EXHAUSTED từ google-genai, google-api-core hoặc LangChain."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}"
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "ResourceExhausted" in text
+
+
+class RateLimitedError(Exception):
+    """
+    Không còn key nào gọi được model: mọi key đều hết quota / đang nghỉ sau 429.
+    `retry_after`: số giây nữa có key dùng lại được (route trả 503 + Retry-After).
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaWindow:
+    """Quota của một (key, model): lượt gọi/token trong 60s gần nhất, thời điểm hết cooldown."""
+
+    def __init__(self):
+        self.requests = deque()  # timestamps
+        self.tokens = deque()  # (timestamp, tokens)
+        self.token_sum = 0
+        self.cooldown_until = 0.0
+
+    def prune(self, now: float):
+        while self.requests and now - self.requests[0] > WINDOW_SECONDS:
+            self.requests.popleft()
+        while self.tokens and now - self.tokens[0][0] > WINDOW_SECONDS:
+            self.token_sum -= self.tokens.popleft()[1]
+
+    def load(self, rpm_limit: int, tpm_limit: int) -> float:
+        """Tỉ lệ quota đã dùng (lấy max của RPM và TPM)."""
+        return max(len(self.requests) / rpm_limit, self.token_sum / tpm_limit)
+
+
+class KeyState:
+    """
+    Trạng thái một key. Quota Gemini tính theo từng model nên cửa sổ RPM/TPM và cooldown 429
+    tách theo model (`windows`): TTS / flash-lite không ăn vào quota của model chính.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.windows: Dict[str, QuotaWindow] = {}
+        self.calls = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    @property
+    def label(self) -> str:
+        return f"...{self.key[-4:]}"
+
+    def window(self, model: str) -> QuotaWindow:
+        window = self.windows.get(model)
+        if window is None:
+            window = self.windows[model] = QuotaWindow()
+        return window
+
+
+class Lease:
+    """Một lượt gọi đã giữ quota: key + cửa sổ của model được dùng."""
+
+    __slots__ = ("state", "model", "window")
+
+    def __init__(self, state: KeyState, model: str, window: QuotaWindow):
+        self.state = state
+        self.model = model
+        self.window = window
+
+    @property
+    def key(self) -> str:
+        return self.state.key
+
+
+class GeminiClientPool:
+    """
+    Chọn key cho từng lượt gọi theo quota còn lại của model; thread-safe, dùng được cả từ async.
+    Hết quota thì báo lỗi ngay (`RateLimitedError.retry_after`), không ngủ chờ trên thread request.
+    """
+
+    def __init__(self, keys: List[str], rpm_limit: int = 10, tpm_limit: int = 250_000,
+                 cooldown_seconds: float = 30.0, max_retries: int = 3,
+                 default_model: str = "default", model_limits: Optional[Dict[str, Dict[str, int]]] = None):
+        if not keys:
+            raise ValueError("GeminiClientPool cần ít nhất một API key")
+        self.states = [KeyState(key) for key in keys]
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.cooldown_seconds = cooldown_seconds
+        self.max_retries = max_retries
+        self.default_model = default_model
+        self.model_limits = dict(model_limits or {})  # model -> {"rpm": ..., "tpm": ...}
+        self._lock = threading.Lock()
+        self._clients: Dict[str, object] = {}
+
+    def limits(self, model: str):
+        """(rpm, tpm) của model; model không khai báo dùng giới hạn mặc định."""
+        limits = self.model_limits.get(model) or {}
+        return limits.get("rpm", self.rpm_limit), limits.get("tpm", self.tpm_limit)
+
+    # ---------- Chọn key ----------
+    def _try_acquire(self, tokens: int, exclude: set, model: str):
+        """(lease, 0) nếu có key dùng được cho model; (None, số giây nên chờ) nếu tất cả đang hết quota/cooldown."""
+        rpm_limit, tpm_limit = self.limits(model)
+        now = time.time()
+        with self._lock:
+            candidates = [s for s in self.states if s.key not in exclude] or self.states
+            best, best_window, best_load, wait = None, None, None, None
+            for state in candidates:
+                window = state.window(model)
+                window.prune(now)
+                if window.cooldown_until > now:
+                    ready_in = window.cooldown_until - now
+                elif len(window.requests) >= rpm_limit:
+                    ready_in = WINDOW_SECONDS - (now - window.requests[0])
+                elif window.token_sum + tokens > tpm_limit and window.tokens:
+                    ready_in = WINDOW_SECONDS - (now - window.tokens[0][0])
+                else:
+                    load = window.load(rpm_limit, tpm_limit)
+                    if best is None or load < best_load:
+                        best, best_window, best_load = state, window, load
+                    continue
+                wait = ready_in if wait is None else min(wait, ready_in)
+
+            if best is None:
+                return None, max(wait or 0.0, 0.05)
+
+            best_window.requests.append(now)
+            best_window.tokens.append((now, tokens))
+            best_window.token_sum += tokens
+            best.calls += 1
+            return Lease(best, model, best_window), 0.0
+
+    def acquire(self, tokens: int = 0, exclude: Optional[set] = None, model: Optional[str] = None) -> Lease:
+        """Giữ quota của model trên key còn dư nhiều nhất; mọi key đều hết → RateLimitedError (không chờ)."""
+        model = model or self.default_model
+        lease, wait = self._try_acquire(tokens, exclude or set(), model)
+        if lease is None:
+            raise RateLimitedError(
+                f"Mọi API key đều hết quota model {model}, thử lại sau {wait:.0f}s", retry_after=wait
+            )
+        return lease
+
+    # ---------- Ghi nhận kết quả ----------
+    def add_tokens(self, lease: Lease, tokens: int):
+        """Cộng thêm token output sau khi gọi xong (TPM tính cả input lẫn output)."""
+        if tokens <= 0:
+            return
+        with self._lock:
+            lease.window.tokens.append((time.time(), tokens))
+            lease.window.token_sum += tokens
+
+    def mark_rate_limited(self, lease: Lease):
+        with self._lock:
+            lease.state.rate_limited += 1
+            lease.window.cooldown_until = time.time() + self.cooldown_seconds
+        print(f"⚠️ Key {lease.state.label} bị 429 ({lease.model}), tạm nghỉ {self.cooldown_seconds:.0f}s")
+
+    def mark_error(self, lease: Lease):
+        with self._lock:
+            lease.state.errors += 1
+
+    # ---------- Gọi qua pool ----------
+    def run(self, fn: Callable[[str], object], tokens: int = 0, model: Optional[str] = None):
+        """
+        Gọi `fn(key)` cho `model`; gặp 429 thì cho (key, model) nghỉ và thử ngay trên key khác.
+        Kết quả str được tính vào TPM.
+        """
+        tried = set()
+        for _ in range(self.max_retries + 1):
+            lease = self.acquire(tokens, tried, model)
+            try:
+                result = fn(lease.key)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self.mark_error(lease)
+                    raise
+                self.mark_rate_limited(lease)
+                tried.add(lease.key)
+                continue
+            if isinstance(result, str):
+                self.add_tokens(lease, estimate_tokens(result))
+            return result
+        raise self._exhausted(model)
+
+    async def arun(self, fn, tokens: int = 0, model: Optional[str] = None):
+        """Bản async của `run`, `fn(key)` trả về awaitable."""
+        tried = set()
+        for _ in range(self.max_retries + 1):
+            lease = self.acquire(tokens, tried, model)
+            try:
+                result = await fn(lease.key)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self.mark_error(lease)
+                    raise
+                self.mark_rate_limited(lease)
+                tried.add(lease.key)
+                continue
+            if isinstance(result, str):
+                self.add_tokens(lease, estimate_tokens(result))
+            return result
+        raise self._exhausted(model)
+
+    def run_stream(self, fn: Callable[[str], Iterable[str]], tokens: int = 0, model: Optional[str] = None):
+        """
+        Bản stream của `run`, `fn(key)` trả về iterator chunk str. Chỉ thử lại key khác khi 429
+        xảy ra trước chunk đầu tiên (chưa gửi gì cho client).
+        """
+        tried = set()
+        for _ in range(self.max_retries + 1):
+            lease = self.acquire(tokens, tried, model)
+            started = False
+            output = 0
+            try:
+                for chunk in fn(lease.key):
+                    started = True
+                    output += estimate_tokens(chunk)
+                    yield chunk
+                self.add_tokens(lease, output)
+                return
+            except Exception as e:
+                if started or not is_rate_limit_error(e):
+                    self.mark_error(lease)
+                    raise
+                self.mark_rate_limited(lease)
+                tried.add(lease.key)
+        raise self._exhausted(model)
+
+    def _exhausted(self, model: Optional[str]) -> RateLimitedError:
+        """Lỗi sau khi mọi lần thử đều 429; `retry_after` = lúc sớm nhất có (key, model) hết cooldown."""
+        now = time.time()
+        model = model or self.default_model
+        with self._lock:
+            wait = min(state.window(model).cooldown_until for state in self.states) - now
+        return RateLimitedError(
+            f"Tất cả API key đều bị giới hạn sau {self.max_retries + 1} lần thử", retry_after=max(wait, 0.05)
+        )
+
+    def genai_client(self, key: str):
+        """`google.genai.Client` dùng lại theo key (cho TTS, cached content, ...)."""
+        with self._lock:
+            client = self._clients.get(key)
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=key)
+            with self._lock:
+                self._clients[key] = client
+        return client
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            keys = []
+            for state in self.states:
+                models = {}
+                for model, window in state.windows.items():
+                    window.prune(now)
+                    models[model] = {
+                        "rpm": len(window.requests),
+                        "tpm": window.token_sum,
+                        "cooldown_seconds": round(max(window.cooldown_until - now, 0.0), 1)
+                    }
+                keys.append({
+                    "key": state.label,
+                    "calls": state.calls,
+                    "rate_limited": state.rate_limited,
+                    "errors": state.errors,
+                    "models": models
+                })
+            limits = {model: dict(zip(("rpm", "tpm"), self.limits(model)))
+                      for model in {self.default_model, *self.model_limits}}
+            return {"limits": limits, "keys": keys}
+
+
+class PooledLLM:
+    """LLM (interface `invoke`/`ainvoke`/`stream`) của một model, chia lượt gọi qua `GeminiClientPool`."""
+
+    def __init__(self, pool: GeminiClientPool, factory: Callable[[str], object], model: Optional[str] = None):
+        self.pool = pool
+        self.model = model or pool.default_model
+        # Mỗi key một instance LLM (LangChain gắn key lúc khởi tạo)
+        self._llms = {state.key: factory(state.key) for state in pool.states}
+
+    def invoke(self, prompt: str):
+        def call(key):
+            return self._llms[key].invoke(prompt)
+        return self.pool.run(call, estimate_tokens(prompt), self.model)
+
+    async def ainvoke(self, prompt: str):
+        async def call(key):
+            return await self._llms[key].ainvoke(prompt)
+        return await self.pool.arun(call, estimate_tokens(prompt), self.model)
+
+    def stream(self, prompt: str):
+        yield from self.pool.run_stream(lambda key: self._llms[key].stream(prompt), estimate_tokens(prompt), self.model)
@@ -0,0 +1,201 @@
+# hedging.py
+"""
+Hedged request cho các lượt gọi LLM nhạy độ trễ (question, evaluate trong /interview/answer).
+
+Mỗi component có một `LatencyTracker` (cửa sổ trượt các lần gọi gần nhất). Nếu lượt gọi
+chưa xong sau p90 của component đó → gửi thêm một request trùng lặp và lấy kết quả về
+trước. Request trùng đi qua cùng `llm_service` (PooledLLM), vốn chọn key ít tải nhất nên
+thường rơi vào key khác với request gốc (key gốc vừa được tính thêm một lượt).
+
+Số request hedge của mỗi component bị chặn theo tỉ lệ (`max_ratio` trên tổng số lượt gọi),
+để hedge không nhân đôi quota khi cả hệ thống cùng chậm.
+
+Request gốc KHÔNG đi qua thread pool dùng chung: lượt gọi chưa có p90 chạy ngay trên thread
+của caller, lượt gọi có thể hedge thì chạy trên thread riêng của chính lượt đó (caller chỉ đợi
+kết quả). Pool `max_workers` chỉ chở request hedge; pool hết worker rảnh → bỏ hedge, không xếp
+hàng (request xếp hàng trông "chậm" và lại kích hoạt thêm hedge).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict
+
+
+class LatencyTracker:
+    """Độ trễ (ms) của N lần gọi gần nhất; p90 chỉ có khi đủ `min_samples` mẫu."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+
+    def percentile(self, q: float):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class HedgePolicy:
+    """Cấu hình + trạng thái hedge dùng chung: tracker, hạn mức và thống kê theo component."""
+
+    def __init__(self, components: Dict[str, float], quantile: float = 0.9,
+                 window: int = 200, min_samples: int = 20, max_workers: int = 16):
+        self.components = dict(components)  # component -> tỉ lệ tối đa request được hedge
+        self.quantile = quantile
+        self.trackers = {name: LatencyTracker(window, min_samples) for name in components}
+        self._lock = threading.Lock()
+        self._stats = {name: {"calls": 0, "hedged": 0, "hedge_wins": 0, "capped": 0, "no_worker": 0}
+                       for name in components}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._free_workers = threading.BoundedSemaphore(max_workers)
+
+    def wrap(self, llm, component: str):
+        """Bọc LLM của component; component không bật hedge → trả lại chính LLM đó."""
+        return HedgedLLM(llm, self, component) if component in self.components else llm
+
+    def hedge_delay(self, component: str):
+        """Số giây chờ trước khi hedge (p90), None nếu chưa đủ mẫu."""
+        latency_ms = self.trackers[component].percentile(self.quantile)
+        return latency_ms / 1000 if latency_ms is not None else None
+
+    def count_call(self, component: str):
+        with self._lock:
+            self._stats[component]["calls"] += 1
+
+    def try_hedge(self, component: str) -> bool:
+        """Giữ một suất hedge nếu component chưa vượt hạn mức."""
+        with self._lock:
+            stats = self._stats[component]
+            if stats["hedged"] + 1 > self.components[component] * stats["calls"]:
+                stats["capped"] += 1
+                return False
+            stats["hedged"] += 1
+            return True
+
+    def submit_hedge(self, component: str, fn, *args):
+        """Gửi request hedge vào pool nếu còn worker rảnh; None nếu pool đang bận hết."""
+        if not self._free_workers.acquire(blocking=False):
+            with self._lock:
+                self._stats[component]["no_worker"] += 1
+            return None
+        if not self.try_hedge(component):
+            self._free_workers.release()
+            return None
+        future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(lambda _: self._free_workers.release())
+        return future
+
+    def record_winner(self, component: str, hedge_won: bool):
+        if hedge_won:
+            with self._lock:
+                self._stats[component]["hedge_wins"] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                p90 = self.trackers[name].percentile(self.quantile)
+                result[name] = {
+                    **stats,
+                    "max_ratio": self.components[name],
+                    "p90_ms": round(p90, 1) if p90 is not None else None
+                }
+            return result
+
+
+class HedgedLLM:
+    """LLM (interface `invoke`/`ainvoke`/`stream`) có hedge; `stream` không hedge (đã gửi chunk cho client)."""
+
+    def __init__(self, llm, policy: HedgePolicy, component: str):
+        self.llm = llm
+        self.policy = policy
+        self.component = component
+        self.tracker = policy.trackers[component]
+
+    def _timed_invoke(self, prompt: str):
+        started = time.perf_counter()
+        result = self.llm.invoke(prompt)
+        self.tracker.add((time.perf_counter() - started) * 1000)
+        return result
+
+    def _invoke_into(self, future: Future, prompt: str):
+        try:
+            future.set_result(self._timed_invoke(prompt))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    def invoke(self, prompt: str):
+        self.policy.count_call(self.component)
+        delay = self.policy.hedge_delay(self.component)
+        if delay is None:
+            return self._timed_invoke(prompt)
+
+        # Request gốc chạy trên thread riêng (bản sao context giữ current_batch_id cho log usage),
+        # không chiếm worker của pool hedge; caller đợi request nào xong trước
+        primary = Future()
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(self._invoke_into, primary, prompt),
+            name=f"llm-{self.component}", daemon=True
+        ).start()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = self.policy.submit_hedge(self.component, self._timed_invoke, prompt)
+        if hedge is None:
+            return primary.result()
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.policy.record_winner(self.component, future is hedge)
+                    return future.result()
+        # Cả hai đều lỗi → báo lỗi của request gốc
+        return primary.result()
+
+    async def _timed_ainvoke(self, prompt: str):
+        started = time.perf_counter()
+        result = await self.llm.ainvoke(prompt)
+        self.tracker.add((time.perf_counter() - started) * 1000)
+        return result
+
+    async def ainvoke(self, prompt: str):
+        self.policy.count_call(self.component)
+        delay = self.policy.hedge_delay(self.component)
+        if delay is None:
+            return await self._timed_ainvoke(prompt)
+
+        primary = asyncio.ensure_future(self._timed_ainvoke(prompt))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.policy.try_hedge(self.component):
+            return await primary
+
+        hedge = asyncio.ensure_future(self._timed_ainvoke(prompt))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.policy.record_winner(self.component, task is hedge)
+                        return task.result()
+            return primary.result()
+        finally:
+            # Async thì hủy được request thua cuộc
+            for task in pending:
+                task.cancel()
+
+    def stream(self, prompt: str):
+        yield from self.llm.stream(prompt)
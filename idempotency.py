@@ -0,0 +1,110 @@
+# idempotency.py
+"""
+Chống xử lý trùng câu trả lời (/interview/answer gửi lại do mạng chập chờn, double-click).
+
+Client gửi kèm `idempotency_key` (một key cho mỗi câu hỏi, gửi lại thì dùng lại key cũ):
+- Request trùng key tới SAU khi lượt đầu đã ghi xong → trả lại response đã lưu trên record
+  (`InterviewRecord.last_answer`, ghi cùng lượt update với delta nên không có trạng thái lưng chừng).
+- Request trùng key tới TRONG LÚC lượt đầu còn chạy (cùng process) → `InflightRequests` cho
+  request sau đợi và trả về đúng kết quả của request đầu, không chấm điểm / TTS lần hai.
+- Trùng key ở process khác → request sau bị optimistic locking chặn khi ghi, route đọc lại
+  `last_answer` và trả response đã lưu thay vì 409.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+MAX_KEY_LENGTH = 128
+
+
+def normalize_key(raw) -> Optional[str]:
+    """Key hợp lệ (chuỗi không rỗng, tối đa MAX_KEY_LENGTH ký tự) hoặc None = không dùng idempotency."""
+    if not isinstance(raw, str):
+        return None
+    key = raw.strip()
+    return key if 0 < len(key) <= MAX_KEY_LENGTH else None
+
+
+class _Inflight:
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class InflightRequests:
+    """Request đang chạy theo key; request trùng key đợi kết quả của request đầu (thread-safe)."""
+
+    def __init__(self, wait_timeout: float = 180.0):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Inflight] = {}
+        self._stats = {"executed": 0, "waited": 0, "wait_failed": 0, "replayed": 0}
+
+    def _begin(self, key: str):
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = _Inflight()
+                self._stats["executed"] += 1
+                return entry, True
+            return entry, False
+
+    def _finish(self, key: str, entry: _Inflight, result):
+        entry.result = result
+        with self._lock:
+            self._inflight.pop(key, None)
+        entry.done.set()
+
+    def _waited(self, entry: _Inflight, finished: bool):
+        with self._lock:
+            ok = finished and entry.result is not None
+            self._stats["waited" if ok else "wait_failed"] += 1
+        return entry.result if ok else None
+
+    def run_once(self, key: Optional[str], fn: Callable[[], object]):
+        """
+        Chạy `fn()` cho key; đang có request cùng key chạy thì đợi và trả về kết quả của nó.
+        Request đầu lỗi / quá `wait_timeout` → request sau tự chạy `fn()` (ghi trùng vẫn bị
+        optimistic locking chặn). `key` None → chạy luôn.
+        """
+        if key is None:
+            return fn()
+        entry, owner = self._begin(key)
+        if not owner:
+            result = self._waited(entry, entry.done.wait(self.wait_timeout))
+            return result if result is not None else fn()
+
+        result = None
+        try:
+            result = fn()
+            return result
+        finally:
+            self._finish(key, entry, result)
+
+    async def arun_once(self, key: Optional[str], fn: Callable[[], Awaitable]):
+        """Bản async của `run_once` (đợi bằng thread pool để không chặn event loop)."""
+        if key is None:
+            return await fn()
+        entry, owner = self._begin(key)
+        if not owner:
+            finished = await asyncio.to_thread(entry.done.wait, self.wait_timeout)
+            result = self._waited(entry, finished)
+            return result if result is not None else await fn()
+
+        result = None
+        try:
+            result = await fn()
+            return result
+        finally:
+            self._finish(key, entry, result)
+
+    def count_replay(self):
+        with self._lock:
+            self._stats["replayed"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"inflight": len(self._inflight), **self._stats}
@@ -0,0 +1,199 @@
+# llm_usage.py
+"""
+Đo lượng token và thời gian của từng lần gọi LLM.
+
+Mỗi component (warmup, question, evaluate, ...) dùng một `MeteredLLM` riêng để log được
+gắn nhãn component; batch_id lấy từ contextvar `current_batch_id` (processor set ở đầu
+mỗi lượt). Log được ghi vào MongoDB (collection `llm_usage`) bằng một thread nền theo lô,
+nên không cộng thêm độ trễ vào lượt phỏng vấn.
+
+`est_prompt_tokens`/`est_output_tokens` là ước lượng (~4 ký tự/token) phần thực sự gửi đi/nhận
+về; prefix đã cache phía provider ghi riêng ở `cached_prefix_tokens`. Backend nào trả số token
+thật (usage_metadata) thì điền vào `call_usage()` → log thêm `prompt_tokens`/`output_tokens`/
+`cached_tokens` của provider.
+"""
+
+import datetime
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from timing import add_stage_time
+
+# Batch đang xử lý trong request / task / thread hiện tại
+current_batch_id: ContextVar[Optional[str]] = ContextVar("current_batch_id", default=None)
+
+# Thông tin token của lần gọi LLM hiện tại: MeteredLLM tạo dict mới mỗi lần gọi, các lớp bên trong
+# (prompt_cache, ...) ghi vào `cached_prefix_tokens` và số token provider báo về
+current_call_usage: ContextVar[Optional[Dict]] = ContextVar("current_call_usage", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng thô số token (~4 ký tự / token), đủ dùng để giới hạn độ dài prompt."""
+    return len(text or "") // 4
+
+
+def call_usage() -> Dict:
+    """Dict usage của lần gọi hiện tại (dict tạm nếu không có MeteredLLM bọc ngoài)."""
+    usage = current_call_usage.get()
+    return usage if usage is not None else {}
+
+
+# Số token do provider báo về (chỉ có khi backend trả usage_metadata)
+PROVIDER_FIELDS = ("prompt_tokens", "output_tokens", "cached_tokens")
+
+
+class UsageRecorder:
+    """Tổng hợp thống kê trong bộ nhớ + đẩy từng bản ghi vào MongoDB (nếu đã gắn collection)."""
+
+    def __init__(self, flush_size: int = 50, flush_interval: float = 5.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict] = {}
+        self._queue = queue.Queue()
+        self._collection = None
+        self._writer = None
+
+    def set_collection(self, collection):
+        """Gắn collection MongoDB và khởi động thread ghi nền."""
+        self._collection = collection
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="llm-usage-writer", daemon=True)
+            self._writer.start()
+
+    def record(self, entry: Dict):
+        with self._lock:
+            totals = self._totals.setdefault(entry["component"], {
+                "calls": 0, "errors": 0, "est_prompt_tokens": 0, "est_output_tokens": 0,
+                "cached_prefix_tokens": 0, "max_est_prompt_tokens": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "reported_calls": 0, "prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0
+            })
+            totals["calls"] += 1
+            totals["errors"] += 0 if entry["ok"] else 1
+            totals["est_prompt_tokens"] += entry["est_prompt_tokens"]
+            totals["est_output_tokens"] += entry["est_output_tokens"]
+            totals["cached_prefix_tokens"] += entry["cached_prefix_tokens"]
+            totals["total_ms"] += entry["wall_ms"]
+            totals["max_ms"] = max(totals["max_ms"], entry["wall_ms"])
+            totals["max_est_prompt_tokens"] = max(totals["max_est_prompt_tokens"], entry["est_prompt_tokens"])
+            if "prompt_tokens" in entry:
+                totals["reported_calls"] += 1
+                for field in PROVIDER_FIELDS:
+                    totals[field] += entry.get(field, 0)
+
+        if self._collection is not None:
+            self._queue.put(entry)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for component, totals in self._totals.items():
+                calls = totals["calls"]
+                reported = totals["reported_calls"]
+                result[component] = {
+                    **totals,
+                    "total_ms": round(totals["total_ms"], 1),
+                    "max_ms": round(totals["max_ms"], 1),
+                    "avg_ms": round(totals["total_ms"] / calls, 1) if calls else 0.0,
+                    "avg_est_prompt_tokens": round(totals["est_prompt_tokens"] / calls) if calls else 0,
+                    "avg_cached_prefix_tokens": round(totals["cached_prefix_tokens"] / calls) if calls else 0,
+                    "avg_prompt_tokens": round(totals["prompt_tokens"] / reported) if reported else None,
+                }
+            return result
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._collection.insert_many(batch, ordered=False)
+            except Exception as e:
+                print(f"⚠️ Lỗi ghi llm_usage ({len(batch)} bản ghi): {e}")
+
+
+usage_recorder = UsageRecorder()
+
+
+class MeteredLLM:
+    """Bọc LLM (interface `invoke`/`ainvoke`/`stream`), ghi token và thời gian mỗi lần gọi."""
+
+    def __init__(self, llm, component: str, recorder: UsageRecorder = usage_recorder):
+        self.llm = llm
+        self.component = component
+        self.recorder = recorder
+
+    @staticmethod
+    def _start_usage() -> Dict:
+        usage = {}
+        current_call_usage.set(usage)
+        return usage
+
+    def _record(self, prompt: str, result, started: float, ok: bool, usage: Dict,
+                first_chunk_ms: Optional[float] = None):
+        cached = usage.get("cached_prefix_tokens", 0)
+        entry = {
+            "component": self.component,
+            "batch_id": current_batch_id.get(),
+            # Prefix đã cache phía provider không được gửi lại → không tính vào prompt gửi đi
+            "est_prompt_tokens": max(estimate_tokens(prompt) - cached, 0),
+            "est_output_tokens": estimate_tokens(result) if isinstance(result, str) else 0,
+            "cached_prefix_tokens": cached,
+            "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+            "ok": ok,
+            "created_at": datetime.datetime.utcnow().isoformat()
+        }
+        entry.update({field: usage[field] for field in PROVIDER_FIELDS if field in usage})
+        if first_chunk_ms is not None:
+            entry["first_chunk_ms"] = first_chunk_ms
+        self.recorder.record(entry)
+        add_stage_time(f"llm.{self.component}", entry["wall_ms"])  # Server-Timing của request hiện tại
+
+    def invoke(self, prompt: str):
+        started = time.perf_counter()
+        usage = self._start_usage()
+        try:
+            result = self.llm.invoke(prompt)
+        except Exception:
+            self._record(prompt, None, started, ok=False, usage=usage)
+            raise
+        self._record(prompt, result, started, ok=True, usage=usage)
+        return result
+
+    def stream(self, prompt: str):
+        """Stream từng chunk; log được ghi khi stream kết thúc (kèm thời gian tới chunk đầu tiên)."""
+        started = time.perf_counter()
+        usage = self._start_usage()
+        first_chunk_ms = None
+        chunks = []
+        try:
+            for chunk in self.llm.stream(prompt):
+                if first_chunk_ms is None:
+                    first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            self._record(prompt, None, started, ok=False, usage=usage, first_chunk_ms=first_chunk_ms)
+            raise
+        self._record(prompt, "".join(chunks), started, ok=True, usage=usage, first_chunk_ms=first_chunk_ms)
+
+    async def ainvoke(self, prompt: str):
+        started = time.perf_counter()
+        usage = self._start_usage()
+        try:
+            result = await self.llm.ainvoke(prompt)
+        except Exception:
+            self._record(prompt, None, started, ok=False, usage=usage)
+            raise
+        self._record(prompt, result, started, ok=True, usage=usage)
+        return result
@@ -0,0 +1,110 @@
+# model_router.py
+"""
+Chọn model LLM theo component, cấu hình theo từng batch (`InterviewConfig.component_models`).
+
+Processor gắn `component_models` của batch vào contextvar `current_component_models` ở đầu
+mỗi lượt; `RoutedLLM` của từng component đọc contextvar để biết gọi model nào. Component
+không có trong map dùng model mặc định (`Config.LLM_MODEL`, đi qua prompt prefix cache).
+Router ghi độ trễ theo model để so sánh model nhẹ với model chính.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+# component -> model của batch đang xử lý trong request / task / thread hiện tại
+current_component_models: ContextVar[Dict[str, str]] = ContextVar("current_component_models", default={})
+
+
+class ModelRouter:
+    """Giữ một LLM cho mỗi model (tạo lười bằng `factory`) và thống kê độ trễ theo model."""
+
+    def __init__(self, default_llm, default_model: str, factory: Callable[[str], object]):
+        self.default_model = default_model
+        self.factory = factory
+        self._llms = {default_model: default_llm}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def resolve(self, component: str) -> str:
+        return current_component_models.get().get(component) or self.default_model
+
+    def get(self, model: str):
+        with self._lock:
+            llm = self._llms.get(model)
+            if llm is None:
+                print(f"🔀 Model router: khởi tạo model {model}")
+                llm = self._llms[model] = self.factory(model)
+            return llm
+
+    def route(self, component: str) -> "RoutedLLM":
+        return RoutedLLM(self, component)
+
+    def record(self, model: str, component: str, wall_ms: float, ok: bool):
+        with self._lock:
+            stats = self._stats.setdefault(model, {"calls": 0, "errors": 0, "total_ms": 0.0, "components": {}})
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["total_ms"] += wall_ms
+            stats["components"][component] = stats["components"].get(component, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                model: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0,
+                    "components": dict(stats["components"])
+                }
+                for model, stats in self._stats.items()
+            }
+
+
+class RoutedLLM:
+    """LLM (interface `invoke`/`ainvoke`/`stream`) của một component, model chọn lúc gọi."""
+
+    def __init__(self, router: ModelRouter, component: str):
+        self.router = router
+        self.component = component
+
+    def _record(self, model: str, started: float, ok: bool):
+        self.router.record(model, self.component, (time.perf_counter() - started) * 1000, ok)
+
+    def invoke(self, prompt: str):
+        model = self.router.resolve(self.component)
+        started = time.perf_counter()
+        try:
+            result = self.router.get(model).invoke(prompt)
+        except Exception:
+            self._record(model, started, ok=False)
+            raise
+        self._record(model, started, ok=True)
+        return result
+
+    def stream(self, prompt: str):
+        model = self.router.resolve(self.component)
+        started = time.perf_counter()
+        try:
+            yield from self.router.get(model).stream(prompt)
+        except Exception:
+            self._record(model, started, ok=False)
+            raise
+        self._record(model, started, ok=True)
+
+    async def ainvoke(self, prompt: str):
+        model = self.router.resolve(self.component)
+        started = time.perf_counter()
+        try:
+            result = await self.router.get(model).ainvoke(prompt)
+        except Exception:
+            self._record(model, started, ok=False)
+            raise
+        self._record(model, started, ok=True)
+        return result
+
+
+def resolve_model(component: str, default: Optional[str] = None) -> Optional[str]:
+    """Model của component trong batch hiện tại (None/`default` nếu batch không cấu hình riêng)."""
+    return current_component_models.get().get(component, default)
@@ -0,0 +1,384 @@
+# prompt_cache.py
+"""
+Cache phía provider cho phần prefix tĩnh của prompt (tài liệu + outline + topic của batch).
+
+Các prompt trong LLMInterviewer4 đều bắt đầu bằng `build_batch_prefix(...)`, nên prefix
+này giống hệt nhau ở mọi lượt của cùng một batch. Khi batch bật `prompt_prefix_cache`,
+`wakeup_context` đăng ký prefix một lần (tạo cached-content handle), sau đó
+`PrefixCachedLLM` chỉ gửi phần đuôi (suffix) của prompt kèm handle. Xóa batch → route gọi
+`release_batch(batch_id)`; prefix không còn prompt nào dùng (hết hạn quá một TTL mà không được
+tạo lại) bị bỏ ở lần đăng ký sau.
+
+Backend:
+- LocalPrefixCacheBackend: stand-in offline, ghép lại prefix + suffix rồi gọi LLM gốc.
+- GeminiPrefixCacheBackend: dùng `client.caches` của google-genai, gọi qua pool API key.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from gemini_pool import RateLimitedError
+from llm_usage import call_usage, estimate_tokens
+
+
+# ===================================================================
+# 1. THỐNG KÊ
+# ===================================================================
+class PrefixCacheStats:
+    """Đếm hit/miss (miss = prompt gửi đầy đủ vì không khớp prefix nào) và số token prefix không phải gửi lại."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.create_failures = 0
+        self.fallbacks = 0
+        self.saved_tokens = 0
+
+    def record_hit(self, saved_tokens: int):
+        with self._lock:
+            self.hits += 1
+            self.saved_tokens += saved_tokens
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_created(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.created += 1
+            else:
+                self.create_failures += 1
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "created": self.created,
+                "create_failures": self.create_failures,
+                "fallbacks": self.fallbacks,
+                "saved_tokens": self.saved_tokens,
+                "hit_rate": round(self.hits / calls, 3) if calls else 0.0,
+            }
+
+
+# ===================================================================
+# 2. BACKEND
+# ===================================================================
+def _report_usage(usage: Dict, response):
+    """Ghi số token provider báo về (usage_metadata của google-genai) vào log của lần gọi."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None or metadata.prompt_token_count is None:
+        return
+    usage.update({
+        "prompt_tokens": metadata.prompt_token_count,
+        "output_tokens": metadata.candidates_token_count or 0,
+        "cached_tokens": metadata.cached_content_token_count or 0,
+    })
+
+
+class LocalPrefixCacheBackend:
+    """
+    Stand-in offline: giữ prefix trong bộ nhớ và gửi lại prefix + suffix cho LLM gốc.
+    Dùng để chạy/kiểm thử luồng cache khi không có quyền tạo cached content.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self._entries: Dict[str, str] = {}
+
+    def create(self, prefix: str, ttl_seconds: int) -> str:
+        name = f"local/{hashlib.md5(prefix.encode()).hexdigest()}"
+        self._entries[name] = prefix
+        return name
+
+    def delete(self, name: str):
+        self._entries.pop(name, None)
+
+    def invoke(self, name: str, suffix: str) -> str:
+        return self.llm.invoke(self._entries[name] + suffix)
+
+    def stream(self, name: str, suffix: str):
+        yield from self.llm.stream(self._entries[name] + suffix)
+
+    async def ainvoke(self, name: str, suffix: str) -> str:
+        return await self.llm.ainvoke(self._entries[name] + suffix)
+
+
+class GeminiPrefixCacheBackend:
+    """
+    Cached content của Gemini (google-genai), gọi qua `GeminiClientPool`. Cached content gắn với
+    project của API key → mỗi key có bản cache riêng của prefix; lượt gọi do pool chọn key
+    (tính RPM/TPM, tránh key vừa 429) rồi dùng bản cache của đúng key đó.
+    """
+
+    def __init__(self, pool, model: str, temperature: float):
+        self.pool = pool
+        self.model = model
+        self.temperature = temperature
+        self._lock = threading.Lock()
+        self._prefixes: Dict[str, tuple] = {}       # handle -> (prefix, ttl_seconds)
+        self._caches: Dict[str, Dict[str, str]] = {}  # handle -> {api key: tên cached content}
+
+    def _create_on(self, key: str, prefix: str, ttl_seconds: int) -> str:
+        from google.genai import types
+
+        cache = self.pool.genai_client(key).caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix],
+                ttl=f"{ttl_seconds}s",
+                display_name=f"interview-prefix-{hashlib.md5(prefix.encode()).hexdigest()[:12]}"
+            )
+        )
+        return cache.name
+
+    def create(self, prefix: str, ttl_seconds: int) -> str:
+        """Tạo cache trên mọi key; key nào lỗi sẽ được tạo lại khi pool chọn tới key đó."""
+        handle = f"pool/{hashlib.md5(prefix.encode()).hexdigest()}"
+        caches, errors = {}, []
+        for state in self.pool.states:
+            try:
+                caches[state.key] = self._create_on(state.key, prefix, ttl_seconds)
+            except Exception as e:
+                errors.append(e)
+        if not caches:
+            raise errors[0]
+        with self._lock:
+            self._prefixes[handle] = (prefix, ttl_seconds)
+            self._caches[handle] = caches
+        return handle
+
+    def delete(self, name: str):
+        with self._lock:
+            self._prefixes.pop(name, None)
+            caches = self._caches.pop(name, {})
+        for key, cache_name in caches.items():
+            self.pool.genai_client(key).caches.delete(name=cache_name)
+
+    def _cache_for(self, name: str, key: str) -> str:
+        with self._lock:
+            cache_name = self._caches[name].get(key)
+            prefix, ttl_seconds = self._prefixes[name]
+        if cache_name is None:
+            cache_name = self._create_on(key, prefix, ttl_seconds)
+            with self._lock:
+                self._caches.setdefault(name, {})[key] = cache_name
+        return cache_name
+
+    def _config(self, name: str, key: str):
+        from google.genai import types
+        return types.GenerateContentConfig(cached_content=self._cache_for(name, key), temperature=self.temperature)
+
+    def _tokens(self, name: str, suffix: str) -> int:
+        # Token của cached content vẫn tính vào TPM của key
+        with self._lock:
+            prefix, _ = self._prefixes[name]
+        return estimate_tokens(prefix) + estimate_tokens(suffix)
+
+    def invoke(self, name: str, suffix: str) -> str:
+        usage = call_usage()
+
+        def call(key):
+            response = self.pool.genai_client(key).models.generate_content(
+                model=self.model, contents=suffix, config=self._config(name, key)
+            )
+            _report_usage(usage, response)
+            return response.text
+        return self.pool.run(call, self._tokens(name, suffix), self.model)
+
+    def stream(self, name: str, suffix: str):
+        usage = call_usage()
+
+        def chunks(key):
+            for chunk in self.pool.genai_client(key).models.generate_content_stream(
+                    model=self.model, contents=suffix, config=self._config(name, key)
+            ):
+                _report_usage(usage, chunk)  # chunk cuối mang tổng số token
+                if chunk.text:
+                    yield chunk.text
+        yield from self.pool.run_stream(chunks, self._tokens(name, suffix), self.model)
+
+    async def ainvoke(self, name: str, suffix: str) -> str:
+        usage = call_usage()
+
+        async def call(key):
+            config = await asyncio.to_thread(self._config, name, key)
+            response = await self.pool.genai_client(key).aio.models.generate_content(
+                model=self.model, contents=suffix, config=config
+            )
+            _report_usage(usage, response)
+            return response.text
+        return await self.pool.arun(call, self._tokens(name, suffix), self.model)
+
+
+# ===================================================================
+# 3. LLM WRAPPER
+# ===================================================================
+class PrefixCachedLLM:
+    """
+    Bọc LLM gốc (cùng interface `invoke`/`ainvoke`). Prompt nào bắt đầu bằng một prefix
+    đã đăng ký → gửi suffix + handle; còn lại (hoặc backend lỗi) → gọi LLM gốc như cũ.
+    """
+
+    def __init__(self, llm, backend, ttl_seconds: int = 3600, min_prefix_tokens: int = 1024):
+        self.llm = llm
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_prefix_tokens = min_prefix_tokens
+        self.stats = PrefixCacheStats()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}  # md5(prefix) -> {prefix, name, expires_at, batch_id}
+
+    def register(self, prefix: str, batch_id: Optional[str] = None) -> Optional[str]:
+        """
+        Tạo (hoặc dùng lại) cached-content handle cho prefix của `batch_id`.
+        None nếu prefix quá ngắn/lỗi.
+        """
+        if estimate_tokens(prefix) < self.min_prefix_tokens:
+            return None
+
+        key = hashlib.md5(prefix.encode()).hexdigest()
+        with self._lock:
+            self._prune(time.time())
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] > time.time():
+                return entry["name"]
+
+        try:
+            name = self.backend.create(prefix, self.ttl_seconds)
+        except Exception as e:
+            print(f"⚠️ Không tạo được prompt cache: {e}")
+            self.stats.record_created(False)
+            return None
+
+        self.stats.record_created(True)
+        with self._lock:
+            self._entries[key] = {
+                "prefix": prefix,
+                "name": name,
+                # Trừ hao 60s để không dùng handle sắp hết hạn phía provider
+                "expires_at": time.time() + self.ttl_seconds - 60,
+                "batch_id": batch_id
+            }
+        print(f"🧊 Prompt cache: đăng ký prefix ~{estimate_tokens(prefix)} token ({name})")
+        return name
+
+    def release(self, prefix: str):
+        """Xóa handle của prefix (vd. khi xóa batch)."""
+        with self._lock:
+            entry = self._entries.pop(hashlib.md5(prefix.encode()).hexdigest(), None)
+        if entry:
+            self._delete_handle(entry)
+
+    def release_batch(self, batch_id: str):
+        """Xóa mọi prefix đã đăng ký cho batch (batch bị xóa)."""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry["batch_id"] == batch_id]
+            entries = [self._entries.pop(key) for key in keys]
+        for entry in entries:
+            self._delete_handle(entry)
+        if entries:
+            print(f"🧊 Prompt cache: xóa {len(entries)} prefix của batch {batch_id}")
+
+    def _delete_handle(self, entry: Dict):
+        try:
+            self.backend.delete(entry["name"])
+        except Exception as e:
+            print(f"⚠️ Không xóa được prompt cache {entry['name']}: {e}")
+
+    def _prune(self, now: float):
+        # Prompt đầu tiên sau khi hết hạn sẽ tạo lại handle (`_match`) → entry hết hạn quá một TTL
+        # nghĩa là batch không còn được dùng; handle phía provider đã tự hết hạn, chỉ cần bỏ entry
+        for key in [key for key, entry in self._entries.items() if entry["expires_at"] + self.ttl_seconds <= now]:
+            del self._entries[key]
+
+    def _match(self, prompt: str) -> Optional[Dict]:
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if prompt.startswith(entry["prefix"]):
+                if entry["expires_at"] <= time.time():
+                    # Hết hạn → tạo lại handle rồi dùng tiếp
+                    if self.register(entry["prefix"], entry["batch_id"]) is None:
+                        return None
+                    return self._match(prompt)
+                return entry
+        return None
+
+    def _record_hit(self, entry: Dict, usage: Dict):
+        prefix_tokens = estimate_tokens(entry["prefix"])
+        self.stats.record_hit(prefix_tokens)
+        usage["cached_prefix_tokens"] = prefix_tokens  # log llm_usage tách phần không phải gửi lại
+
+    def invoke(self, prompt: str) -> str:
+        usage = call_usage()
+        entry = self._match(prompt)
+        if entry is None:
+            self.stats.record_miss()
+            return self.llm.invoke(prompt)
+        try:
+            result = self.backend.invoke(entry["name"], prompt[len(entry["prefix"]):])
+        except RateLimitedError:
+            # Pool hết quota → gửi lại toàn bộ prompt cũng sẽ 429
+            raise
+        except Exception as e:
+            print(f"⚠️ Gọi qua prompt cache lỗi, gửi lại toàn bộ prompt: {e}")
+            self.stats.record_fallback()
+            return self.llm.invoke(prompt)
+        self._record_hit(entry, usage)
+        return result
+
+    def stream(self, prompt: str):
+        usage = call_usage()
+        entry = self._match(prompt)
+        if entry is None:
+            self.stats.record_miss()
+            yield from self.llm.stream(prompt)
+            return
+
+        started = False
+        try:
+            for chunk in self.backend.stream(entry["name"], prompt[len(entry["prefix"]):]):
+                started = True
+                yield chunk
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            # Đã gửi một phần cho client thì không thể gửi lại từ đầu
+            if started:
+                raise
+            print(f"⚠️ Stream qua prompt cache lỗi, gửi lại toàn bộ prompt: {e}")
+            self.stats.record_fallback()
+            yield from self.llm.stream(prompt)
+            return
+        self._record_hit(entry, usage)
+
+    async def ainvoke(self, prompt: str) -> str:
+        usage = call_usage()
+        entry = await asyncio.to_thread(self._match, prompt)
+        if entry is None:
+            self.stats.record_miss()
+            return await self.llm.ainvoke(prompt)
+        try:
+            result = await self.backend.ainvoke(entry["name"], prompt[len(entry["prefix"]):])
+        except RateLimitedError:
+            # Pool hết quota → gửi lại toàn bộ prompt cũng sẽ 429
+            raise
+        except Exception as e:
+            print(f"⚠️ Gọi qua prompt cache lỗi, gửi lại toàn bộ prompt: {e}")
+            self.stats.record_fallback()
+            return await self.llm.ainvoke(prompt)
+        self._record_hit(entry, usage)
+        return result
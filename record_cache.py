@@ -0,0 +1,101 @@
+# record_cache.py
+"""
+Cache trong tiến trình các InterviewRecord đang phỏng vấn, khóa = record_id.
+
+Mỗi lượt /interview/answer trước đây phải đọc document từ MongoDB rồi khôi phục Enum
+(`deserialize_record`). Record vừa được ghi thành công ở lượt trước thì giống hệt bản trong DB
+(cùng `version`), nên giữ lại object đó cho lượt sau là đủ. DB vẫn được ghi ở MỖI lượt
+(`save_answered_record`), cache chỉ bỏ bước đọc → mất cache (restart, evict) không mất dữ liệu.
+
+- `take` lấy record RA KHỎI cache: request đang xử lý sở hữu object (processor sửa tại chỗ),
+  request trùng cùng lúc sẽ đọc DB và bị optimistic locking chặn như trước.
+- `put` chỉ gọi sau khi ghi DB thành công, với `version` đã tăng tương ứng.
+- Entry bị bỏ khi lượt phỏng vấn kết thúc, khi reset/xóa batch, khi quá `idle_ttl_seconds`
+  không có lượt trả lời mới, hoặc khi vượt `max_entries` (bỏ entry lâu nhất - LRU).
+
+Cache nằm trong từng process: chạy nhiều worker thì cần sticky session theo thí sinh (hoặc tắt
+bằng RECORD_CACHE_ENABLED=0), nếu không record cũ trong cache sẽ bị từ chối (409) khi ghi.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from LLMInterviewer4 import InterviewRecord
+
+
+class RecordCache:
+    """LRU + idle TTL, thread-safe (dùng chung cho route Flask và route async)."""
+
+    def __init__(self, max_entries: int = 5000, idle_ttl_seconds: int = 1800, enabled: bool = True):
+        self.max_entries = max_entries
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # record_id -> (record, last_access)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted_capacity": 0, "evicted": 0}
+
+    # ---------- Đọc / ghi ----------
+    def take(self, record_id: str) -> Optional[InterviewRecord]:
+        """Lấy record ra khỏi cache (None nếu không có / đã hết hạn)."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.pop(record_id, None)
+            self._stats["hits" if entry else "misses"] += 1
+        return entry[0] if entry else None
+
+    def put(self, record_id: str, record: InterviewRecord):
+        """Giữ record đã được ghi DB cho lượt sau; record đã kết thúc thì không giữ."""
+        if not self.enabled:
+            return
+        if record.is_finished:
+            self.evict(record_id)
+            return
+        now = time.time()
+        with self._lock:
+            self._entries.pop(record_id, None)
+            self._entries[record_id] = (record, now)
+            self._expire(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted_capacity"] += 1
+
+    def evict(self, record_id: str):
+        with self._lock:
+            if self._entries.pop(record_id, None) is not None:
+                self._stats["evicted"] += 1
+
+    def evict_batch(self, batch_id: str):
+        """Bỏ mọi record của batch (batch bị xóa)."""
+        with self._lock:
+            stale = [rid for rid, (record, _) in self._entries.items() if record.batch_id == batch_id]
+            for record_id in stale:
+                del self._entries[record_id]
+            self._stats["evicted"] += len(stale)
+
+    def _expire(self, now: float):
+        # Entry được xếp theo lần put gần nhất → entry hết hạn luôn nằm đầu OrderedDict
+        while self._entries:
+            record_id, (_, last_access) = next(iter(self._entries.items()))
+            if now - last_access <= self.idle_ttl_seconds:
+                break
+            del self._entries[record_id]
+            self._stats["expired"] += 1
+
+    # ---------- Thống kê ----------
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._expire(time.time())
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None
+            }
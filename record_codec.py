@@ -0,0 +1,144 @@
+# record_codec.py
+"""
+Codec cho các dataclass phỏng vấn (InterviewRecord, QuestionAttempt, InterviewConfig, ...) ↔
+document MongoDB / JSON.
+
+Thay cho `to_mongo_safe(asdict(...))` khi ghi và khôi phục Enum bằng tay khi đọc:
+- `asdict` deepcopy đệ quy cả record, `to_mongo_safe` lại duyệt + copy thêm một lần, trong khi
+  driver (BSON) hay `json.dumps` đằng nào cũng tự duyệt document lúc serialize.
+- Codec sinh sẵn hàm encode/decode cho từng class (một lần, theo type hint của field):
+  Enum ↔ `.value`, dataclass lồng / `List[...]` / `Dict[Enum, ...]` đổi theo kiểu phần tử;
+  field không có kiểu cần đổi (str, số, dict/list tự do như conversation_memory) giữ nguyên
+  tham chiếu, không copy.
+
+Document do `encode` trả về dùng chung list/dict với object → serialize ngay (insert/update/
+jsonify), không giữ lại để sửa. `decode` chỉ đọc các key là field của class (bỏ qua `_id`,
+`reset_count`, ... của document).
+
+    RECORD_CODEC = codec_for(InterviewRecord)
+    doc = RECORD_CODEC.encode(record)
+    record = RECORD_CODEC.decode(db_records.find_one(...))
+"""
+
+import dataclasses
+import itertools
+import typing
+from enum import Enum
+from typing import Any, Callable, Dict
+
+
+class DataclassCodec:
+    """Encoder/decoder sinh code cho một dataclass; dùng `codec_for(cls)` để lấy (cache theo class)."""
+
+    def __init__(self, cls):
+        self.cls = cls
+        self._names = itertools.count()
+        self._namespace: Dict[str, Any] = {}
+        self.field_encoders: Dict[str, Callable] = {}
+
+        hints = typing.get_type_hints(cls)
+        encode_items, positional_args, keyword_args = [], [], []
+        for f in dataclasses.fields(cls):
+            if not f.init:
+                continue
+            tp = hints[f.name]
+            encode_items.append(f"{f.name!r}: {self._encode_expr(tp, f'obj.{f.name}')}")
+            # Truyền theo vị trí (nhanh hơn keyword) trừ field kw_only
+            if f.kw_only:
+                keyword_args.append(f"{f.name}={self._decode_field(f, tp)}")
+            else:
+                positional_args.append(self._decode_field(f, tp))
+            self.field_encoders[f.name] = self._compile("value", self._encode_expr(tp, "value"))
+
+        self.encode: Callable[[Any], Dict] = self._compile("obj", "{" + ", ".join(encode_items) + "}")
+        self.decode: Callable[[Dict], Any] = self._compile(
+            "doc", f"{self._bind(cls)}(" + ", ".join(positional_args + keyword_args) + ")"
+        )
+
+    def encode_field(self, name: str, value):
+        """Encode giá trị của một field (dùng cho update từng phần, vd. `$set`)."""
+        return self.field_encoders[name](value)
+
+    # ---------- Sinh code ----------
+    def _bind(self, value) -> str:
+        name = f"_n{next(self._names)}"
+        self._namespace[name] = value
+        return name
+
+    def _compile(self, arg: str, expr: str) -> Callable:
+        source = f"def _fn({arg}):\n    return {expr}\n"
+        exec(source, self._namespace)
+        return self._namespace.pop("_fn")
+
+    def _decode_field(self, f: dataclasses.Field, tp) -> str:
+        key = repr(f.name)
+        value = self._decode_expr(tp, f"doc[{key}]")
+        if f.default is not dataclasses.MISSING:
+            default = self._bind(f.default)
+        elif f.default_factory is not dataclasses.MISSING:
+            default = f"{self._bind(f.default_factory)}()"
+        else:
+            return value  # Field bắt buộc: thiếu key → KeyError như `cls(**doc)`
+        if value == f"doc[{key}]" and f.default is not dataclasses.MISSING:
+            return f"doc.get({key}, {default})"
+        return f"({value} if {key} in doc else {default})"
+
+    def _encode_expr(self, tp, expr: str) -> str:
+        """Biểu thức encode `expr` có kiểu `tp`; trả lại chính `expr` nếu không cần đổi."""
+        return self._convert(tp, expr, encode=True)
+
+    def _decode_expr(self, tp, expr: str) -> str:
+        return self._convert(tp, expr, encode=False)
+
+    def _convert(self, tp, expr: str, encode: bool) -> str:
+        origin, args = typing.get_origin(tp), typing.get_args(tp)
+
+        if origin is typing.Union:
+            inner = [arg for arg in args if arg is not type(None)]
+            if len(inner) == 1 and len(args) == 2:  # Optional[X]
+                converted = self._convert(inner[0], expr, encode)
+                return expr if converted == expr else f"(None if {expr} is None else {converted})"
+            return expr
+
+        if isinstance(tp, type) and issubclass(tp, Enum):
+            return f"{expr}.value" if encode else f"{self._bind(tp)}({expr})"
+
+        if dataclasses.is_dataclass(tp):
+            codec = codec_for(tp)
+            return f"{self._bind(codec.encode if encode else codec.decode)}({expr})"
+
+        if origin is list and args:
+            item = f"_i{next(self._names)}"
+            converted = self._convert(args[0], item, encode)
+            if converted == item:
+                return expr
+            return f"[{converted} for {item} in {expr}]"
+
+        if origin is dict and len(args) == 2:
+            key, value = f"_k{next(self._names)}", f"_v{next(self._names)}"
+            key_expr = self._convert(args[0], key, encode)
+            value_expr = self._convert(args[1], value, encode)
+            if key_expr == key and value_expr == value:
+                return expr
+            return f"{{{key_expr}: {value_expr} for {key}, {value} in {expr}.items()}}"
+
+        return expr
+
+
+_CODECS: Dict[type, DataclassCodec] = {}
+
+
+def codec_for(cls) -> DataclassCodec:
+    codec = _CODECS.get(cls)
+    if codec is None:
+        codec = _CODECS[cls] = DataclassCodec(cls)
+    return codec
+
+
+def json_default(obj):
+    """`default=` cho json.dumps: dataclass → codec, Enum → value, còn lại (ObjectId, datetime) → str."""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return codec_for(type(obj)).encode(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    return str(obj)
@@ -0,0 +1,175 @@
+# response_cache.py
+"""
+Cache kết quả LLM trên đĩa (SQLite) cho các prompt lặp lại.
+
+Khóa = sha256(model | temperature | prompt đã chuẩn hóa khoảng trắng). Cache có TTL và
+giới hạn số entry (xóa entry ít được dùng gần đây nhất - LRU). Chỉ các component được
+bật trong `components` mới đi qua cache (warmup, closing, knowledge_summary, ...);
+component sinh nội dung cần ngẫu nhiên (question, evaluate, ...) luôn gọi thẳng LLM.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from model_router import resolve_model
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Gộp khoảng trắng để prompt chỉ khác nhau về thụt lề/xuống dòng vẫn trùng khóa."""
+    return re.sub(r"\s+", " ", prompt or "").strip()
+
+
+class ResponseCache:
+    """Cache SQLite (LRU + TTL) dùng chung cho mọi component, thống kê hit/miss theo component."""
+
+    def __init__(self, path: str, model: str, temperature: float,
+                 components: Iterable[str] = (), max_entries: int = 5000,
+                 ttl_seconds: int = 7 * 24 * 3600, enabled: bool = True):
+        self.path = path
+        self.model = model
+        self.temperature = temperature
+        self.components = set(components)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._evictions = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                component TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    # ---------- Khóa / bật tắt ----------
+    def make_key(self, prompt: str, model: Optional[str] = None) -> str:
+        raw = f"{model or self.model}|{self.temperature}|{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_enabled(self, component: str) -> bool:
+        return self.enabled and component in self.components
+
+    def wrap(self, llm, component: str):
+        """Bọc LLM của component; component không bật cache → trả lại chính LLM đó."""
+        return CachedLLM(llm, self, component) if self.is_enabled(component) else llm
+
+    # ---------- Đọc / ghi ----------
+    def get(self, component: str, prompt: str) -> Optional[str]:
+        key = self.make_key(prompt, resolve_model(component))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row:
+                self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self._count(component, "hits" if row else "misses")
+        return row[0] if row else None
+
+    def put(self, component: str, prompt: str, response: str):
+        if not isinstance(response, str) or not response.strip():
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, component, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(prompt, resolve_model(component)), component, response, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Xóa entry hết hạn, rồi các entry lâu không dùng nhất nếu vượt `max_entries`."""
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._evictions += overflow
+
+    def clear(self, component: Optional[str] = None):
+        with self._lock:
+            if component:
+                self._conn.execute("DELETE FROM llm_cache WHERE component = ?", (component,))
+            else:
+                self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    # ---------- Thống kê ----------
+    def _count(self, component: str, field: str):
+        stats = self._stats.setdefault(component, {"hits": 0, "misses": 0})
+        stats[field] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            result = {"enabled": self.enabled, "entries": entries, "evictions": self._evictions, "components": {}}
+            for component, stats in self._stats.items():
+                calls = stats["hits"] + stats["misses"]
+                result["components"][component] = {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / calls, 3) if calls else 0.0
+                }
+            return result
+
+
+class CachedLLM:
+    """Bọc LLM (interface `invoke`/`ainvoke`/`stream`) của một component, tra cache trước khi gọi."""
+
+    def __init__(self, llm, cache: ResponseCache, component: str):
+        self.llm = llm
+        self.cache = cache
+        self.component = component
+
+    def invoke(self, prompt: str):
+        cached = self.cache.get(self.component, prompt)
+        if cached is not None:
+            return cached
+        result = self.llm.invoke(prompt)
+        self.cache.put(self.component, prompt, result)
+        return result
+
+    def stream(self, prompt: str):
+        cached = self.cache.get(self.component, prompt)
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        for chunk in self.llm.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put(self.component, prompt, "".join(chunks))
+
+    async def ainvoke(self, prompt: str):
+        cached = await asyncio.to_thread(self.cache.get, self.component, prompt)
+        if cached is not None:
+            return cached
+        result = await self.llm.ainvoke(prompt)
+        await asyncio.to_thread(self.cache.put, self.component, prompt, result)
+        return result
@@ -13,7 +13,10 @@ import traceback  # Để in log lỗi chi tiết
 from datetime import datetime
 
 # Import DB
-from extensions import db_vectorstores, db_batches, db_records
+from extensions import (
+    db_vectorstores, db_batches, db_records, db_question_bank, record_cache, answer_inflight,
+    context_cache, prefix_cached_llm
+)
 from database import get_all_users  # Import từ SQLite
 from BuildVectorStores import delete_vectorstore  # Tận dụng hàm xóa từ file
 from config import Config  # Import Config để dùng MONGO_URI khi xóa
@@ -211,6 +214,10 @@ def delete_batch_admin(batch_id):
 
         if result.deleted_count > 0:
             deleted_records = db_records.delete_many({"batch_id": batch_id})
+            db_question_bank.delete_many({"batch_id": batch_id})
+            record_cache.evict_batch(batch_id)
+            context_cache.pop(batch_id, None)
+            prefix_cached_llm.release_batch(batch_id)
             flash(f"Đã xóa Batch ID: {batch_id} và {deleted_records.deleted_count} bản ghi phỏng vấn", "success")
         else:
             flash(f"Không tìm thấy Batch ID: {batch_id} để xóa", "warning")
@@ -246,4 +253,31 @@ def get_batch_info(batch_id):
 
     except Exception as e:
         print(f"Lỗi khi lấy batch info (ID: {batch_id}): {e}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# ===================================================================
+# 5. ROUTE API: METRICS HIỆU NĂNG
+# ===================================================================
+
+@admin_bp.route('/metrics')
+@admin_required
+def get_metrics():
+    """
+    API endpoint trả về các chỉ số hiệu năng trong tiến trình hiện tại
+    (thống kê speculative generation, evaluate-and-ask, prompt cache, response cache, record cache, answer idempotency, token/thời gian LLM, ...)
+    """
+    from extensions import interview_processor, prefix_cached_llm, response_cache, gemini_pool, hedge_policy, model_router
+    from llm_usage import usage_recorder
+
+    return jsonify({
+        "speculation": interview_processor.speculation_stats.snapshot(),
+        "evaluate_and_ask": interview_processor.combined_stats.snapshot(),
+        "prompt_cache": prefix_cached_llm.stats.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "record_cache": record_cache.snapshot(),
+        "answer_idempotency": answer_inflight.snapshot(),
+        "gemini_keys": gemini_pool.snapshot() if gemini_pool else None,
+        "hedging": hedge_policy.snapshot(),
+        "models": model_router.snapshot(),
+        "llm_usage": usage_recorder.snapshot()
+    })
@@ -0,0 +1,281 @@
+# routes/interview_async.py
+"""
+Bản async (ASGI) của /interview/start_candidate và /interview/answer.
+
+Các lượt gọi Gemini chạy bằng `ainvoke` trên event loop nên một process có thể
+giữ hàng trăm thí sinh đang chờ LLM. Các thao tác blocking còn lại (MongoDB,
+FAISS, TTS) được đẩy sang thread pool bằng `asyncio.to_thread`.
+Logic dựng response dùng chung với routes/interview_process.py.
+"""
+
+import asyncio
+import json
+import traceback
+from datetime import datetime
+from http.cookies import SimpleCookie
+
+from extensions import db_records, async_interview_processor, record_cache, answer_inflight
+from gemini_pool import RateLimitedError
+from idempotency import normalize_key
+from LLMInterviewer4 import RecordSnapshot
+from record_codec import json_default
+from routes.audio import create_audio_from_text
+from routes.interview_process import (
+    verify_batch_ownership, wakeup_context,
+    build_completed_payload, find_candidate_profile, save_started_record,
+    build_start_payload, load_answer_record, save_answered_record, cache_answered_record, CONFLICT_PAYLOAD,
+    resume_pending_question, store_question_audio,
+    remember_answer, replay_answer, replay_after_conflict, check_before_turn, inflight_key,
+    build_finished_payload, attach_audio, store_closing_message, rate_limited_payload
+)
+
+
+# ===================================================================
+# ASGI helpers
+# ===================================================================
+async def read_json(receive) -> dict:
+    """Đọc toàn bộ body của request và parse JSON."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return json.loads(body or b"{}")
+
+
+async def send_json(send, payload, status: int = 200, headers=()):
+    """Gửi response JSON (`headers`: header thêm, dạng (bytes, bytes))."""
+    body = json.dumps(payload, ensure_ascii=False, default=json_default).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def get_header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def get_base_path(scope) -> str:
+    return '/iview1' if 'fit.neu.edu.vn' in get_header(scope, b"host") else ''
+
+
+def load_session_user(flask_app, scope):
+    """Giải mã cookie session của Flask để lấy user đang đăng nhập."""
+    cookie = SimpleCookie()
+    cookie.load(get_header(scope, b"cookie"))
+    morsel = cookie.get(flask_app.config.get("SESSION_COOKIE_NAME", "session"))
+    if not morsel:
+        return None
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if serializer is None:
+        return None
+    try:
+        data = serializer.loads(
+            morsel.value,
+            max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+        )
+    except Exception:
+        return None
+    return data.get("user")
+
+
+# ===================================================================
+# Background tasks
+# ===================================================================
+_background_tasks = set()  # Giữ tham chiếu để task không bị GC trước khi chạy xong
+
+
+async def _store_closing(record_id: str, record, context):
+    try:
+        closing_message = await async_interview_processor.agenerate_closing_message_for(record, context)
+        await asyncio.to_thread(store_closing_message, record_id, closing_message)
+    except Exception as e:
+        print(f"⚠️ Lỗi sinh lời kết nền cho record {record_id}: {e}")
+
+
+def schedule_closing_message(record_id: str, record, context):
+    """Sinh lời kết bằng LLM sau khi response cuối đã trả về (lời kết mặc định)."""
+    task = asyncio.create_task(_store_closing(record_id, record, context))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# ===================================================================
+# Handlers
+# ===================================================================
+async def start_candidate_interview(data: dict, user_id, base_path: str):
+    """Bản async của `start_candidate_interview`. Returns: (payload, status)"""
+    batch_id = data["session_id"]
+    candidate_name = data["candidate_name"]
+
+    if not await asyncio.to_thread(verify_batch_ownership, batch_id, user_id):
+        return {
+            "success": False,
+            "error": "Permission denied - You can only access your own interview batches"
+        }, 403
+
+    existing_record = await asyncio.to_thread(db_records.find_one, {
+        "batch_id": batch_id,
+        "candidate_name": candidate_name
+    })
+
+    if existing_record and existing_record.get("is_finished"):
+        return build_completed_payload(existing_record, candidate_name), 200
+
+    if existing_record and not data.get("restart"):
+        resumed = await asyncio.to_thread(resume_pending_question, existing_record, base_path)
+        if resumed:
+            return resumed, 200
+
+    cv_db, context = await asyncio.to_thread(wakeup_context, batch_id)
+
+    profile = await asyncio.to_thread(find_candidate_profile, cv_db, candidate_name)
+    if not profile:
+        return {"error": f"Không tìm thấy hồ sơ {candidate_name}"}, 404
+    profile_text, level = profile
+
+    new_record, first_q_data = await async_interview_processor.start_new_record(
+        batch_id,
+        candidate_name,
+        profile_text,
+        level,
+        context
+    )
+
+    record_id = await asyncio.to_thread(save_started_record, new_record, existing_record, candidate_name)
+    audio_id = await asyncio.to_thread(create_audio_from_text, first_q_data["question"])
+    await asyncio.to_thread(store_question_audio, record_id, new_record, audio_id)
+
+    return build_start_payload(record_id, first_q_data, level, audio_id, existing_record, base_path), 200
+
+
+async def run_answer_turn(record_id: str, record, answer_text: str, time_spent, idempotency_key, base_path: str):
+    """Bản async của `run_answer_turn`. Returns: (payload, status)"""
+    skipped = await asyncio.to_thread(check_before_turn, record_id, record, idempotency_key, base_path)
+    if skipped:
+        return skipped
+
+    _, context = await asyncio.to_thread(wakeup_context, record.batch_id)
+    was_finished = record.is_finished
+    snapshot = RecordSnapshot(record)
+
+    updated_record, api_result = await async_interview_processor.process_answer(
+        record, context, answer_text, time_spent
+    )
+    finished = api_result.get("finished")
+    payload = build_finished_payload(api_result) if finished else api_result
+
+    if not was_finished:
+        remember_answer(updated_record, idempotency_key, payload)
+        saved = await asyncio.to_thread(
+            save_answered_record, record_id, snapshot.changes(updated_record), record.version
+        )
+        if not saved:
+            replayed = await asyncio.to_thread(replay_after_conflict, record_id, idempotency_key, base_path)
+            return (replayed, 200) if replayed else (CONFLICT_PAYLOAD, 409)
+        cache_answered_record(record_id, updated_record)
+
+    if finished:
+        if not was_finished and api_result.get("closing_pending"):
+            schedule_closing_message(record_id, updated_record, context)
+        return payload, 200
+
+    if "next_question" in api_result:
+        audio_id = await asyncio.to_thread(create_audio_from_text, api_result["next_question"])
+        await asyncio.to_thread(store_question_audio, record_id, updated_record, audio_id)
+        attach_audio(api_result, audio_id, base_path)
+
+    return api_result, 200
+
+
+async def answer(data: dict, user_id, base_path: str):
+    """Bản async của `answer`. Returns: (payload, status)"""
+    print(f"📩 [async] Dữ liệu FE gửi đến vào lúc {datetime.utcnow()}:", data)
+
+    record_id = data["record_id"]
+    answer_text = data["answer"]
+    time_spent = data.get("time_spent", 0)
+    idempotency_key = normalize_key(data.get("idempotency_key"))
+
+    record, error = await asyncio.to_thread(load_answer_record, record_id)
+    if error:
+        return error
+
+    if not await asyncio.to_thread(verify_batch_ownership, record.batch_id, user_id):
+        return {"success": False, "error": "Permission denied"}, 403
+
+    replayed = replay_answer(record, idempotency_key, base_path)
+    if replayed:
+        record_cache.put(record_id, record)
+        return replayed, 200
+
+    return await answer_inflight.arun_once(
+        inflight_key(record_id, idempotency_key),
+        lambda: run_answer_turn(record_id, record, answer_text, time_spent, idempotency_key, base_path)
+    )
+
+
+ASYNC_ROUTES = {
+    "/interview/start_candidate": start_candidate_interview,
+    "/interview/answer": answer,
+}
+
+
+# ===================================================================
+# ASGI app
+# ===================================================================
+class AsyncInterviewApp:
+    """
+    ASGI app phục vụ các route phỏng vấn async; mọi request khác
+    được chuyển cho `fallback` (Flask app đã bọc bằng WsgiToAsgi).
+    """
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        handler = None
+        if scope["type"] == "http" and scope.get("method") == "POST":
+            handler = ASYNC_ROUTES.get(scope["path"])
+
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        user = load_session_user(self.flask_app, scope)
+        if not user:
+            await send_json(send, {
+                "success": False,
+                "error": "Unauthorized - Please login",
+                "redirect": "/login"
+            }, 401)
+            return
+
+        try:
+            data = await read_json(receive)
+            header_key = get_header(scope, b"idempotency-key")
+            if header_key:
+                data.setdefault("idempotency_key", header_key)
+            payload, status = await handler(data, user.get("id"), get_base_path(scope))
+        except RateLimitedError as e:
+            payload = rate_limited_payload(e)
+            await send_json(send, payload, 503, [(b"retry-after", str(payload["retry_after"]).encode())])
+            return
+        except Exception as e:
+            traceback.print_exc()
+            payload, status = {"error": str(e)}, 500
+
+        await send_json(send, payload, status)
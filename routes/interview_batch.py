@@ -4,6 +4,7 @@ Routes quản lý batch (tạo, xóa, export, update status)
 """
 
 import csv
+import threading
 from io import StringIO
 from datetime import datetime
 from flask import Blueprint, jsonify, request, Response
@@ -13,8 +14,14 @@ from langchain_community.vectorstores import FAISS
 
 from BuildVectorStores import list_vectorstores
 from config import Config
-from extensions import db_batches, db_records, db_vectorstores, embedding_manager, llm_service
-from extension import build_cv_vectorstore_from_candidates, summarize_knowledge_with_llm, KnowledgeBuilder
+from extensions import (
+    db_batches, db_records, db_vectorstores, db_question_bank, embedding_manager, llm_service, record_cache,
+    context_cache, prefix_cached_llm
+)
+from extension import (
+    build_cv_vectorstore_from_candidates, summarize_knowledge_with_llm, KnowledgeBuilder,
+    pregenerate_question_bank
+)
 
 batch_bp = Blueprint('batch', __name__)
 
@@ -131,6 +138,17 @@ def create_interview_batch():
 
         result = db_batches.insert_one(batch_doc)
 
+        # ✅ Sinh trước ngân hàng câu hỏi ở background (không chặn response)
+        if data["config"].get("use_question_bank"):
+            threading.Thread(
+                target=pregenerate_question_bank,
+                args=(
+                    str(result.inserted_id), data["topic"], knowledge_text, report,
+                    data["config"], llm_service
+                ),
+                daemon=True
+            ).start()
+
         return jsonify({
             "success": True,
             "session_id": str(result.inserted_id),
@@ -289,6 +307,10 @@ def delete_interview_batch(batch_id):
     if result.deleted_count > 0:
         # Xóa các records liên quan
         db_records.delete_many({"batch_id": batch_id})
+        db_question_bank.delete_many({"batch_id": batch_id})
+        record_cache.evict_batch(batch_id)
+        context_cache.pop(batch_id, None)
+        prefix_cached_llm.release_batch(batch_id)
         return jsonify({"success": True})
 
     return jsonify({"success": False, "error": "Delete failed"}), 500
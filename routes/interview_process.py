@@ -3,33 +3,75 @@
 Routes xử lý tiến trình phỏng vấn (start, answer, resume)
 """
 
+import json
+import math
+import os
+import queue
 import re
-from dataclasses import asdict
+import threading
+import traceback
 from datetime import datetime
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, g
 from bson import ObjectId
 from langchain_community.vectorstores import FAISS
 
 from config import Config
+from gemini_pool import RateLimitedError
 from extensions import (
-    db_batches, db_records,
-    embedding_manager, interview_processor, context_cache
+    db_batches, db_records, db_question_bank,
+    embedding_manager, interview_processor, context_cache, prefix_cached_llm, record_cache, audio_cache,
+    answer_inflight
 )
-from utils import to_mongo_safe, to_json_safe
+from idempotency import normalize_key
+from record_codec import codec_for, json_default
+from timing import StageTimings, current_timings, timed
 from routes.audio import create_audio_from_text
 from LLMInterviewer4 import (
     InterviewConfig, InterviewContext, InterviewRecord,
-    classify_level_from_score, Level, QuestionDifficulty,
-    InterviewPhase, QuestionAttempt
+    classify_level_from_score, Level,
+    QuestionAttempt, RecordChangeSet, RecordSnapshot, build_batch_prefix
 )
 
 interview_bp = Blueprint('interview', __name__)
 
+RECORD_CODEC = codec_for(InterviewRecord)
+ATTEMPT_CODEC = codec_for(QuestionAttempt)
+CONFIG_CODEC = codec_for(InterviewConfig)
+
+
+@interview_bp.before_request
+def start_stage_timings():
+    """Đo thời gian từng giai đoạn của request (xem timing.py)."""
+    g.stage_timings = StageTimings()
+    current_timings.set(g.stage_timings)
+
+
+@interview_bp.after_request
+def add_server_timing(response):
+    timings = g.pop("stage_timings", None)
+    if timings is not None:
+        response.headers["Server-Timing"] = timings.header()
+    return response
+
 
 def get_base_path():
     return '/iview1' if 'fit.neu.edu.vn' in request.host else ''
 
 
+def rate_limited_payload(error: RateLimitedError) -> dict:
+    """Payload 503 khi mọi API key đều hết quota: client đợi `retry_after` giây rồi gửi lại."""
+    return {
+        "error": "Hệ thống đang quá tải, vui lòng thử lại sau ít giây.",
+        "rate_limited": True,
+        "retry_after": math.ceil(error.retry_after)
+    }
+
+
+def rate_limited_response(error: RateLimitedError):
+    payload = rate_limited_payload(error)
+    return jsonify(payload), 503, {"Retry-After": str(payload["retry_after"])}
+
+
 # routes/interview_process.py (thêm vào đầu file)
 
 from flask import session  # ← Thêm import
@@ -88,15 +130,38 @@ def wakeup_context(batch_id: str):
         allow_dangerous_deserialization=True
     )
 
+    # Load knowledge vectorstore (để chấm điểm chỉ dùng các chunk liên quan)
+    knowledge_db = None
+    try:
+        knowledge_db = FAISS.load_local(
+            batch_info["knowledge_vectorstore_path"],
+            embedding_model,
+            allow_dangerous_deserialization=True
+        )
+    except Exception as e:
+        print(f"⚠️ Không load được knowledge vectorstore cho batch {batch_id}: {e}")
+
     # Build context
     context = InterviewContext(
         topic=batch_info["topic"],
         outline=batch_info["outline"],
         knowledge_text=batch_info["knowledge_text"],
         outline_summary=batch_info["knowledge_summary"],
-        config=InterviewConfig(**batch_info["config"])
+        config=CONFIG_CODEC.decode(batch_info["config"]),
+        knowledge_db=knowledge_db
     )
 
+    # Load ngân hàng câu hỏi sinh trước (nếu batch bật)
+    if context.config.use_question_bank:
+        for q in db_question_bank.find({"batch_id": batch_id}, {"_id": 0, "batch_id": 0, "created_at": 0}):
+            context.question_bank.setdefault(q["difficulty"], []).append(q)
+
+    # Tạo cached-content handle cho prefix tĩnh của batch (một lần / batch)
+    if context.config.prompt_prefix_cache:
+        context.prefix_cache_handle = prefix_cached_llm.register(
+            build_batch_prefix(context.topic, context.knowledge_text, context.outline_summary), batch_id
+        )
+
     # Cache it
     context_cache[batch_id] = (cv_db, context)
     print(f"⚡ Cache context cho batch {batch_id} (topic: {batch_info['topic']})")
@@ -104,13 +169,338 @@ def wakeup_context(batch_id: str):
     return cv_db, context
 
 
+# ===================================================================
+# Helpers dùng chung (route sync + route async trong routes/interview_async.py)
+# ===================================================================
+def build_completed_payload(existing_record: dict, candidate_name: str) -> dict:
+    """Response cho thí sinh đã hoàn thành phỏng vấn."""
+    return {
+        "success": True,
+        "already_completed": True,
+        "record_id": str(existing_record["_id"]),
+        "summary": {
+            "candidate_info": {
+                "name": candidate_name,  # ✅ Chỉ tên
+                "classified_level": existing_record.get("classified_level", "")
+            },
+            "interview_stats": {
+                "final_score": existing_record.get("final_score", 0),
+                "total_questions": existing_record.get("total_questions_asked", 0),
+                "timestamp": existing_record.get("created_at", "")
+            },
+            "question_history": [
+                {
+                    "question_number": idx + 1,
+                    "difficulty": q["difficulty"],
+                    "question": q["question"],
+                    "answer": q["answer"],
+                    "score": q["score"],
+                    "analysis": q["analysis"],
+                    "time_limit": q.get("time_limit", 60),
+                    "time_spent": q.get("time_spent", 0)
+                }
+                for idx, q in enumerate(existing_record.get("history", []))
+            ]
+        }
+    }
+
+
+def find_candidate_profile(cv_db, candidate_name: str):
+    """
+    Query CV vectorstore bằng tên và phân loại level từ điểm 40%.
+    Returns: (profile_text, level) hoặc None nếu không tìm thấy hồ sơ
+    """
+    profile_docs = cv_db.similarity_search(candidate_name, k=1)
+    if not profile_docs:
+        return None
+
+    profile_text = profile_docs[0].page_content
+
+    # ✅ Classify level từ điểm
+    score_match = re.search(r'Điểm 40%[:\s]+([0-9.]+)', profile_text)
+    level = classify_level_from_score(float(score_match.group(1))) if score_match else Level.TRUNG_BINH
+    return profile_text, level
+
+
+def save_started_record(new_record: InterviewRecord, existing_record, candidate_name: str) -> str:
+    """Insert record mới hoặc reset record cũ (chưa hoàn thành). Returns: record_id"""
+    record_dict = RECORD_CODEC.encode(new_record)
+
+    if existing_record:
+        record_dict["created_at"] = existing_record.get("created_at")
+        record_dict["reset_count"] = existing_record.get("reset_count", 0) + 1
+        record_dict["last_reset_at"] = datetime.utcnow().isoformat()
+        # Tăng version → request /answer đang chạy trên record cũ sẽ không ghi đè được record mới
+        record_dict["version"] = existing_record.get("version", 0) + 1
+
+        db_records.replace_one(
+            {"_id": existing_record["_id"]},
+            record_dict
+        )
+        print(f"🔄 Reset record cho {candidate_name} (lần {record_dict['reset_count']})")
+        record_id = str(existing_record["_id"])
+        new_record.version = record_dict["version"]
+    else:
+        result = db_records.insert_one(record_dict)
+        print(f"🆕 Tạo record mới cho {candidate_name}")
+        record_id = str(result.inserted_id)
+
+    # Lượt /answer đầu tiên không phải đọc lại record vừa ghi (thay luôn bản cũ nếu đang reset)
+    record_cache.put(record_id, new_record)
+    return record_id
+
+
+def build_start_payload(record_id: str, first_q_data: dict, level: Level,
+                        audio_id, existing_record, base_path: str) -> dict:
+    """Response cho câu hỏi đầu tiên của lượt phỏng vấn."""
+    return {
+        "success": True,
+        "already_completed": False,
+        "record_id": record_id,
+        "question": first_q_data["question"],
+        "difficulty": first_q_data["difficulty"],
+        "time_limit": first_q_data["time_limit"],
+        "level": level.value,
+        "phase": "warmup",
+        "audio_id": audio_id,
+        "audio_url": f"{base_path}/audio/{audio_id}" if audio_id else None,
+        "is_resumed": existing_record is not None and not existing_record.get("is_finished")
+    }
+
+
+def resume_pending_question(existing_record: dict, base_path: str):
+    """
+    Resume record chưa hoàn thành: trả lại câu hỏi đang chờ (attempt cuối) cùng thời gian còn lại
+    và audio đã tạo, không gọi LLM (chỉ TTS lại nếu file audio đã bị dọn).
+    Returns: payload như /start_candidate, hoặc None nếu record không có câu hỏi đang chờ.
+    """
+    record = deserialize_record(existing_record)
+    pending = interview_processor.pending_question(record)
+    if not pending:
+        return None
+
+    record_id = str(existing_record["_id"])
+    audio_id = pending["audio_id"]
+    audio = audio_cache.get(audio_id) if audio_id else None
+    if not audio or not os.path.exists(audio["path"]):
+        with timed("tts"):
+            audio_id = create_audio_from_text(pending["question"])
+        store_question_audio(record_id, record, audio_id)
+
+    record_cache.put(record_id, record)
+    print(f"⏯️ Resume {record.candidate_name} ở câu {pending['question_number']} (còn {pending['remaining_time']}s)")
+    return {
+        "success": True,
+        "already_completed": False,
+        "record_id": record_id,
+        "question": pending["question"],
+        "difficulty": pending["difficulty"],
+        "time_limit": pending["time_limit"],
+        "remaining_time": pending["remaining_time"],
+        "question_number": pending["question_number"],
+        "level": record.classified_level.value,
+        "phase": pending["phase"],
+        "audio_id": audio_id,
+        "audio_url": f"{base_path}/audio/{audio_id}" if audio_id else None,
+        "is_resumed": True,
+        "resumed_pending_question": True
+    }
+
+
+def deserialize_record(record_data: dict) -> InterviewRecord:
+    """Chuyển document MongoDB thành InterviewRecord (khôi phục Enum, bỏ qua `_id`, `reset_count`, ...)."""
+    return RECORD_CODEC.decode(record_data)
+
+
+def load_answer_record(record_id: str):
+    """
+    Record cho một lượt trả lời: lấy từ record_cache nếu lượt trước vừa ghi xong (bỏ qua đọc
+    MongoDB + khôi phục Enum), không có thì đọc DB.
+    Returns: (record, None) hoặc (None, (payload, status)) khi lỗi.
+    """
+    record = record_cache.take(record_id)
+    if record is not None:
+        return record, None
+
+    with timed("mongo_load"):
+        record_data = db_records.find_one({"_id": ObjectId(record_id)})
+    if not record_data:
+        return None, ({"error": "Luợt phỏng vấn không hợp lệ"}, 404)
+
+    try:
+        with timed("deserialize"):
+            return deserialize_record(record_data), None
+    except Exception as e:
+        return None, ({"error": f"Lỗi dữ liệu bản ghi: {e}"}, 500)
+
+
+CONFLICT_PAYLOAD = {
+    "error": "Câu trả lời này đã được xử lý bởi một yêu cầu khác. Vui lòng tải lại trang để tiếp tục.",
+    "conflict": True
+}
+
+
+def version_query(record_id: str, version: int) -> dict:
+    """Query record theo id + version (record cũ chưa có field version = 0 khi deserialize)."""
+    return {"_id": ObjectId(record_id), "version": version if version else {"$in": [0, None]}}
+
+
+def save_answered_record(record_id: str, changes: RecordChangeSet, version: int) -> bool:
+    """
+    Ghi delta của lượt vừa xử lý (field đổi + attempt sửa/thêm) thay vì ghi đè cả document.
+    Dùng update pipeline một bước: `$set` các field + nối history phía server
+    (`$set history.<i>` và `$push history` không dùng chung được trong một update).
+    Chỉ ghi khi `version` trong DB chưa đổi (optimistic locking).
+
+    Returns: False nếu record đã bị request khác ghi trước → không ghi gì.
+    """
+    update = {name: {"$literal": RECORD_CODEC.encode_field(name, value)} for name, value in changes.fields.items()}
+
+    tail = {"$literal": [ATTEMPT_CODEC.encode(attempt) for attempt in changes.history_tail]}
+    if changes.history_start == 0:
+        update["history"] = tail
+    elif changes.history_tail:
+        update["history"] = {"$concatArrays": [{"$slice": ["$history", changes.history_start]}, tail]}
+    update["version"] = version + 1
+
+    result = db_records.update_one(version_query(record_id, version), [{"$set": update}])
+    if result.matched_count == 0:
+        print(f"⚠️ Record {record_id} đã bị ghi bởi request khác (version {version}) → bỏ lượt này")
+        record_cache.evict(record_id)
+        return False
+    return True
+
+
+def cache_answered_record(record_id: str, record: InterviewRecord):
+    """Sau khi `save_answered_record` thành công: record (version mới) = bản trong DB → giữ cho lượt sau."""
+    record.version += 1
+    record_cache.put(record_id, record)
+
+
+def store_question_audio(record_id: str, record: InterviewRecord, audio_id):
+    """Lưu audio_id vào câu hỏi đang chờ (attempt cuối) để resume dùng lại; record đã bị reset thì bỏ qua."""
+    if not audio_id or not record.history:
+        return
+    record.history[-1].audio_id = audio_id
+    db_records.update_one(
+        version_query(record_id, record.version),
+        {"$set": {f"history.{len(record.history) - 1}.audio_id": audio_id}}
+    )
+
+
+# Field của response cần để phát lại một lượt; response kết thúc chỉ giữ "finished"
+# (summary + lời kết đọc lại từ record khi phát lại, không lưu thêm một bản trong last_answer)
+REPLAY_FIELDS = ("finished", "score", "analysis", "next_question", "difficulty", "time_limit", "phase")
+
+
+def remember_answer(record: InterviewRecord, idempotency_key, payload: dict):
+    """Lưu response (chưa có audio) của lượt này lên record → được ghi cùng delta trong `save_answered_record`."""
+    if idempotency_key:
+        response = {name: payload[name] for name in REPLAY_FIELDS if name in payload}
+        record.last_answer = {"key": idempotency_key, "response": response}
+
+
+def replay_answer(record: InterviewRecord, idempotency_key, base_path: str):
+    """
+    Response đã lưu nếu lượt có cùng idempotency key đã được xử lý (request gửi lại / double-click),
+    gắn lại audio của câu hỏi đang chờ. Returns: payload hoặc None nếu key chưa được xử lý.
+    """
+    last_answer = record.last_answer
+    if not idempotency_key or not last_answer or last_answer.get("key") != idempotency_key:
+        return None
+    response = last_answer["response"]
+    if response.get("finished"):
+        payload = build_finished_payload({
+            "summary": record.summary or {},
+            "closing_pending": record.closing_message is None
+        })
+    else:
+        payload = dict(response)
+        if "next_question" in payload and record.history:
+            attach_audio(payload, record.history[-1].audio_id, base_path)
+    answer_inflight.count_replay()
+    print(f"♻️ Request trùng idempotency key {idempotency_key} → trả lại response đã lưu")
+    return payload
+
+
+def replay_after_conflict(record_id: str, idempotency_key, base_path: str):
+    """Ghi bị chặn vì request khác đã ghi trước: nếu đó là request cùng key thì trả lại response của nó."""
+    if not idempotency_key:
+        return None
+    record_data = db_records.find_one({"_id": ObjectId(record_id)})
+    return replay_answer(deserialize_record(record_data), idempotency_key, base_path) if record_data else None
+
+
+def check_before_turn(record_id: str, record: InterviewRecord, idempotency_key, base_path: str):
+    """
+    Gọi khi đã giữ quyền chạy lượt (trong `answer_inflight.run_once`), TRƯỚC mọi lần gọi LLM.
+    Record được load trước khi vào `run_once` có thể đã cũ: request cùng key vừa chạy xong và ghi
+    trước đó → phát lại response của nó; request khác đã ghi → lượt này đằng nào cũng bị optimistic
+    locking chặn, trả 409 luôn thay vì chấm điểm + TTS rồi mới bỏ.
+    Returns: (payload, status) nếu không chạy lượt này, None nếu record vẫn là bản mới nhất.
+    """
+    if not idempotency_key:
+        return None
+    current = db_records.find_one({"_id": ObjectId(record_id)}, {"version": 1, "last_answer.key": 1})
+    if not current or (current.get("version") or 0) == record.version:
+        return None
+    replayed = None
+    if (current.get("last_answer") or {}).get("key") == idempotency_key:
+        replayed = replay_after_conflict(record_id, idempotency_key, base_path)
+    return (replayed, 200) if replayed else (CONFLICT_PAYLOAD, 409)
+
+
+def inflight_key(record_id: str, idempotency_key):
+    return f"{record_id}:{idempotency_key}" if idempotency_key else None
+
+
+def build_finished_payload(api_result: dict) -> dict:
+    """✅ MỚI: Nếu finished, trả về closing_message riêng"""
+    # api_result["summary"] đã chứa closing_message từ processor
+    return {
+        "finished": True,
+        "closing_message": api_result["summary"].get("closing_message", "Cảm ơn bạn đã tham gia!"),
+        "closing_pending": api_result.get("closing_pending", False),  # FE hỏi lại /closing/<id> để lấy lời kết LLM
+        "summary": api_result["summary"]  # Vẫn gửi summary để FE dùng sau
+    }
+
+
+def store_closing_message(record_id: str, closing_message: str):
+    """Ghi lời kết LLM lên record (thay cho lời kết mặc định trong summary)."""
+    db_records.update_one(
+        {"_id": ObjectId(record_id)},
+        {"$set": {"closing_message": closing_message, "summary.closing_message": closing_message}}
+    )
+
+
+def schedule_closing_message(record_id: str, record: InterviewRecord, context: InterviewContext):
+    """Sinh lời kết bằng LLM ở thread nền, response cuối đã trả về với lời kết mặc định."""
+    def run():
+        try:
+            store_closing_message(record_id, interview_processor.generate_closing_message_for(record, context))
+        except Exception as e:
+            print(f"⚠️ Lỗi sinh lời kết nền cho record {record_id}: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def attach_audio(api_result: dict, audio_id, base_path: str) -> dict:
+    """Gắn audio của câu hỏi tiếp theo vào kết quả API."""
+    if audio_id:
+        api_result["audio_id"] = audio_id
+        api_result["audio_url"] = f"{base_path}/audio/{audio_id}"
+    return api_result
+
+
 # ===================================================================
 # Start/Resume Interview
 # ===================================================================
 @interview_bp.route("/start_candidate", methods=["POST"])
 def start_candidate_interview():
     """
-    Bắt đầu hoặc tiếp tục phỏng vấn
+    Bắt đầu hoặc tiếp tục phỏng vấn.
+    Record chưa hoàn thành → trả lại câu hỏi đang chờ (không sinh câu mới);
+    `restart: true` → bỏ record cũ, bắt đầu lại từ đầu.
     """
     auth_error = require_auth()
     if auth_error:
@@ -124,108 +514,67 @@ def start_candidate_interview():
         candidate_name = data["candidate_name"]  # ✅ Chỉ cần tên
 
         # ✅ THAY ĐỔI: Không verify ownership của batch
-        if not verify_batch_ownership(batch_id, user_id):
+        with timed("mongo_load"):
+            owned = verify_batch_ownership(batch_id, user_id)
+        if not owned:
             return jsonify({
                 "success": False,
                 "error": "Permission denied - You can only access your own interview batches"
             }), 403
 
         # ✅ BƯỚC 1: Tìm record đã tồn tại (dùng candidate_name trực tiếp)
-        existing_record = db_records.find_one({
-            "batch_id": batch_id,
-            "candidate_name": candidate_name  # ✅ Không cần thêm class
-        })
+        with timed("mongo_load"):
+            existing_record = db_records.find_one({
+                "batch_id": batch_id,
+                "candidate_name": candidate_name  # ✅ Không cần thêm class
+            })
 
         # ✅ BƯỚC 2: Nếu đã hoàn thành → Trả về summary
         if existing_record and existing_record.get("is_finished"):
-            return jsonify({
-                "success": True,
-                "already_completed": True,
-                "record_id": str(existing_record["_id"]),
-                "summary": {
-                    "candidate_info": {
-                        "name": candidate_name,  # ✅ Chỉ tên
-                        "classified_level": existing_record.get("classified_level", "")
-                    },
-                    "interview_stats": {
-                        "final_score": existing_record.get("final_score", 0),
-                        "total_questions": existing_record.get("total_questions_asked", 0),
-                        "timestamp": existing_record.get("created_at", "")
-                    },
-                    "question_history": [
-                        {
-                            "question_number": idx + 1,
-                            "difficulty": q["difficulty"],
-                            "question": q["question"],
-                            "answer": q["answer"],
-                            "score": q["score"],
-                            "analysis": q["analysis"],
-                            "time_limit": q.get("time_limit", 60),
-                            "time_spent": q.get("time_spent", 0)
-                        }
-                        for idx, q in enumerate(existing_record.get("history", []))
-                    ]
-                }
-            })
+            return jsonify(build_completed_payload(existing_record, candidate_name))
+
+        # ✅ Chưa hoàn thành → trả lại câu hỏi đang chờ (trừ khi FE yêu cầu làm lại từ đầu)
+        if existing_record and not data.get("restart"):
+            with timed("resume"):
+                resumed = resume_pending_question(existing_record, get_base_path())
+            if resumed:
+                return jsonify(resumed)
 
         # ✅ BƯỚC 3-6: Wakeup context & tạo record mới
-        cv_db, context = wakeup_context(batch_id)
+        with timed("wakeup_context"):
+            cv_db, context = wakeup_context(batch_id)
 
-        # ✅ Query CV vectorstore bằng tên trực tiếp
-        profile_docs = cv_db.similarity_search(candidate_name, k=1)
-        if not profile_docs:
+        with timed("profile_search"):
+            profile = find_candidate_profile(cv_db, candidate_name)
+        if not profile:
             return jsonify({"error": f"Không tìm thấy hồ sơ {candidate_name}"}), 404
-
-        profile_text = profile_docs[0].page_content
-
-        # ✅ Classify level từ điểm
-        score_match = re.search(r'Điểm 40%[:\s]+([0-9.]+)', profile_text)
-        level = classify_level_from_score(float(score_match.group(1))) if score_match else Level.TRUNG_BINH
+        profile_text, level = profile
 
         # ✅ Tạo record mới
-        new_record, first_q_data = interview_processor.start_new_record(
-            batch_id,
-            candidate_name,  # ✅ Chỉ cần tên
-            profile_text,
-            level,
-            context
-        )
-
-        record_dict = to_mongo_safe(asdict(new_record))
-
-        if existing_record:
-            record_dict["created_at"] = existing_record.get("created_at")
-            record_dict["reset_count"] = existing_record.get("reset_count", 0) + 1
-            record_dict["last_reset_at"] = datetime.utcnow().isoformat()
-
-            db_records.replace_one(
-                {"_id": existing_record["_id"]},
-                record_dict
+        with timed("process"):
+            new_record, first_q_data = interview_processor.start_new_record(
+                batch_id,
+                candidate_name,  # ✅ Chỉ cần tên
+                profile_text,
+                level,
+                context
             )
-            record_id = str(existing_record["_id"])
-            print(f"🔄 Reset record cho {candidate_name} (lần {record_dict['reset_count']})")
-        else:
-            result = db_records.insert_one(record_dict)
-            record_id = str(result.inserted_id)
-            print(f"🆕 Tạo record mới cho {candidate_name}")
+
+        with timed("persist"):
+            record_id = save_started_record(new_record, existing_record, candidate_name)
 
         # ✅ Tạo audio
-        audio_id = create_audio_from_text(first_q_data["question"])
+        with timed("tts"):
+            audio_id = create_audio_from_text(first_q_data["question"])
+        with timed("persist"):
+            store_question_audio(record_id, new_record, audio_id)
 
-        return jsonify({
-            "success": True,
-            "already_completed": False,
-            "record_id": record_id,
-            "question": first_q_data["question"],
-            "difficulty": first_q_data["difficulty"],
-            "time_limit": first_q_data["time_limit"],
-            "level": level.value,
-            "phase": "warmup",
-            "audio_id": audio_id,
-            "audio_url": f"{get_base_path()}/audio/{audio_id}" if audio_id else None,
-            "is_resumed": existing_record is not None and not existing_record.get("is_finished")
-        })
+        return jsonify(build_start_payload(
+            record_id, first_q_data, level, audio_id, existing_record, get_base_path()
+        ))
 
+    except RateLimitedError as e:
+        return rate_limited_response(e)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -233,9 +582,61 @@ def start_candidate_interview():
 # ===================================================================
 # Answer Question
 # ===================================================================
+def run_answer_turn(record_id: str, record: InterviewRecord, answer_text: str, time_spent,
+                    idempotency_key, base_path: str):
+    """Một lượt /answer: chấm điểm + sinh câu tiếp → ghi delta → TTS. Returns: (payload, status)"""
+    # ✅ Record đã cũ (request cùng key vừa ghi xong) → phát lại, không gọi LLM
+    with timed("mongo_load"):
+        skipped = check_before_turn(record_id, record, idempotency_key, base_path)
+    if skipped:
+        return skipped
+
+    # ✅ Wake up context
+    with timed("wakeup_context"):
+        _, context = wakeup_context(record.batch_id)
+    was_finished = record.is_finished
+    snapshot = RecordSnapshot(record)
+
+    # ✅ Process answer (truyền time_spent vào)
+    with timed("process"):
+        updated_record, api_result = interview_processor.process_answer(
+            record, context, answer_text, time_spent
+        )
+    finished = api_result.get("finished")
+    payload = build_finished_payload(api_result) if finished else api_result
+
+    # ✅ Update MongoDB (record đã kết thúc từ trước thì không đổi gì → không ghi đè)
+    if not was_finished:
+        remember_answer(updated_record, idempotency_key, payload)
+        with timed("persist"):
+            saved = save_answered_record(record_id, snapshot.changes(updated_record), record.version)
+        if not saved:
+            replayed = replay_after_conflict(record_id, idempotency_key, base_path)
+            return (replayed, 200) if replayed else (CONFLICT_PAYLOAD, 409)
+        cache_answered_record(record_id, updated_record)
+
+    if finished:
+        if not was_finished and api_result.get("closing_pending"):
+            schedule_closing_message(record_id, updated_record, context)
+        return payload, 200
+
+    # ✅ Sinh audio cho câu hỏi tiếp theo (nếu chưa finished)
+    if "next_question" in api_result:
+        with timed("tts"):
+            audio_id = create_audio_from_text(api_result["next_question"])
+        with timed("persist"):
+            store_question_audio(record_id, updated_record, audio_id)
+        attach_audio(api_result, audio_id, base_path)
+
+    return api_result, 200
+
+
 @interview_bp.route("/answer", methods=["POST"])
 def answer():
-    """Xử lý câu trả lời và sinh câu hỏi tiếp theo"""
+    """
+    Xử lý câu trả lời và sinh câu hỏi tiếp theo.
+    `idempotency_key` (body hoặc header Idempotency-Key): gửi lại cùng key → không chấm lại (xem idempotency.py)
+    """
 
     # ✅ THÊM: Kiểm tra auth
     auth_error = require_auth()
@@ -251,70 +652,270 @@ def answer():
         record_id = data["record_id"]
         answer_text = data["answer"]
         time_spent = data.get("time_spent", 0)
+        idempotency_key = normalize_key(data.get("idempotency_key") or request.headers.get("Idempotency-Key"))
+        base_path = get_base_path()
 
-        # ✅ Load record từ MongoDB
-        record_data = db_records.find_one({"_id": ObjectId(record_id)})
-        if not record_data:
-            return jsonify({
-                "error": f"Luợt phỏng vấn không hợp lệ"
-            }), 404
+        # ✅ Load record (record_cache hoặc MongoDB)
+        record, error = load_answer_record(record_id)
+        if error:
+            payload, status = error
+            return jsonify(payload), status
 
         # ✅ THÊM: Kiểm tra ownership qua batch_id
-        batch_id = record_data.get("batch_id")
-        if not verify_batch_ownership(batch_id, user_id):
+        with timed("mongo_load"):
+            owned = verify_batch_ownership(record.batch_id, user_id)
+        if not owned:
             return jsonify({
                 "success": False,
                 "error": "Permission denied"
             }), 403
 
-        # ✅ Deserialize
-        record_data.pop('_id', None)
+        # ✅ Request gửi lại / double-click của lượt đã xử lý → trả response đã lưu
+        replayed = replay_answer(record, idempotency_key, base_path)
+        if replayed:
+            record_cache.put(record_id, record)
+            return jsonify(replayed)
+
+        # ✅ Request trùng key đang chạy → đợi và dùng chung kết quả
+        payload, status = answer_inflight.run_once(
+            inflight_key(record_id, idempotency_key),
+            lambda: run_answer_turn(record_id, record, answer_text, time_spent, idempotency_key, base_path)
+        )
+        return jsonify(payload), status
+
+    except RateLimitedError as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ===================================================================
+# Closing message (sinh nền sau khi kết thúc)
+# ===================================================================
+@interview_bp.route("/closing/<record_id>", methods=["GET"])
+def get_closing_message(record_id):
+    """Lời kết đã lưu của record; `ready` = False nếu LLM vẫn đang sinh (FE giữ lời kết mặc định)."""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    record_data = db_records.find_one(
+        {"_id": ObjectId(record_id)},
+        {"batch_id": 1, "closing_message": 1, "summary.closing_message": 1}
+    )
+    if not record_data:
+        return jsonify({"error": "Luợt phỏng vấn không hợp lệ"}), 404
+
+    if not verify_batch_ownership(record_data.get("batch_id"), get_current_user_id()):
+        return jsonify({"success": False, "error": "Permission denied"}), 403
+
+    closing_message = record_data.get("closing_message")
+    return jsonify({
+        "ready": closing_message is not None,
+        "closing_message": closing_message or (record_data.get("summary") or {}).get("closing_message")
+    })
+
+
+# ===================================================================
+# Streaming (SSE): stream câu hỏi tiếp theo trong lúc LLM đang sinh
+# ===================================================================
+def sse_event(event: str, payload: dict) -> str:
+    """Định dạng một event Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=json_default)}\n\n"
+
+
+def sse_response(worker):
+    """
+    Chạy `worker(emit)` ở thread nền và stream các event nó emit ra dạng SSE.
+    Worker không được dùng `request`/`session` (đã ra khỏi request context).
+    """
+    events = queue.Queue()
+
+    def emit(event: str, payload: dict):
+        events.put((event, payload))
+
+    def run():
         try:
-            record_data['history'] = [
-                QuestionAttempt(**{**att, "difficulty": QuestionDifficulty(att["difficulty"])})
-                for att in record_data['history']
-            ]
-            record_data['classified_level'] = Level(record_data['classified_level'])
-            record_data['current_difficulty'] = QuestionDifficulty(record_data['current_difficulty'])
-            record_data['current_phase'] = InterviewPhase(record_data['current_phase'])
+            worker(emit)
+        except RateLimitedError as e:
+            emit("error", rate_limited_payload(e))
         except Exception as e:
-            return jsonify({"error": f"Lỗi dữ liệu bản ghi: {e}"}), 500
+            traceback.print_exc()
+            emit("error", {"error": str(e)})
+        finally:
+            events.put(None)
 
-        record_data.pop("reset_count", None)
-        record_data.pop("last_reset_at", None)
-        record = InterviewRecord(**record_data)
+    threading.Thread(target=run, daemon=True).start()
 
-        # ✅ Wake up context
-        _, context = wakeup_context(record.batch_id)
+    def stream():
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            yield sse_event(*item)
 
-        # ✅ Process answer (truyền time_spent vào)
-        updated_record, api_result = interview_processor.process_answer(
-            record, context, answer_text, time_spent
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Tắt buffer của nginx để event tới client ngay
+    })
+
+
+@interview_bp.route("/start_candidate_stream", methods=["POST"])
+def start_candidate_stream():
+    """
+    Bản streaming của /start_candidate.
+    Events: completed | delta {text} → question {payload như /start_candidate, chưa có audio} → audio {audio_url}
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    data = request.json
+    batch_id = data["session_id"]
+    candidate_name = data["candidate_name"]
+    base_path = get_base_path()
+
+    if not verify_batch_ownership(batch_id, get_current_user_id()):
+        return jsonify({
+            "success": False,
+            "error": "Permission denied - You can only access your own interview batches"
+        }), 403
+
+    def worker(emit):
+        existing_record = db_records.find_one({
+            "batch_id": batch_id,
+            "candidate_name": candidate_name
+        })
+        if existing_record and existing_record.get("is_finished"):
+            emit("completed", build_completed_payload(existing_record, candidate_name))
+            return
+
+        if existing_record and not data.get("restart"):
+            resumed = resume_pending_question(existing_record, base_path)
+            if resumed:
+                emit("question", resumed)
+                emit("audio", attach_audio({}, resumed["audio_id"], base_path))
+                return
+
+        cv_db, context = wakeup_context(batch_id)
+        profile = find_candidate_profile(cv_db, candidate_name)
+        if not profile:
+            emit("error", {"error": f"Không tìm thấy hồ sơ {candidate_name}"})
+            return
+        profile_text, level = profile
+
+        new_record, first_q_data = interview_processor.start_new_record(
+            batch_id, candidate_name, profile_text, level, context,
+            on_delta=lambda text: emit("delta", {"text": text})
         )
+        record_id = save_started_record(new_record, existing_record, candidate_name)
 
-        # ✅ Update MongoDB
-        record_dict = to_mongo_safe(asdict(updated_record))
-        db_records.replace_one({"_id": ObjectId(record_id)}, record_dict)
+        # Gửi câu hỏi trước, TTS sau → FE hiển thị + chạy timer không phải đợi audio
+        emit("question", build_start_payload(record_id, first_q_data, level, None, existing_record, base_path))
+        audio_id = create_audio_from_text(first_q_data["question"])
+        store_question_audio(record_id, new_record, audio_id)
+        emit("audio", attach_audio({}, audio_id, base_path))
 
-        # ✅ MỚI: Nếu finished, trả về closing_message riêng
-        if api_result.get("finished"):
-            # api_result["summary"] đã chứa closing_message từ processor
-            return jsonify({
-                "finished": True,
-                "closing_message": api_result["summary"].get("closing_message", "Cảm ơn bạn đã tham gia!"),
-                "summary": api_result["summary"]  # Vẫn gửi summary để FE dùng sau
-            })
+    return sse_response(worker)
+
+
+def emit_answer_payload(emit, payload: dict, status: int):
+    """Phát một response /answer có sẵn (đã lưu / của request trùng key) thành các event SSE."""
+    if status != 200:
+        emit("error", payload)
+    elif payload.get("finished"):
+        emit("finished", payload)
+    else:
+        emit("question", payload)
+        if payload.get("audio_url"):
+            emit("audio", {"audio_id": payload["audio_id"], "audio_url": payload["audio_url"]})
+
+
+@interview_bp.route("/answer_stream", methods=["POST"])
+def answer_stream():
+    """
+    Bản streaming của /answer.
+    Events: delta {text} → question {payload như /answer, chưa có audio} → audio {audio_url} | finished
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+
+    data = request.json
+    print(f"📩 [stream] Dữ liệu FE gửi đến vào lúc {datetime.utcnow()}:", data)
+
+    record_id = data["record_id"]
+    answer_text = data["answer"]
+    time_spent = data.get("time_spent", 0)
+    idempotency_key = normalize_key(data.get("idempotency_key") or request.headers.get("Idempotency-Key"))
+    base_path = get_base_path()
+
+    record, error = load_answer_record(record_id)
+    if error:
+        payload, status = error
+        return jsonify(payload), status
 
-        # ✅ Sinh audio cho câu hỏi tiếp theo (nếu chưa finished)
+    if not verify_batch_ownership(record.batch_id, get_current_user_id()):
+        return jsonify({"success": False, "error": "Permission denied"}), 403
+
+    replayed = replay_answer(record, idempotency_key, base_path)
+    if replayed:
+        record_cache.put(record_id, record)
+        return sse_response(lambda emit: emit_answer_payload(emit, replayed, 200))
+
+    def run_turn(emit):
+        skipped = check_before_turn(record_id, record, idempotency_key, base_path)
+        if skipped:
+            emit_answer_payload(emit, *skipped)
+            return skipped
+
+        _, context = wakeup_context(record.batch_id)
+        was_finished = record.is_finished
+        snapshot = RecordSnapshot(record)
+
+        updated_record, api_result = interview_processor.process_answer(
+            record, context, answer_text, time_spent,
+            on_delta=lambda text: emit("delta", {"text": text})
+        )
+        finished = api_result.get("finished")
+        payload = build_finished_payload(api_result) if finished else api_result
+
+        if not was_finished:
+            remember_answer(updated_record, idempotency_key, payload)
+            if not save_answered_record(record_id, snapshot.changes(updated_record), record.version):
+                replayed = replay_after_conflict(record_id, idempotency_key, base_path)
+                result = (replayed, 200) if replayed else (CONFLICT_PAYLOAD, 409)
+                emit_answer_payload(emit, *result)
+                return result
+            cache_answered_record(record_id, updated_record)
+
+        if finished:
+            if not was_finished and api_result.get("closing_pending"):
+                schedule_closing_message(record_id, updated_record, context)
+            emit("finished", payload)
+            return payload, 200
+
+        emit("question", api_result)
+        audio = {}
         if "next_question" in api_result:
             audio_id = create_audio_from_text(api_result["next_question"])
-            if audio_id:
-                api_result["audio_id"] = audio_id
-                api_result["audio_url"] = f"{get_base_path()}/audio/{audio_id}"
+            store_question_audio(record_id, updated_record, audio_id)
+            audio = attach_audio({}, audio_id, base_path)
+            emit("audio", audio)
+        return {**api_result, **audio}, 200
 
-        return jsonify(to_json_safe(api_result))
+    def worker(emit):
+        ran = []
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        def run():
+            ran.append(True)
+            return run_turn(emit)
+
+        # Request trùng key đang chạy → đợi rồi phát lại kết quả của request đầu
+        payload, status = answer_inflight.run_once(inflight_key(record_id, idempotency_key), run)
+        if not ran:
+            emit_answer_payload(emit, payload, status)
+
+    return sse_response(worker)
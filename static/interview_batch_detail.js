@@ -7,6 +7,8 @@ const STATE = {
     currentAudio: null,
     autoPlayEnabled: true,
     currentRecordId: null,
+    answerKey: null,        // Idempotency key cho câu trả lời của câu hỏi hiện tại
+    answerKeyFor: null,     // record_id + câu hỏi ứng với answerKey
     basePath: window.location.pathname.startsWith('/iview1') ? '/iview1' : '',
 
     // ✅ TIMER STATE
@@ -17,7 +19,10 @@ const STATE = {
 
     // ✅ VOICE STATE
     recognition: null,
-    isRecording: false
+    isRecording: false,
+
+    // ✅ STREAMING: nhận câu hỏi dần qua SSE (fetch + ReadableStream)
+    streamingEnabled: !!(window.ReadableStream && window.TextDecoder)
 };
 
 // ==================== API CALLS ====================
@@ -53,6 +58,25 @@ async startInterview(sessionId, candidateName) {
 
 
 
+    // ✅ Lời kết LLM được sinh nền sau khi kết thúc; ready=false nghĩa là chưa xong
+    async fetchClosingMessage(recordId) {
+        const response = await fetch(`${STATE.basePath}/interview/closing/${recordId}`);
+        if (!response.ok) return null;
+        return await response.json();
+    },
+
+    // ✅ Một key cho mỗi câu hỏi: gửi lại / double-click dùng lại key → BE không chấm điểm lần hai
+    answerKey() {
+        const target = `${STATE.currentRecordId}|${STATE.currentQuestion}`;
+        if (!STATE.answerKey || STATE.answerKeyFor !== target) {
+            STATE.answerKey = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            STATE.answerKeyFor = target;
+        }
+        return STATE.answerKey;
+    },
+
     async submitAnswer(recordId, candidate, answer, timeSpent) {
         const response = await fetch(`${STATE.basePath}/interview/answer`, {
             method: 'POST',
@@ -61,7 +85,8 @@ async startInterview(sessionId, candidateName) {
                 record_id: recordId,
                 candidate,
                 answer,
-                time_spent: timeSpent  // ✅ THÊM
+                time_spent: timeSpent,  // ✅ THÊM
+                idempotency_key: this.answerKey()
             })
         });
 
@@ -78,6 +103,54 @@ async startInterview(sessionId, candidateName) {
         return await response.json();
     },
 
+    // ✅ STREAMING: POST rồi đọc response dạng Server-Sent Events, gọi onEvent(event, data) cho từng event
+    async streamPost(path, body, onEvent) {
+        const response = await fetch(`${STATE.basePath}${path}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(body)
+        });
+
+        if (response.status === 401) {
+            alert('Vui lòng đăng nhập lại');
+            window.location.href = `${STATE.basePath}/login`;
+            return false;
+        }
+        if (response.status === 403) {
+            alert('Bạn không có quyền truy cập!');
+            return false;
+        }
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || `HTTP ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, {stream: true});
+
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+
+                let event = 'message';
+                let dataText = '';
+                raw.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                });
+                if (dataText) await onEvent(event, JSON.parse(dataText));
+            }
+        }
+        return true;
+    },
+
     async updateCandidateStatus(sessionId, candidateName, status) {
         await fetch(`${STATE.basePath}/interview_batch/update_candidate_status`, {
             method: 'POST',
@@ -471,6 +544,28 @@ displaySessionInfo(data) {
         Timer.resetDisplay(timeLimit);
     },
 
+    // ✅ Hiển thị câu hỏi tiếp theo (kèm badge độ khó), reset timer (chưa chạy)
+    showNextQuestion(question, difficulty, timeLimit) {
+        const difficultyBadge = `
+            <div class="difficulty-badge difficulty-${difficulty}" style="display: inline-block; margin-left: 10px; padding: 4px 12px; border-radius: 6px; font-size: 12px; font-weight: bold;">
+                ${difficulty.replace('_', ' ').toUpperCase()}
+            </div>
+        `;
+
+        document.getElementById('modalQuestion').innerHTML =
+            `<i class="fas fa-robot"></i> ${question}` + difficultyBadge;
+
+        if (window.Prism) Prism.highlightAll();
+        document.getElementById('answerTextarea').value = '';
+
+        Timer.resetDisplay(timeLimit);
+    },
+
+    // ✅ STREAMING: hiển thị phần câu hỏi đã nhận được
+    renderPartialQuestion(text) {
+        document.getElementById('modalQuestion').innerHTML = `<i class="fas fa-robot"></i> ${text}`;
+    },
+
     showCompletedSummary(summary) {
         document.getElementById('modalCandidateName').textContent = summary.candidate_info.name;
         document.getElementById('questionSection').style.display = 'none';
@@ -757,6 +852,11 @@ const Interview = {
         UI.showLoading(true, 'Đang kiểm tra trạng thái phỏng vấn...');
 
         try {
+            if (STATE.streamingEnabled) {
+                await this.startStream(candidateName);
+                return;
+            }
+
             const data = await API.startInterview(STATE.sessionId, candidateName);  // ✅ Chỉ gửi tên
             if (!data || data.error) throw new Error(data?.error || 'Unknown error');
 
@@ -773,7 +873,9 @@ const Interview = {
             }
 
             STATE.currentQuestion = data.question;
-            const timeLimit = data.time_limit || 90;
+            // ✅ Resume câu hỏi đang chờ: đếm tiếp thời gian còn lại thay vì time_limit đầy đủ
+            const resumedPending = data.resumed_pending_question && data.remaining_time != null;
+            const timeLimit = resumedPending ? data.remaining_time : (data.time_limit || 90);
             const difficulty = data.difficulty || 'medium';
 
             UI.updateModalContent(
@@ -785,7 +887,11 @@ const Interview = {
             );
             UI.showModal(true);
 
-            if (data.audio_url) {
+            if (data.audio_url && resumedPending) {
+                // Câu hỏi đã được nghe trước khi tải lại trang -> không tự phát, timer chạy tiếp luôn
+                Audio.showControls(data.audio_url);
+                Timer.start(timeLimit);
+            } else if (data.audio_url) {
                 Audio.showControls(data.audio_url);
                 if (STATE.autoPlayEnabled) {
                     setTimeout(() => Audio.play(data.audio_url), 500);
@@ -830,6 +936,11 @@ const Interview = {
         try {
             const fullName = STATE.currentCandidateName || STATE.currentCandidate.name || "Unknown Candidate";
 
+            if (STATE.streamingEnabled) {
+                await this.submitAnswerStream(fullName, answer || '(Không có câu trả lời)', timeSpent);
+                return;
+            }
+
             // ✅ Gửi time_spent lên BE
             const data = await API.submitAnswer(
                 STATE.currentRecordId,
@@ -842,22 +953,7 @@ const Interview = {
 
             // ✅ MỚI: Xử lý closing message trước
             if (data.finished) {
-                // Cập nhật status
-                await API.updateCandidateStatus(STATE.sessionId, STATE.currentCandidate.name, 'completed');
-                if (STATE.currentCandidate) STATE.currentCandidate.status = 'completed';
-
-                Audio.hideControls();
-                UI.showLoading(false);
-
-                // ✅ Hiển thị lời kết thúc trước
-                UI.showClosingMessage(
-                    data.closing_message || "Cảm ơn bạn đã tham gia buổi phỏng vấn!",
-                    () => {
-                        // Callback: Hiển thị summary sau khi nhấn nút
-                        UI.showCompletedSummary(data.summary);
-                    }
-                );
-
+                await this.showFinished(data);
                 return; // Dừng ở đây, không show summary ngay
             }
 
@@ -870,21 +966,8 @@ const Interview = {
             const timeLimit = data.time_limit || 90;
             const difficulty = data.difficulty || 'medium';
 
-            // Update question với difficulty badge
-            const difficultyBadge = `
-                <div class="difficulty-badge difficulty-${difficulty}" style="display: inline-block; margin-left: 10px; padding: 4px 12px; border-radius: 6px; font-size: 12px; font-weight: bold;">
-                    ${difficulty.replace('_', ' ').toUpperCase()}
-                </div>
-            `;
-
-            document.getElementById('modalQuestion').innerHTML =
-                `<i class="fas fa-robot"></i> ${data.next_question}` + difficultyBadge;
-
-            if (window.Prism) Prism.highlightAll();
-            document.getElementById('answerTextarea').value = '';
-
-            // ✅ Reset timer display (chưa chạy vội)
-            Timer.resetDisplay(timeLimit);
+            // Update question với difficulty badge, reset timer display (chưa chạy vội)
+            UI.showNextQuestion(data.next_question, difficulty, timeLimit);
 
             if (data.audio_url) {
                 Audio.showControls(data.audio_url);
@@ -905,6 +988,118 @@ const Interview = {
         }
     },
 
+    // ✅ Lời kết thúc + summary khi BE báo finished
+    async showFinished(data) {
+        // Cập nhật status
+        await API.updateCandidateStatus(STATE.sessionId, STATE.currentCandidate.name, 'completed');
+        if (STATE.currentCandidate) STATE.currentCandidate.status = 'completed';
+
+        Audio.hideControls();
+        UI.showLoading(false);
+
+        // ✅ Hiển thị lời kết thúc trước
+        UI.showClosingMessage(
+            data.closing_message || "Cảm ơn bạn đã tham gia buổi phỏng vấn!",
+            () => {
+                // Callback: Hiển thị summary sau khi nhấn nút
+                UI.showCompletedSummary(data.summary);
+            }
+        );
+
+        if (data.closing_pending) this.pollClosingMessage(STATE.currentRecordId, data.summary);
+    },
+
+    // ✅ Thay lời kết mặc định bằng lời kết LLM khi BE sinh xong (hỏi lại tối đa ~15s)
+    async pollClosingMessage(recordId, summary, attempts = 10) {
+        for (let i = 0; i < attempts; i++) {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+            const result = await API.fetchClosingMessage(recordId).catch(() => null);
+            if (result && result.ready) {
+                const el = document.querySelector('#resultSection .closing-text');
+                if (el) el.textContent = result.closing_message;
+                if (summary) summary.closing_message = result.closing_message;
+                return;
+            }
+        }
+    },
+
+    // ✅ STREAMING: câu hỏi hiện dần khi LLM đang sinh; timer chạy ngay khi có câu hỏi (không đợi TTS)
+    async startStream(candidateName) {
+        let streamed = '';
+        let resumedPending = false;  // Câu hỏi đang chờ đã được nghe trước khi tải lại trang -> không tự phát
+        const ok = await API.streamPost(
+            '/interview/start_candidate_stream',
+            {session_id: STATE.sessionId, candidate_name: candidateName},
+            async (event, data) => {
+                if (event === 'error') throw new Error(data.error || 'Unknown error');
+
+                if (event === 'completed') {
+                    STATE.currentRecordId = data.record_id;
+                    UI.showCompletedSummary(data.summary);
+                } else if (event === 'delta') {
+                    if (!streamed) {
+                        UI.showLoading(false);
+                        UI.updateModalContent(candidateName, '', 'medium', 90);
+                        UI.showModal(true);
+                    }
+                    streamed += data.text;
+                    UI.renderPartialQuestion(streamed);
+                } else if (event === 'question') {
+                    await API.updateCandidateStatus(STATE.sessionId, candidateName, 'in_progress');
+                    if (STATE.currentCandidate) STATE.currentCandidate.status = 'in_progress';
+
+                    STATE.currentRecordId = data.record_id;
+                    STATE.currentQuestion = data.question;
+                    resumedPending = Boolean(data.resumed_pending_question && data.remaining_time != null);
+                    const timeLimit = resumedPending ? data.remaining_time : (data.time_limit || 90);
+
+                    UI.showLoading(false);
+                    UI.updateModalContent(candidateName, data.question, data.difficulty || 'medium', timeLimit, data.is_resumed);
+                    UI.showModal(true);
+                    Audio.hideControls();
+                    Timer.start(timeLimit);
+                } else if (event === 'audio' && data.audio_url) {
+                    Audio.showControls(data.audio_url);
+                    if (STATE.autoPlayEnabled && !resumedPending) Audio.play(data.audio_url);
+                }
+            }
+        );
+        if (!ok) UI.showModal(false);
+    },
+
+    async submitAnswerStream(fullName, answer, timeSpent) {
+        let streamed = '';
+        await API.streamPost(
+            '/interview/answer_stream',
+            {
+                record_id: STATE.currentRecordId, candidate: fullName, answer, time_spent: timeSpent,
+                idempotency_key: API.answerKey()
+            },
+            async (event, data) => {
+                if (event === 'error') throw new Error(data.error || 'Unknown error');
+
+                if (event === 'finished') {
+                    await this.showFinished(data);
+                } else if (event === 'delta') {
+                    if (!streamed) UI.showLoading(false);
+                    streamed += data.text;
+                    UI.renderPartialQuestion(streamed);
+                } else if (event === 'question') {
+                    STATE.currentQuestion = data.next_question;
+                    const timeLimit = data.time_limit || 90;
+
+                    UI.showLoading(false);
+                    UI.showNextQuestion(data.next_question, data.difficulty || 'medium', timeLimit);
+                    Audio.hideControls();
+                    Timer.start(timeLimit);
+                } else if (event === 'audio' && data.audio_url) {
+                    Audio.showControls(data.audio_url);
+                    if (STATE.autoPlayEnabled) Audio.play(data.audio_url);
+                }
+            }
+        );
+    },
+
     // ✅ Kết thúc phỏng vấn sớm
     async endEarly() {
         if (!confirm('⚠️ Bạn có chắc muốn kết thúc phỏng vấn ngay? Kết quả hiện tại sẽ được lưu lại.')) {
@@ -0,0 +1,67 @@
+# timing.py
+"""
+Đo thời gian từng giai đoạn của một request (Mongo, deserialize, wakeup_context, LLM, TTS, ...).
+
+Route mở một `StageTimings` cho request (contextvar `current_timings`), các đoạn code bọc
+bằng `with timed("stage")`; `MeteredLLM` tự cộng thời gian gọi LLM vào `llm.<component>`.
+Kết quả trả về client qua header `Server-Timing` (xem routes/interview_process.py) để
+benchmark tách được thời gian của provider với overhead của chính app.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class StageTimings:
+    """Tổng thời gian (ms) theo giai đoạn; thread-safe vì thread speculative cũng ghi vào."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage: str, ms: float):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + ms
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            result = {stage: round(ms, 2) for stage, ms in self._stages.items()}
+        result["total"] = round((time.perf_counter() - self._started) * 1000, 2)
+        return result
+
+    def header(self) -> str:
+        """Giá trị header Server-Timing, vd. `mongo_load;dur=1.2, llm.evaluate;dur=800.0, total;dur=812.3`."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+# Bộ đếm của request hiện tại (None → không đo)
+current_timings: ContextVar[Optional[StageTimings]] = ContextVar("current_timings", default=None)
+
+
+def add_stage_time(stage: str, ms: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, ms)
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, (time.perf_counter() - started) * 1000)
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Ngược lại với `StageTimings.header` (dùng trong benchmarks)."""
+    result = {}
+    for part in (header or "").split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        if name and dur:
+            result[name] = float(dur)
+    return result